@@ -1,19 +1,9 @@
 import os
 import sys
 
-# Sql
-from set_up_db import check_database_exists, connect_mysql_no_db, create_database, upload_dataset_to_mysql
-from sample_queries import connect_to_mysql, generate_sql_examples, execute_query 
-from nlp_matching import map_natural_language_to_query 
-
-# NoSql
-from pymongo import MongoClient
-from database_layer import DatabaseLayer
-from collection_layer import CollectionLayer
-from operation_layer import OperationLayer
-import nosql_functions as nosql_func
-from example_generator import ExampleGenerator
-
+# SQL and NoSQL modules are imported by the first state that needs them: pandas, PyMySQL and PyMongo
+# take most of a cold start, and the main menu needs none of them
+# (script/import_benchmark.py measures it)
 
 
 def handle_main_menu():
@@ -45,9 +35,10 @@ def main():
 
     # init NoSQL setting
     client_url = 'mongodb://localhost:27017/'  # mongoDB url
-    client = MongoClient(client_url)
+    client = None  # connected when NoSQL is first selected
     database = None
     collection = None
+    connection = None  # MySQL connection borrowed from the pool while a database is selected
     
     #Initial state
     # state for flow control
@@ -59,9 +50,23 @@ def main():
         
         # Handle SQL
         elif current_state == 'SQL': 
+            from set_up_db import check_database_exists, connect_mysql_no_db, create_database, upload_dataset_to_mysql
+            from sample_queries import connect_to_mysql, generate_sql_examples, execute_query, EXAMPLE_BUILDERS
+            from nlp_matching import map_natural_language_to_query
+            from query_cache import translate_sql_question, cached_sql_query
+            from cost_guard import run_guarded
+            from approx_aggregation import split_approximate, parse_sql_aggregate, approximate_sql, show_progressive
+            from rollups import is_rollup, rewrite_with_rollup
+            from query_timeout import QueryCancelled, reset_connection, timeout_for
+            from schema_catalog import get_catalog, refresh_catalog
+            from value_dictionary import get_sql_dictionary, check_sql_filter
+
             # Connect to MySQL without selecting a database, return show databases result
             
             connect_no_db = connect_mysql_no_db()
+            if connect_no_db is None:
+                current_state = 'MAIN_MENU'
+                continue
             print("\n--- SQL is selected ---")
             print(f"Available databases:")
             db_list = execute_query(connect_no_db,f"SHOW DATABASES", as_list=True)
@@ -84,7 +89,6 @@ def main():
                     # Create the database if it does not exist
                     create_database(connect_no_db, db_name)
                     print(f"Database '{db_name}' created!\n")
-                    continue
             elif db_name in db_list:
                 connection = connect_to_mysql(db_name)
                 if connection:
@@ -92,7 +96,9 @@ def main():
                     current_state = 'TABLE'
             else:
                 print("Invalid database. Please try again.")
-                continue
+
+            # give the connection back to the pool, the next pass reuses it without a new handshake
+            connect_no_db.close()
 
 
         # SQL Table layer
@@ -101,17 +107,25 @@ def main():
             # Show Table Name: show tables
             print(f"\n--- Database: {db_name} is selected ---")
             print(f"Available tables:")
-            tb_list = execute_query(connection,f"SHOW TABLES", as_list=True)
+            # rollup tables are maintained by ChatDB, they are not listed
+            tb_list = [tb for tb in get_catalog(connection).table_names() if not is_rollup(tb)]
             for tb in tb_list:
                 print(f"{tb}")
             print("\nTo proceed, choose an existing table or create a new one with: 'create table [table name]'.\n"
+                  "Load new rows into an existing table with: 'append table [table name]' or 'upsert table [table name]'.\n"
+                  "Use 'refresh' to reload the table list after changes made outside ChatDB.\n"
                   "Use 'exit' to return to the main menu.\n")
 
             table_name = input("Enter table name: ").strip()
 
             if table_name == 'exit':
+                connection.close()  # return the database connection to the pool
+                connection = None
                 current_state = 'SQL'  # Return to database layer
 
+            elif table_name == 'refresh':
+                refresh_catalog(connection)
+
             elif table_name.startswith("create table "):
                 table_name = table_name.split()[2]
                 csv_path = input("Enter path to CSV file: ").strip()
@@ -120,12 +134,25 @@ def main():
                     upload_dataset_to_mysql(connection, table_name, csv_path)
                     print(f"Table '{table_name}' created!\n")
                     continue
+            elif table_name.startswith(("append table ", "upsert table ")):
+                # Load only the new rows of a CSV into an existing table
+                upload_mode, table_name = table_name.split()[0], table_name.split()[2]
+                csv_path = input("Enter path to CSV file: ").strip()
+                if connection:
+                    upload_dataset_to_mysql(connection, table_name, csv_path, mode=upload_mode)
+                    continue
             elif table_name in tb_list:
             # Explore data set
                 print("Attributes of All Columns:")
-                print(execute_query(connection,f"DESCRIBE {table_name}"))
+                print(get_catalog(connection).describe(table_name))
                 print(f"\n Top 10 records of {table_name}:")
-                print(execute_query(connection,f"SELECT * FROM {table_name} LIMIT 10"))
+                try:
+                    print(cached_sql_query(connection, table_name, f"SELECT * FROM {table_name} LIMIT 10",
+                                           timeout=timeout_for('sql_preview')))
+                except (TimeoutError, QueryCancelled) as err:
+                    print(f"Error: {err}")
+                # distinct values of the categorical columns, filters on them are checked before they run
+                get_sql_dictionary(connection, table_name)
                 current_state = 'SQL_OPERATION'
             else:
                 print("Invalid table. Please try again.")
@@ -141,43 +168,74 @@ def main():
                 2. example of one of language constructs. e.g. group by, where, order by, aggregation
                 3. nl matching
             """
-            queries = generate_sql_examples(connection, table_name) # 
             user_input = input("Enter the type of example you want (e.g., 'example of GROUP BY', 'example of SQL query'): ").strip().lower()
-            if user_input == 'exit':
-                current_state = 'TABLE' # or GO BACK TO the begaining 
-
-            elif user_input == "example of sql query":
-                # Extract all query examples
-                for query_type, examples in queries.items():
-                    print(f"{query_type} Queries:")
-                    for desc, query, result in examples:
-                        print(f"Description: {desc}\nQuery: {query}\nResult:\n{result}\n")
-
-            elif user_input.startswith("example of"):
-                # Extract specific query type (e.g., GROUP BY, WHERE)
-                query_type = user_input.replace("example of", "").strip().upper()
-                if query_type in queries:
-                    print(f"{query_type} Queries:")
-                    for desc, query, result in queries[query_type]:
-                        print(f"Description: {desc}\nQuery: {query}\nResult:\n{result}\n")
-                else:
-                    print(f"No examples available for {query_type}.")
-            else:
-                # Pass the input to NL matching
-                cursor = connection.cursor()
-                cursor.execute(f"DESCRIBE {table_name}")
-                column_info = {row[0]: row[1] for row in cursor.fetchall()}               
-                sql_query = map_natural_language_to_query(user_input, table_name, column_info)
-                if sql_query:
-                    print(f"Generated Query:\n{sql_query}\n")
-                    # execute and show results
-                    result = execute_query(connection, sql_query)
-                    print(result)
+            try:
+                if user_input == 'exit':
+                    current_state = 'TABLE' # or GO BACK TO the begaining 
+
+                elif user_input == "example of sql query":
+                    # Build (or reuse cached) examples for every construct
+                    queries = generate_sql_examples(connection, table_name)
+                    for query_type, examples in queries.items():
+                        print(f"{query_type} Queries:")
+                        for desc, query, result in examples:
+                            print(f"Description: {desc}\nQuery: {query}\nResult:\n{result}\n")
+
+                elif user_input.startswith("example of"):
+                    # Extract specific query type (e.g., GROUP BY, WHERE)
+                    query_type = user_input.replace("example of", "").strip().upper()
+                    if query_type in EXAMPLE_BUILDERS:
+                        queries = generate_sql_examples(connection, table_name, [query_type])
+                        print(f"{query_type} Queries:")
+                        for desc, query, result in queries[query_type]:
+                            print(f"Description: {desc}\nQuery: {query}\nResult:\n{result}\n")
+                    else:
+                        print(f"No examples available for {query_type}.")
                 else:
-                    print("Sorry, I couldn't understand your question. Please try again.")
+                    # "approx total x by y" answers from a sample first, then refines on request
+                    approximate, question = split_approximate(user_input)
+                    # Pass the input to NL matching, repeated questions reuse the cached query and result
+                    sql_query = translate_sql_question(
+                        connection, question, table_name,
+                        lambda column_info: map_natural_language_to_query(question, table_name, column_info)
+                    )
+                    # a categorical filter's value is matched to a stored value, a value that does not exist runs nothing
+                    sql_query, missing = check_sql_filter(connection, table_name, sql_query)
+                    # aggregates a rollup table can answer read the rollup instead of the table
+                    rollup_query = rewrite_with_rollup(connection, table_name, sql_query) if sql_query else None
+                    if missing:
+                        print(missing)
+                    elif rollup_query:
+                        print(f"Generated Query:\n{sql_query}\n")
+                        print(f"Answered from a rollup table:\n{rollup_query}\n")
+                        run_guarded(connection, table_name, rollup_query, question=question)
+                    elif sql_query and approximate and parse_sql_aggregate(sql_query):
+                        print(f"Generated Query:\n{sql_query}\n")
+                        show_progressive(approximate_sql(connection, table_name, sql_query))
+                    elif sql_query:
+                        if approximate:
+                            print("Only totals, averages and counts by a column can be approximated, running the exact query.")
+                        print(f"Generated Query:\n{sql_query}\n")
+                        # check the estimated cost, then execute and stream results page by page
+                        run_guarded(connection, table_name, sql_query, question=question)
+                    else:
+                        print("Sorry, I couldn't understand your question. Please try again.")
+            except (TimeoutError, QueryCancelled) as err:
+                print(f"Error: {err}")
+            except KeyboardInterrupt:
+                # Ctrl-C aborts only the running query, the connection is reopened since its read was cut short
+                reset_connection(connection)
+                print("Query cancelled.")
                     
         # Handle NoSQL
         elif current_state == 'NOSQL':
+            from pymongo import MongoClient
+            from database_layer import DatabaseLayer
+            from collection_layer import CollectionLayer
+            from operation_layer import OperationLayer
+
+            if client is None:
+                client = MongoClient(client_url)
             db_layer = DatabaseLayer(client)
             db_name = db_layer.start()
             
@@ -214,6 +272,8 @@ def main():
                 current_state = operation_result
     
     # current_state == 'EXIT'
+    if connection:
+        connection.close()
     print("Goodbye!")
 
 
@@ -0,0 +1,266 @@
+import math
+import re
+import time
+import hashlib
+
+import pandas as pd
+import pymysql
+
+from schema_catalog import get_catalog
+from sample_queries import execute_query
+from query_timeout import mongo_deadline, timeout_for, database_errors
+
+# questions starting with one of these run on a sample, e.g. "approx total sales by region"
+APPROX_PREFIXES = ('approximately ', 'approx ')
+# sampled fraction at each refinement level, the last level is the exact query
+SAMPLE_RATES = (0.01, 0.05, 0.25, 1.0)
+# resolution of the hash that assigns rows (or blocks) to sample levels
+HASH_BUCKETS = 10000
+# with an integer primary key whole key ranges are sampled so only the sampled rows are read
+SAMPLE_BLOCK_ROWS = 100
+MAX_SAMPLE_BLOCKS = 5000  # blocks are widened on large tables to keep the WHERE clause short
+# $sample sizes at each Mongo refinement level, the last level is the exact pipeline
+MONGO_SAMPLE_SIZES = (1000, 10000, 100000)
+# 95% confidence intervals
+Z_SCORE = 1.96
+
+# generated "total X by Y", "average X by Y" and "count by Y" SQL
+SQL_AGGREGATE_PATTERN = re.compile(
+    r"^SELECT (?P<group>\w+), (?:(?P<func>SUM|AVG)\((?P<value>\w+)\)|COUNT\(\*\)) AS (?P<alias>\w+) "
+    r"FROM (?P<table>\w+) GROUP BY (?P=group)$", re.IGNORECASE
+)
+AGGREGATE_KINDS = {'SUM': 'total', 'AVG': 'average', None: 'count'}
+# NLPProcessor intent of each aggregate kind, for the Mongo deadline
+MONGO_INTENTS = {'total': 'aggregate_sum', 'average': 'aggregate_avg', 'count': 'aggregate_count'}
+
+
+# strip the approximate prefix of a question: returns (approximate, question)
+def split_approximate(question):
+    lowered = question.strip().lower()
+    for prefix in APPROX_PREFIXES:
+        if lowered.startswith(prefix):
+            return True, question.strip()[len(prefix):]
+    return False, question
+
+
+# group column, aggregate kind and value column of a generated aggregate query, None for other shapes
+def parse_sql_aggregate(query):
+    match = SQL_AGGREGATE_PATTERN.match(" ".join(query.split()))
+    if match is None:
+        return None
+    func = match.group('func').upper() if match.group('func') else None
+    return {'kind': AGGREGATE_KINDS[func], 'group': match.group('group'), 'value': match.group('value'),
+            'alias': match.group('alias'), 'table': match.group('table')}
+
+
+class SampleEstimator:
+    """
+    Horvitz-Thompson estimates per group from Bernoulli-sampled units (rows or key blocks),
+    each sampled with probability p. Per group it keeps the sums over sampled units of the
+    unit total y, the unit count n, y*y, n*n and y*n; disjoint samples are simply added.
+    when the number of sampled units is known (key blocks), totals use the sample variance
+    of the unit totals instead of the plain Horvitz-Thompson bound, which is much tighter.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.groups = {}
+
+    def add(self, group, y, n, yy, nn, yn):
+        sums = self.groups.setdefault(group, [0.0] * 5)
+        for i, value in enumerate((y, n, yy, nn, yn)):
+            sums[i] += 0.0 if pd.isna(value) else float(value)
+
+    def estimates(self, p, group_name, alias, units=None):
+        rows = []
+        for group, (y, n, yy, nn, yn) in self.groups.items():
+            if self.kind == 'average':
+                if n == 0:
+                    continue
+                estimate = y / n
+                variance = (1 - p) * max(yy - 2 * estimate * yn + estimate ** 2 * nn, 0.0) / n ** 2
+            else:
+                estimate = y / p
+                spread = (yy - y * y / units) * units / (units - 1) if units and units > 1 else yy
+                variance = (1 - p) / p ** 2 * max(spread, 0.0)
+            margin = Z_SCORE * math.sqrt(variance)
+            rows.append([group, estimate, estimate - margin, estimate + margin])
+        return pd.DataFrame(rows, columns=[group_name, alias, 'ci_low', 'ci_high']).sort_values(group_name, ignore_index=True)
+
+
+# hash bucket of a key block, the same block always falls in the same sample level
+def block_bucket(block):
+    return int(hashlib.md5(str(block).encode()).hexdigest()[:8], 16) % HASH_BUCKETS
+
+
+# key blocks whose hash bucket is in [low_bucket, high_bucket)
+def sampled_blocks(plan, low_bucket, high_bucket):
+    block_rows = plan['block_rows']
+    return [
+        block for block in range(plan['low'] // block_rows, plan['high'] // block_rows + 1)
+        if low_bucket <= block_bucket(block) < high_bucket
+    ]
+
+
+# merge consecutive block numbers into (first, last) runs
+def block_runs(blocks):
+    runs = []
+    for block in blocks:
+        if runs and runs[-1][1] == block - 1:
+            runs[-1][1] = block
+        else:
+            runs.append([block, block])
+    return runs
+
+
+# how rows of a table are sampled: key blocks for a single integer primary key, hashed rows otherwise
+def sql_sampling_plan(connection, table_name):
+    catalog = get_catalog(connection)
+    primary_key = catalog.primary_key(table_name)
+    column_types = catalog.column_types(table_name)
+    if len(primary_key) == 1 and 'int' in column_types.get(primary_key[0], ''):
+        key = primary_key[0]
+        low, high = execute_query(connection, f"SELECT MIN({key}), MAX({key}) FROM {table_name}").iloc[0]
+        if pd.notna(low):
+            low, high = int(low), int(high)
+            block_rows = max(SAMPLE_BLOCK_ROWS, (high - low + 1) // MAX_SAMPLE_BLOCKS + 1)
+            return {'mode': 'block', 'key': key, 'low': low, 'high': high, 'block_rows': block_rows}
+    key_columns = primary_key or list(column_types)
+    return {'mode': 'row', 'key': f"CONCAT_WS('|', {', '.join(key_columns)})"}
+
+
+# aggregate query over the rows (or the given key blocks) whose hash bucket is in [low_bucket, high_bucket)
+def sql_level_query(agg, plan, low_bucket, high_bucket, blocks=None):
+    group, value, table = agg['group'], agg['value'], agg['table']
+    y = "COUNT(*)" if agg['kind'] == 'count' else f"SUM({value})"
+    n = "COUNT(*)" if agg['kind'] == 'count' else f"COUNT({value})"
+    if plan['mode'] == 'row':
+        # every row is a unit, the squares are summed on the server
+        yy = "COUNT(*)" if agg['kind'] == 'count' else f"SUM({value} * {value})"
+        predicate = f"MOD(CRC32({plan['key']}), {HASH_BUCKETS}) BETWEEN {low_bucket} AND {high_bucket - 1}"
+        return f"SELECT {group}, {y}, {n}, {yy}, {n}, {y} FROM {table} WHERE {predicate} GROUP BY {group}"
+
+    key, block_rows = plan['key'], plan['block_rows']
+    if not blocks:
+        return None
+    ranges = " OR ".join(
+        f"{key} BETWEEN {first * block_rows} AND {(last + 1) * block_rows - 1}" for first, last in block_runs(blocks)
+    )
+    # one row per group and block, the block totals are squared on the client
+    return f"SELECT {group}, {key} DIV {block_rows}, {y}, {n} FROM {table} WHERE {ranges} GROUP BY {group}, {key} DIV {block_rows}"
+
+
+# add one level's result to the estimator
+def add_level(estimator, plan, result):
+    for row in result.itertuples(index=False):
+        if plan['mode'] == 'row':
+            group, y, n, yy, nn, yn = row
+        else:
+            group, _, y, n = row
+            y, n = (0.0 if pd.isna(y) else float(y)), float(n)
+            yy, nn, yn = y * y, n * n, y * n
+        estimator.add(group, y, n, yy, nn, yn)
+
+
+# progressively refined estimates of a generated aggregate query
+def approximate_sql(connection, table_name, query, rates=SAMPLE_RATES):
+    """
+    yields (sampled fraction, DataFrame of estimates with 95% CI) per level. each level only
+    reads the units added since the previous level; the last level (rate 1.0) runs the exact query.
+    """
+    agg = parse_sql_aggregate(query)
+    plan = sql_sampling_plan(connection, table_name)
+    estimator = SampleEstimator(agg['kind'])
+    timeout = timeout_for('sql_question')
+    low_bucket = 0
+    if plan['mode'] == 'block':
+        total_blocks = plan['high'] // plan['block_rows'] - plan['low'] // plan['block_rows'] + 1
+        seen_blocks = 0
+    for rate in rates:
+        if rate >= 1.0:
+            exact = execute_query(connection, query, timeout=timeout)
+            exact['ci_low'] = exact['ci_high'] = exact[agg['alias']]
+            yield 1.0, exact
+            return
+        high_bucket = int(rate * HASH_BUCKETS)
+        sampled = high_bucket / HASH_BUCKETS
+        blocks = units = None
+        if plan['mode'] == 'block':
+            # with few blocks the realized fraction is used, it is known exactly
+            blocks = sampled_blocks(plan, low_bucket, high_bucket)
+            seen_blocks += len(blocks)
+            sampled = seen_blocks / total_blocks
+            units = seen_blocks
+        level_query = sql_level_query(agg, plan, low_bucket, high_bucket, blocks)
+        if level_query is not None:
+            add_level(estimator, plan, execute_query(connection, level_query, timeout=timeout))
+        low_bucket = high_bucket
+        if sampled > 0:
+            yield sampled, estimator.estimates(sampled, agg['group'], agg['alias'], units)
+
+
+# progressively refined estimates of a Mongo "total/average/count by" aggregation using $sample
+def approximate_mongo(collection, kind, group, field=None, sizes=MONGO_SAMPLE_SIZES):
+    """
+    $sample draws without replacement, so each level is a fresh sample of a larger size
+    (levels are not merged). yields (sampled fraction, DataFrame of estimates with 95% CI);
+    the last level runs the exact aggregation.
+    """
+    alias = f"total_{field}" if kind == 'total' else f"average_{field}" if kind == 'average' else 'count'
+    value = 1 if kind == 'count' else f"${field}"
+    numeric = {"$cond": [{"$in": [{"$type": f"${field}"}, ["double", "int", "long", "decimal"]]}, 1, 0]} if field else 1
+    group_stage = {"$group": {
+        "_id": f"${group}",
+        "y": {"$sum": value},
+        "yy": {"$sum": {"$multiply": [value, value]}},
+        "n": {"$sum": numeric},
+    }}
+    total_docs = collection.estimated_document_count()
+    for size in list(sizes) + [None]:
+        if size is None or size >= total_docs:
+            pipeline, size = [group_stage], total_docs
+        else:
+            pipeline = [{"$sample": {"size": size}}, group_stage]
+        with mongo_deadline(collection, timeout_for(MONGO_INTENTS[kind])) as (max_time_ms, comment):
+            groups = list(collection.aggregate(pipeline, maxTimeMS=max_time_ms, comment=comment))
+        f = size / total_docs if total_docs else 1.0
+        rows = []
+        for doc in groups:
+            y, yy, n = float(doc['y']), float(doc['yy']), float(doc['n'])
+            if kind == 'average':
+                if n == 0:
+                    continue
+                estimate = y / n
+                variance = (1 - f) * max(yy - y * y / n, 0.0) / max(n - 1, 1) / n
+            else:
+                # y is zero outside the group, so the spread is taken over the whole sample
+                estimate = y / f
+                variance = total_docs ** 2 * (1 - f) * max(yy - y * y / size, 0.0) / max(size - 1, 1) / size
+            margin = Z_SCORE * math.sqrt(variance)
+            rows.append([doc['_id'], estimate, estimate - margin, estimate + margin])
+        yield f, pd.DataFrame(rows, columns=[group, alias, 'ci_low', 'ci_high']).sort_values(group, ignore_index=True)
+        if f >= 1.0:
+            return
+
+
+# print each level's estimates, asking before refining further
+def show_progressive(levels):
+    started_at = time.perf_counter()
+    try:
+        for fraction, estimates in levels:
+            label = "Exact result" if fraction >= 1.0 else f"Estimate from a {fraction:.0%} sample (95% confidence interval)"
+            print(f"{label}, {time.perf_counter() - started_at:.2f}s:")
+            print(estimates.to_string(index=False))
+            if fraction >= 1.0:
+                return
+            try:
+                more = input("Press Enter for a more precise answer, or 'q' to stop: ").strip().lower()
+            except KeyboardInterrupt:
+                more = 'q'
+            if more == 'q':
+                return
+            started_at = time.perf_counter()
+    except database_errors() as err:
+        print(f"Error: {err}")
+    finally:
+        levels.close()
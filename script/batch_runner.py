@@ -0,0 +1,209 @@
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+
+import pymysql
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from connection_pool import get_pool, close_all_pools
+from nlp_matching import map_natural_language_to_query
+from query_cache import translate_sql_question, cached_translation, mongo_scope
+from cost_guard import guarded_rows
+from rollups import rewrite_with_rollup
+from query_timeout import QueryCancelled
+from concurrent_executor import run_concurrently, DEFAULT_MAX_WORKERS
+from output_capture import install_thread_output
+from nlp_processor import NLPProcessor
+from operation_layer import OperationLayer
+
+MONGO_URL = 'mongodb://localhost:27017/'
+OUTPUT_FORMATS = ('ndjson', 'csv')
+# rows kept per answer, the rest of a large result is never read
+BATCH_MAX_ROWS = 100
+# failure lines the operation layer prints ("Error executing find: ...", "Error: ..."), matched at the start
+# of a line so documents that merely contain "Error" do not fail the question
+LAYER_ERROR = re.compile(r"^(?:Error(?: executing [^:\n]+)?: |Query cancelled\.)", re.M)
+# CSV columns, rows and Mongo output are JSON-encoded in 'result'
+CSV_FIELDS = ['index', 'id', 'question', 'status', 'query', 'row_count', 'truncated',
+              'translate_seconds', 'execute_seconds', 'error', 'result']
+
+
+# questions of a file: one per line, or JSON lines with a "question" (and optional "id") field
+def read_questions(path):
+    questions = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                item = json.loads(line)
+                questions.append({'id': item.get('id'), 'question': item['question']})
+            else:
+                questions.append({'id': None, 'question': line})
+    for i, item in enumerate(questions):
+        item['index'] = i
+    return questions
+
+
+# translate every question up front, untranslated ones are reported without running anything
+def translate_sql_questions(database, table_name, questions):
+    with get_pool(database).connection() as connection:
+        for item in questions:
+            started_at = time.perf_counter()
+            question = item['question'].lower()
+            item['query'] = translate_sql_question(
+                connection, question, table_name,
+                lambda column_info: map_natural_language_to_query(question, table_name, column_info)
+            )
+            if item['query']:
+                item['query'] = rewrite_with_rollup(connection, table_name, item['query']) or item['query']
+            item['translate_seconds'] = time.perf_counter() - started_at
+    return questions
+
+
+def translate_mongo_questions(collection, questions):
+    nlp = NLPProcessor()
+    for item in questions:
+        started_at = time.perf_counter()
+        question = item['question']
+        parsed = cached_translation(question, mongo_scope(collection), None,
+                                    lambda: nlp.parse_input(question), case_sensitive=True)
+        item['query'] = parsed['intent'] if parsed['intent'] != 'unknown' else None
+        item['translate_seconds'] = time.perf_counter() - started_at
+    return questions
+
+
+# one SQL question on its own pooled connection, returns the result fields of its record
+def sql_task(database, table_name, item, max_rows, allow_scans):
+    def task():
+        with get_pool(database).connection() as connection:
+            action, result = guarded_rows(connection, table_name, item['query'], max_rows,
+                                          confirm=allow_scans, question=item['question'])
+        if result is None:
+            return {'status': 'skipped', 'error': 'full table scan, rerun with --allow-scans'}
+        rows = result.head(max_rows)
+        return {'status': 'ok', 'row_count': len(rows), 'truncated': len(result) > max_rows,
+                'result': json.loads(rows.to_json(orient='records', date_format='iso', default_handler=str))}
+    return task
+
+
+# one Mongo question through the operation layer, its printed answer is the result
+def mongo_task(collection, item, output):
+    def task():
+        layer = OperationLayer(collection)
+        with output.capture() as text:
+            layer.handle_message(item['question'], interactive=False)
+        answer = text.getvalue()
+        failure = LAYER_ERROR.search(answer)
+        error = answer[failure.start():].splitlines()[0] if failure else None
+        return {'status': 'error' if failure else 'ok', 'error': error, 'result': answer}
+    return task
+
+
+# status and error of a task that raised
+def failure(err):
+    if isinstance(err, TimeoutError):
+        return {'status': 'timeout', 'error': str(err)}
+    if isinstance(err, QueryCancelled):
+        return {'status': 'cancelled', 'error': str(err)}
+    return {'status': 'error', 'error': str(err)}
+
+
+class ResultWriter:
+    """Writes one record per question as soon as it is answered, NDJSON or CSV."""
+
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        self.csv = csv.DictWriter(stream, fieldnames=CSV_FIELDS, extrasaction='ignore') if output_format == 'csv' else None
+        if self.csv:
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.csv:
+            self.csv.writerow(dict(record, result=json.dumps(record.get('result'), default=str)))
+        else:
+            self.stream.write(json.dumps(record, default=str) + "\n")
+        self.stream.flush()
+
+
+# translate a file of questions, run them concurrently and stream one record per question
+def run_batch(kind, database, table_name, questions, writer, max_workers=DEFAULT_MAX_WORKERS,
+              max_rows=BATCH_MAX_ROWS, allow_scans=False, mongo_url=MONGO_URL):
+    """
+    kind: 'sql' or 'nosql'. records are written in completion order, 'index' is the question's
+    position in the file. returns ({status: count}, execution seconds of the questions that ran).
+    """
+    if kind == 'sql':
+        translate_sql_questions(database, table_name, questions)
+        tasks = [(item['index'], sql_task(database, table_name, item, max_rows, allow_scans))
+                 for item in questions if item['query']]
+    else:
+        collection = MongoClient(mongo_url)[database][table_name]
+        translate_mongo_questions(collection, questions)
+        output = install_thread_output()
+        tasks = [(item['index'], mongo_task(collection, item, output)) for item in questions if item['query']]
+
+    statuses, latencies = {}, []
+    for item in questions:
+        if not item['query']:
+            statuses['untranslated'] = statuses.get('untranslated', 0) + 1
+            writer.write(dict(item, status='untranslated', execute_seconds=0.0, error="question not understood"))
+    for outcome in run_concurrently(tasks, max_workers):
+        item = questions[outcome['key']]
+        fields = failure(outcome['error']) if outcome['error'] is not None else outcome['result']
+        record = dict(item, execute_seconds=outcome['seconds'], **fields)
+        statuses[record['status']] = statuses.get(record['status'], 0) + 1
+        latencies.append(outcome['seconds'])
+        writer.write(record)
+    return statuses, latencies
+
+
+# latency percentile of the answered questions
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Translate and run a file of questions without prompts.")
+    parser.add_argument("type", choices=('sql', 'nosql'))
+    parser.add_argument("database")
+    parser.add_argument("table", help="table or collection")
+    parser.add_argument("questions", help="text file with one question per line, or JSONL with a 'question' field")
+    parser.add_argument("--output", default=None, help="output file, stdout when omitted")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default=None, help="default: from --output's extension, else ndjson")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS)
+    parser.add_argument("--max-rows", type=int, default=BATCH_MAX_ROWS)
+    parser.add_argument("--allow-scans", action="store_true", help="run queries the cost guard would confirm first")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    args = parser.parse_args()
+
+    output_format = args.format or ('csv' if args.output and args.output.endswith('.csv') else 'ndjson')
+    questions = read_questions(args.questions)
+    stream = open(args.output, 'w', newline='') if args.output else sys.stdout
+    started_at = time.perf_counter()
+    try:
+        if args.output is None and args.type == 'nosql':
+            stream = install_thread_output().stream  # records go around the per-question capture
+        statuses, latencies = run_batch(args.type, args.database, args.table, questions, ResultWriter(stream, output_format),
+                             max_workers=args.workers, max_rows=args.max_rows, allow_scans=args.allow_scans,
+                             mongo_url=args.mongo_url)
+    except (pymysql.MySQLError, PyMongoError, TimeoutError, OSError, ValueError) as err:
+        print(f"Error: {err}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if args.output:
+            stream.close()
+        close_all_pools()
+
+    print(f"{len(questions)} questions in {time.perf_counter() - started_at:.2f}s: "
+          + ", ".join(f"{count} {status}" for status, count in sorted(statuses.items()))
+          + f" (latency p50 {percentile(latencies, 0.5):.3f}s, p95 {percentile(latencies, 0.95):.3f}s)", file=sys.stderr)
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+
+import pymysql
+
+# load strategies supported by bulk_load
+LOAD_STRATEGIES = ('executemany', 'load_data')
+DEFAULT_STRATEGY = 'executemany'
+DEFAULT_BATCH_SIZE = 5000
+
+# MySQL errors raised when LOAD DATA LOCAL INFILE is disabled on the client or the server
+LOCAL_INFILE_DISABLED_ERRORS = (1148, 2068, 3948)
+
+
+# build the INSERT statement once per load instead of once per row
+def build_insert_sql(table_name, columns):
+    column_list = ', '.join([f"`{col}`" for col in columns])
+    placeholders = ', '.join(['%s'] * len(columns))
+    return f"INSERT INTO `{table_name}` ({column_list}) VALUES ({placeholders})"
+
+
+# convert a DataFrame into plain python row tuples, NaN/NaT become NULL
+def dataframe_to_rows(dataframe):
+    cleaned = dataframe.astype(object).where(dataframe.notna(), None)
+    return list(cleaned.itertuples(index=False, name=None))
+
+
+# rows per second of a finished load, printed unless report=False
+def report_throughput(table_name, total_rows, started_at, strategy, report=True):
+    elapsed = max(time.perf_counter() - started_at, 1e-9)
+    if report:
+        print(f"Loaded {total_rows} rows into '{table_name}' with '{strategy}' "
+              f"in {elapsed:.2f}s ({total_rows / elapsed:,.0f} rows/s).")
+    return {'rows': total_rows, 'seconds': elapsed, 'rows_per_second': total_rows / elapsed}
+
+
+# batched multi-row INSERTs, pymysql rewrites executemany into one INSERT ... VALUES (...), (...) per batch
+def insert_executemany(connection, table_name, dataframe, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    inserts the DataFrame in batches of `batch_size` rows, committing after each batch.
+    returns the number of inserted rows.
+    """
+    sql = build_insert_sql(table_name, dataframe.columns)
+    total_rows = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(dataframe), batch_size):
+            rows = dataframe_to_rows(dataframe.iloc[start:start + batch_size])
+            cursor.executemany(sql, rows)
+            connection.commit()
+            total_rows += len(rows)
+    return total_rows
+
+
+# string values with their backslashes doubled, LOAD DATA reads a backslash as an escape character
+def escape_backslashes(dataframe):
+    escaped = dataframe.copy()
+    for column in escaped.columns:
+        if escaped[column].dtype.kind == 'O':  # object and string columns
+            escaped[column] = escaped[column].map(lambda value: value.replace('\\', '\\\\') if isinstance(value, str) else value)
+    return escaped
+
+
+# LOAD DATA LOCAL INFILE fast path, each batch is written to a temporary CSV and loaded by the server
+def insert_load_data(connection, table_name, dataframe, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    streams the DataFrame to MySQL with LOAD DATA LOCAL INFILE in batches of `batch_size` rows.
+    requires a connection opened with local_infile=True and local_infile enabled on the server.
+    returns the number of loaded rows.
+    """
+    column_list = ', '.join([f"`{col}`" for col in dataframe.columns])
+    sql = (
+        f"LOAD DATA LOCAL INFILE %s INTO TABLE `{table_name}` CHARACTER SET utf8mb4 "
+        f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+        f"LINES TERMINATED BY '\\n' ({column_list})"
+    )
+    total_rows = 0
+    fd, tmp_path = tempfile.mkstemp(suffix='.csv')
+    os.close(fd)
+    try:
+        with connection.cursor() as cursor:
+            for start in range(0, len(dataframe), batch_size):
+                batch = dataframe.iloc[start:start + batch_size]
+                # \N is SQL NULL, a literal "NULL" string stays a string like in 'executemany'
+                escape_backslashes(batch).to_csv(tmp_path, index=False, header=False, na_rep='\\N',
+                                                 lineterminator='\n')
+                cursor.execute(sql, (tmp_path,))
+                connection.commit()
+                total_rows += len(batch)
+    finally:
+        os.remove(tmp_path)
+    return total_rows
+
+
+# load a DataFrame into an existing table with the selected strategy
+def bulk_load(connection, table_name, dataframe, strategy=DEFAULT_STRATEGY, batch_size=DEFAULT_BATCH_SIZE, report=True):
+    """
+    loads `dataframe` into `table_name` using one of LOAD_STRATEGIES and reports rows per second.
+    falls back to 'executemany' when LOAD DATA LOCAL INFILE is disabled.
+    report=False skips the throughput print (used when the caller loads many chunks).
+    """
+    if strategy not in LOAD_STRATEGIES:
+        raise ValueError(f"Unknown load strategy '{strategy}', expected one of {LOAD_STRATEGIES}")
+
+    started_at = time.perf_counter()
+    if strategy == 'load_data':
+        try:
+            total_rows = insert_load_data(connection, table_name, dataframe, batch_size)
+            return report_throughput(table_name, total_rows, started_at, strategy, report)
+        except pymysql.MySQLError as err:
+            if err.args and err.args[0] in LOCAL_INFILE_DISABLED_ERRORS:
+                print(f"LOAD DATA LOCAL INFILE is not available ({err}), falling back to 'executemany'.")
+                connection.rollback()
+                strategy = 'executemany'
+                started_at = time.perf_counter()
+            else:
+                raise
+
+    total_rows = insert_executemany(connection, table_name, dataframe, batch_size)
+    return report_throughput(table_name, total_rows, started_at, strategy, report)
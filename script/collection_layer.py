@@ -1,12 +1,14 @@
 import nosql_functions as nosql_func
 from nlp_processor import NLPProcessor
+from rollups import is_rollup, build_mongo_rollups
 
 class CollectionLayer:
     def __init__(self, database):
         self.database = database
         
+    # rollup collections are maintained by ChatDB, they are not listed
     def list_colelctions(self):
-        return self.database.list_collection_names()
+        return [name for name in self.database.list_collection_names() if not is_rollup(name)]
     
     def start(self):
         while True:
@@ -32,6 +34,7 @@ class CollectionLayer:
                 collection = input("Enter collection name: ")
                 json_file = input("Enter the path of your json file: ")
                 nosql_func.upload_JSON_data(self.database[collection], json_file)
+                build_mongo_rollups(self.database[collection])  # rebuilt with the new documents
                 print(f'file: {json_file} uploaded in {collection}!\n')
                 # continue
                 return collection
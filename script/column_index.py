@@ -0,0 +1,183 @@
+import re
+import sys
+import time
+from functools import lru_cache
+
+# words with the same meaning in column names, the first one stands for the group
+SYNONYMS = [
+    ('quantity', 'qty', 'units'),
+    ('price', 'cost'),
+    ('id', 'identifier', 'number', 'num', 'no'),
+    ('date', 'day'),
+    ('location', 'address', 'city'),
+    ('category', 'class'),
+    ('type', 'kind'),
+    ('population', 'pop'),
+    ('weight', 'mass'),
+    ('percent', 'percentage', 'pct'),
+]
+CANONICAL = {word: group[0] for group in SYNONYMS for word in group}
+# intent words never part of a column phrase
+STOP_WORDS = {
+    'total', 'average', 'count', 'sum', 'by', 'group', 'grouped', 'where', 'filter', 'sort', 'order', 'having',
+    'greater', 'less', 'than', 'equals', 'is', 'find', 'all', 'data', 'with', 'on', 'as', 'ascending',
+    'descending', 'example', 'queries', 'and', 'or', 'of', 'the', 'rows', 'approx', 'approximate', 'about',
+}
+# the rest of the question after these words is a value, not column names
+VALUE_WORDS = {'equals', 'is', 'with'}
+# the word after these is a value
+OPERATOR_WORDS = {'than', '>', '>=', '<', '<=', '=', '!='}
+MAX_PHRASE_WORDS = 3
+# smallest trigram similarity (Dice) for a misspelled column name
+TRIGRAM_THRESHOLD = 0.5
+COLUMN_INDEX_CACHE_SIZE = 64
+BENCHMARK_ROUNDS = 10000
+
+
+# words of a column name or phrase: snake_case, camelCase, digits and spaces all separate words
+def split_words(name):
+    return [word.lower() for word in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", name)]
+
+
+# plural words ending in s match their singular column words
+def singular(word):
+    if len(word) > 3 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ColumnIndex:
+    """
+    Resolves what a user typed to one column of a table or collection: the exact name, the same words
+    in another form ("unit price", "Unit-Prices"), synonyms ("transaction quantity" for transaction_qty),
+    a unique word of one column ("location" for store_location) or a misspelling ("unti_price", by
+    character trigrams). Ambiguous words resolve to nothing.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.exact = {column.lower(): column for column in self.columns}
+        self.words, self.synonyms, self.compact, self.by_word = {}, {}, {}, {}
+        self.grams, self.postings = {}, {}
+        for column in self.columns:
+            words = [singular(word) for word in split_words(column)]
+            synonym_words = [CANONICAL.get(word, word) for word in words]
+            self.words.setdefault(tuple(words), []).append(column)
+            self.synonyms.setdefault(tuple(synonym_words), []).append(column)
+            self.compact.setdefault(''.join(words), []).append(column)
+            for word in set(synonym_words):
+                self.by_word.setdefault(word, []).append(column)
+            self.grams[column] = trigrams(''.join(words))
+            for gram in self.grams[column]:
+                self.postings.setdefault(gram, []).append(column)
+
+    # column of a phrase's words in any form, synonyms included, without guessing at misspellings
+    def phrase_column(self, phrase):
+        column = self.exact.get(phrase.lower())
+        if column is not None:
+            return column
+        words = [singular(word) for word in split_words(phrase)]
+        if not words:
+            return None
+        synonym_words = [CANONICAL.get(word, word) for word in words]
+        for candidates in (self.words.get(tuple(words)), self.synonyms.get(tuple(synonym_words)),
+                           self.compact.get(''.join(words))):
+            if candidates and len(candidates) == 1:
+                return candidates[0]
+        # every word of the phrase is a word of exactly one column
+        matching = set.intersection(*(set(self.by_word.get(word, ())) for word in synonym_words))
+        return matching.pop() if len(matching) == 1 else None
+
+    # column a single word names, misspellings included, or None
+    def resolve(self, word):
+        column = self.phrase_column(word)
+        if column is not None or not self.columns:
+            return column
+        words = [singular(w) for w in split_words(word)]
+        if all(CANONICAL.get(w, w) in self.by_word for w in words):
+            return None  # known words shared by several columns are ambiguous, not misspelled
+        grams = trigrams(''.join(words))
+        shared = {}
+        for gram in grams:
+            for candidate in self.postings.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        scores = sorted(((2 * count / (len(grams) + len(self.grams[candidate])), candidate)
+                         for candidate, count in shared.items()), reverse=True)
+        if not scores or scores[0][0] < TRIGRAM_THRESHOLD:
+            return None
+        if len(scores) > 1 and scores[1][0] == scores[0][0]:
+            return None  # two columns equally close
+        return scores[0][1]
+
+    # the question with multi-word column phrases replaced by their column: "total unit price by store
+    # location" -> "total unit_price by store_location". values after equals, is, with and operators are kept
+    def join_phrases(self, question):
+        spans = list(re.finditer(r"\S+", question))
+        words = [span.group() for span in spans]
+        joined, i = [], 0
+        while i < len(words):
+            word = words[i].lower()
+            if word in VALUE_WORDS:
+                joined.append(question[spans[i].start():].rstrip())  # the value as typed, spacing included
+                break
+            if word in OPERATOR_WORDS:
+                joined.extend(words[i:i + 2])
+                i += 2
+                continue
+            for n in range(MAX_PHRASE_WORDS, 1, -1):
+                phrase = words[i:i + n]
+                if len(phrase) < n or any(w.lower() in STOP_WORDS or w.lower() in OPERATOR_WORDS for w in phrase):
+                    continue
+                column = self.phrase_column(' '.join(phrase))
+                if column is not None:
+                    joined.append(column)
+                    i += n
+                    break
+            else:
+                joined.append(words[i])
+                i += 1
+        return ' '.join(joined)
+
+    # params with the named column slots resolved, unresolved values are left as typed
+    def resolve_params(self, params, names):
+        return {name: (self.resolve(value) or value) if name in names and value else value
+                for name, value in params.items()}
+
+
+# one index per set of columns: a schema change gives a new set and so a new index
+@lru_cache(maxsize=COLUMN_INDEX_CACHE_SIZE)
+def column_index_for(columns):
+    """columns: tuple of column or field names"""
+    return ColumnIndex(columns)
+
+
+# resolution latency on the coffee_shop_sales columns: python column_index.py [rounds]
+if __name__ == "__main__":
+    columns = ('transaction_id', 'transaction_date', 'transaction_time', 'transaction_qty', 'store_id',
+               'store_location', 'product_id', 'unit_price', 'product_category', 'product_type', 'product_detail')
+    words = ['unit_price', 'unit prices', 'Unit-Price', 'transaction quantity', 'location', 'category',
+             'unti_price', 'prodcut_type', 'store', 'sales']
+    questions = ['total unit price by store location', 'average transaction quantity by product type',
+                 'where store location equals Lower Manhattan', 'sort unit price']
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else BENCHMARK_ROUNDS
+
+    started_at = time.perf_counter()
+    index = ColumnIndex(columns)
+    print(f"index of {len(columns)} columns built in {(time.perf_counter() - started_at) * 1000:.3f} ms")
+    for word in words:
+        print(f"    {word!r} -> {index.resolve(word)}")
+    for question in questions:
+        print(f"    {question!r} -> {index.join_phrases(question)!r}")
+    for label, resolve, inputs in [("resolve", index.resolve, words), ("join_phrases", index.join_phrases, questions)]:
+        started_at = time.perf_counter()
+        for _ in range(rounds):
+            for text in inputs:
+                resolve(text)
+        print(f"{label}: {(time.perf_counter() - started_at) / (rounds * len(inputs)) * 1e6:.1f} us per call")
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from pymysql.constants import FIELD_TYPE
+
+# rows decoded per block, only one block of row tuples is alive at a time
+FETCH_BLOCK_ROWS = 10000
+
+# MySQL field type -> column buffer kind
+INTEGER_FIELD_TYPES = {FIELD_TYPE.TINY, FIELD_TYPE.SHORT, FIELD_TYPE.INT24, FIELD_TYPE.LONG,
+                       FIELD_TYPE.LONGLONG, FIELD_TYPE.YEAR}
+FLOAT_FIELD_TYPES = {FIELD_TYPE.FLOAT, FIELD_TYPE.DOUBLE}
+# exact DECIMAL values (money, SUM of DECIMAL columns) stay Decimal objects unless float64 is asked for
+DECIMAL_FIELD_TYPES = {FIELD_TYPE.DECIMAL, FIELD_TYPE.NEWDECIMAL}
+TEMPORAL_FIELD_TYPES = {FIELD_TYPE.DATE, FIELD_TYPE.DATETIME, FIELD_TYPE.TIMESTAMP}
+
+
+def column_kind(type_code, decimal_as_float=False):
+    if type_code in INTEGER_FIELD_TYPES:
+        return 'int'
+    if type_code in FLOAT_FIELD_TYPES or (decimal_as_float and type_code in DECIMAL_FIELD_TYPES):
+        return 'float'
+    if type_code in TEMPORAL_FIELD_TYPES:
+        return 'datetime'
+    return 'object'
+
+
+# one column of a block (an object array) as a typed NumPy array plus a NULL mask,
+# only integers need the mask, NULLs are already NaN / NaT / None in the other kinds
+def column_buffer(values, kind):
+    mask = None
+    try:
+        if kind == 'int':
+            mask = pd.isna(values)
+            if mask.any():
+                values = values.copy()
+                values[mask] = 0
+            return values.astype(np.int64), mask
+        if kind == 'float':
+            # None becomes NaN, Decimal objects (decimal_as_float) lose their exactness
+            return values.astype(np.float64), mask
+        if kind == 'datetime':
+            return pd.to_datetime(values).to_numpy(), mask  # None becomes NaT
+    except (OverflowError, TypeError, ValueError, pd.errors.OutOfBoundsDatetime):
+        pass  # unsigned BIGINT past int64, zero dates returned as strings, ...
+    return values, mask
+
+
+# transpose a block of row tuples into one object array per column (done in C by pandas)
+def block_columns(rows, width):
+    block = pd.DataFrame(rows, columns=range(width), dtype=object)
+    return [block[i].to_numpy() for i in range(width)]
+
+
+# concatenate a column's block buffers into one pandas column
+def build_column(buffers, kind):
+    if not buffers:
+        return pd.Series([], dtype=object)
+    values = np.concatenate([values for values, _ in buffers])
+    if kind == 'int' and any(mask.any() for _, mask in buffers):
+        mask = np.concatenate([mask for _, mask in buffers])
+        if values.dtype == np.int64:
+            return pd.Series(pd.arrays.IntegerArray(values, mask))  # nullable Int64 keeps NULLs without float casts
+        # a block fell back to objects (unsigned BIGINT past int64): the NULLs masked to 0 become None again
+        values = values.astype(object)
+        values[mask] = None
+    return pd.Series(values)
+
+
+# DataFrame from per-column buffers, positional so duplicate column names survive
+def buffers_to_frame(description, kinds, buffers, index=None):
+    columns = [build_column(column_buffers, kind) for column_buffers, kind in zip(buffers, kinds)]
+    frame = pd.concat(columns, axis=1) if columns else pd.DataFrame()
+    frame.columns = [desc[0] for desc in description]
+    if index is not None:
+        frame.index = index
+    return frame
+
+
+# decode a block of row tuples column by column
+def rows_to_frame(rows, description, index=None, decimal_as_float=False):
+    kinds = [column_kind(desc[1], decimal_as_float) for desc in description]
+    if rows:
+        buffers = [[column_buffer(values, kind)] for values, kind in zip(block_columns(rows, len(kinds)), kinds)]
+    else:
+        buffers = [[] for _ in kinds]
+    return buffers_to_frame(description, kinds, buffers, index)
+
+
+# read an executed cursor's whole result into typed column buffers, block by block
+def fetch_columnar(cursor, block_rows=FETCH_BLOCK_ROWS, decimal_as_float=False):
+    """
+    with an unbuffered (SS) cursor the row tuples of a block are freed once the block is
+    copied into its int64/float64/datetime64 columns, so the full result never exists as
+    Python row objects, and pandas gets typed arrays instead of inferring types per row.
+    DECIMAL columns stay object columns of exact Decimal values, as pandas returned them;
+    decimal_as_float=True stores them as float64 instead, faster but rounded.
+    """
+    description = cursor.description
+    kinds = [column_kind(desc[1], decimal_as_float) for desc in description]
+    buffers = [[] for _ in kinds]
+    while True:
+        rows = cursor.fetchmany(block_rows)
+        if not rows:
+            break
+        for column_buffers, values, kind in zip(buffers, block_columns(rows, len(kinds)), kinds):
+            column_buffers.append(column_buffer(values, kind))
+    return buffers_to_frame(description, kinds, buffers)
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# threads running queries at once, kept below the connection pool's POOL_MAX_SIZE
+DEFAULT_MAX_WORKERS = 4
+
+
+# run a single task and time it, errors are returned instead of raised so one bad query does not stop the rest
+def timed_call(key, task):
+    started_at = time.perf_counter()
+    try:
+        result, error = task(), None
+    except Exception as err:
+        result, error = None, err
+    return {'key': key, 'result': result, 'error': error, 'seconds': time.perf_counter() - started_at}
+
+
+# fan independent tasks out over a bounded thread pool
+def run_concurrently(tasks, max_workers=DEFAULT_MAX_WORKERS, on_cancel=None):
+    """
+    tasks: list of (key, callable) pairs, each callable takes no arguments and borrows
+    its own connection (or uses a thread-safe client) so workers never share a socket.
+    yields {'key', 'result', 'error', 'seconds'} for each task as soon as it completes.
+    on Ctrl-C, on_cancel() stops the running queries on the server (KILL QUERY, killOp) before
+    KeyboardInterrupt is re-raised, without waiting for the running tasks to finish.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)))
+    cancelled = False
+    try:
+        futures = [pool.submit(timed_call, key, task) for key, task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+    except KeyboardInterrupt:
+        cancelled = True
+        if on_cancel is not None:
+            on_cancel()
+        raise
+    finally:
+        # queued tasks are dropped; after an early stop the running ones end at their deadline,
+        # after Ctrl-C they were killed and are not waited for
+        pool.shutdown(wait=not cancelled, cancel_futures=True)
+
+
+# print wall time against the summed query time, and the query that bounded the wall time
+def report_concurrency(outcomes, started_at):
+    if not outcomes:
+        return None
+    wall_seconds = time.perf_counter() - started_at
+    query_seconds = sum(outcome['seconds'] for outcome in outcomes)
+    slowest = max(outcomes, key=lambda outcome: outcome['seconds'])
+    print(f"Ran {len(outcomes)} queries in {wall_seconds:.2f}s "
+          f"({query_seconds:.2f}s one after another, slowest {slowest['seconds']:.2f}s).")
+    return {'queries': len(outcomes), 'wall_seconds': wall_seconds, 'query_seconds': query_seconds}
@@ -0,0 +1,228 @@
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pymysql
+
+# MySQL server settings shared by every connection ChatDB opens
+MYSQL_CONFIG = {
+    'host': 'localhost',
+    'user': 'root',  # MySQL username
+    'password': 'Dsci-551',  # MySQL password
+    'local_infile': True,  # allow the LOAD DATA LOCAL INFILE bulk load strategy
+}
+
+# pool sizing and maintenance
+POOL_MIN_SIZE = 1  # connections kept open even when idle
+POOL_MAX_SIZE = 8  # connections open at once per database
+POOL_IDLE_TIMEOUT = 300  # seconds before an idle connection above POOL_MIN_SIZE is closed
+POOL_HEALTH_CHECK_INTERVAL = 30  # idle seconds after which a connection is pinged before reuse
+POOL_ACQUIRE_TIMEOUT = 30  # seconds to wait for a free connection when the pool is full
+
+
+class PooledConnection:
+    """A pymysql connection borrowed from a pool, close() gives it back instead of closing it."""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.last_used = time.monotonic()
+        self.in_use = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def database(self):
+        return self._pool.database
+
+    def close(self):
+        self._pool.release(self)
+
+    def discard(self):
+        """Close the underlying socket, e.g. after an interrupted read left it in an unknown state."""
+        self._pool.discard(self)
+
+    def reconnect(self):
+        """Reopen the underlying socket in place, the borrower keeps using this object."""
+        self._pool._close_quietly(self)
+        self._raw.connect()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MySQLConnectionPool:
+    """Thread-safe pool of connections to one database (or to no database when database is None)."""
+
+    def __init__(self, database=None, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                 idle_timeout=POOL_IDLE_TIMEOUT, health_check_interval=POOL_HEALTH_CHECK_INTERVAL):
+        self.database = database
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self._idle = deque()  # oldest on the left, most recently used on the right
+        self._size = 0  # open connections, idle or borrowed
+        self._cond = threading.Condition()
+        self.created = 0
+        self.reused = 0
+
+    def _open(self):
+        raw = pymysql.connect(database=self.database, **MYSQL_CONFIG)
+        self.created += 1
+        return PooledConnection(self, raw)
+
+    def _close_quietly(self, conn):
+        try:
+            conn._raw.close()
+        except pymysql.Error:
+            pass
+
+    def _evict_idle(self):
+        # called with the lock held
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size and now - self._idle[0].last_used > self.idle_timeout:
+            self._close_quietly(self._idle.popleft())
+            self._size -= 1
+
+    def warm(self):
+        """Open connections up to min_size so the first requests skip the handshake."""
+        with self._cond:
+            missing = self.min_size - self._size
+            self._size += max(missing, 0)
+        opened = []
+        try:
+            for _ in range(max(missing, 0)):
+                opened.append(self._open())
+        finally:
+            with self._cond:
+                self._size -= max(missing, 0) - len(opened)
+                self._idle.extend(opened)
+                self._cond.notify_all()
+
+    def acquire(self, timeout=POOL_ACQUIRE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._evict_idle()
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free MySQL connection after {timeout}s (max_size={self.max_size})")
+                self._cond.wait(remaining)
+
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        else:
+            self.reused += 1
+            if time.monotonic() - conn.last_used > self.health_check_interval:
+                try:
+                    # reconnects in place if the server dropped the idle connection
+                    conn._raw.ping(reconnect=True)
+                except pymysql.Error:
+                    self.discard(conn)
+                    raise
+        conn.in_use = True
+        return conn
+
+    def release(self, conn):
+        if not conn.in_use:
+            return
+        conn.in_use = False
+        try:
+            # end any open transaction so the next borrower starts clean
+            conn._raw.rollback()
+        except pymysql.Error:
+            self.discard(conn)
+            return
+        with self._cond:
+            conn.last_used = time.monotonic()
+            self._idle.append(conn)
+            self._evict_idle()
+            self._cond.notify()
+
+    def discard(self, conn):
+        conn.in_use = False
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=POOL_ACQUIRE_TIMEOUT):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except pymysql.OperationalError:
+            # lost or interrupted connection, do not hand it out again
+            conn.discard()
+            raise
+        finally:
+            conn.close()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._close_quietly(self._idle.pop())
+                self._size -= 1
+
+    def stats(self):
+        with self._cond:
+            return {'database': self.database, 'open': self._size, 'idle': len(self._idle),
+                    'created': self.created, 'reused': self.reused}
+
+
+# database a connection is bound to, for pooled and plain pymysql connections
+def connection_database(connection):
+    if isinstance(connection, PooledConnection):
+        return connection.database
+    return connection.db.decode() if isinstance(connection.db, bytes) else connection.db
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+
+
+# shared pool for a database, one registry per process (pools are not shared across fork)
+def get_pool(database=None):
+    global _pools, _pools_pid
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools, _pools_pid = {}, os.getpid()
+        pool = _pools.get(database)
+        if pool is None:
+            pool = _pools[database] = MySQLConnectionPool(database)
+            created = True
+        else:
+            created = False
+    if created:
+        pool.warm()
+    return pool
+
+
+@atexit.register
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
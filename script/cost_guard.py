@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import time
+
+import pymysql
+
+from connection_pool import connection_database
+from query_cache import normalize_question, is_sql_result_cached, show_cached_sql_result, cached_sql_query
+from sample_queries import execute_query
+from query_timeout import timeout_for
+
+# decisions, from cheapest to most expensive
+COST_ACTIONS = ('run', 'limit', 'stream', 'confirm')
+# estimated rows up to which a query runs as is
+RUN_MAX_ROWS = 10000
+# row-returning queries above RUN_MAX_ROWS get this LIMIT when they have none
+INJECTED_LIMIT = 1000
+# full table scans estimated above this many rows are confirmed with the user first
+CONFIRM_SCAN_ROWS = 1000000
+# one JSON line per guarded query: estimate, decision and question shape
+COST_LOG_PATH = os.path.join('.chatdb_logs', 'cost_guard.jsonl')
+
+
+# every "table" node of an EXPLAIN FORMAT=JSON plan, nested loops and ordering/grouping operations included
+def plan_tables(node):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            if key == 'table' and isinstance(value, dict):
+                yield value
+            yield from plan_tables(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from plan_tables(item)
+
+
+# estimated rows, access types and cost of a query from EXPLAIN FORMAT=JSON
+def explain_query(connection, query):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN FORMAT=JSON {query}")
+        plan = json.loads(cursor.fetchone()[0])
+    tables = list(plan_tables(plan))
+    return {
+        'estimated_rows': sum(int(table.get('rows_examined_per_scan', 0)) for table in tables),
+        'access_types': [table.get('access_type') for table in tables],
+        'query_cost': plan.get('query_block', {}).get('cost_info', {}).get('query_cost'),
+    }
+
+
+def has_limit(query):
+    return re.search(r"\bLIMIT\s+\d+", query, re.IGNORECASE) is not None
+
+
+def is_aggregate(query):
+    return re.search(r"\bGROUP\s+BY\b|\b(COUNT|SUM|AVG|MIN|MAX)\s*\(", query, re.IGNORECASE) is not None
+
+
+# pick an action from the estimate
+def choose_action(query, estimate, run_max_rows=RUN_MAX_ROWS, confirm_scan_rows=CONFIRM_SCAN_ROWS):
+    """
+    run:     estimate at most run_max_rows
+    confirm: full scan ('ALL') estimated above confirm_scan_rows
+    limit:   row-returning query without a LIMIT, gets INJECTED_LIMIT
+    stream:  anything else, shown page by page without keeping the result
+    """
+    rows = estimate['estimated_rows']
+    if rows <= run_max_rows:
+        return 'run'
+    if 'ALL' in estimate['access_types'] and rows > confirm_scan_rows:
+        return 'confirm'
+    if not has_limit(query) and not is_aggregate(query):
+        return 'limit'
+    return 'stream'
+
+
+# question with its literal values removed, so "x greater than 5" and "x greater than 50" share a shape
+def question_shape(question):
+    shape = re.sub(r"'[^']*'|\"[^\"]*\"", "?", normalize_question(question))
+    return re.sub(r"\b\d+(\.\d+)?\b", "?", shape)
+
+
+def log_decision(record, path=COST_LOG_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+# explain, decide and run a generated query
+def run_guarded(connection, table_name, query, question=None, run_max_rows=RUN_MAX_ROWS,
+                confirm_scan_rows=CONFIRM_SCAN_ROWS, limit=INJECTED_LIMIT, timeout=None):
+    """
+    cached results are shown without an EXPLAIN. otherwise the query is explained and either
+    run, run with a LIMIT, streamed without caching, or confirmed with the user first.
+    timeout defaults to the 'sql_question' intent's deadline.
+    returns the action taken ('cached', one of COST_ACTIONS, or 'skipped').
+    """
+    timeout = timeout_for('sql_question') if timeout is None else timeout
+    if is_sql_result_cached(connection, table_name, query):
+        show_cached_sql_result(connection, table_name, query)
+        return 'cached'
+
+    record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'database': connection_database(connection),
+              'table': table_name, 'question_shape': question_shape(question) if question else None,
+              'query': query}
+    try:
+        estimate = explain_query(connection, query)
+        action = choose_action(query, estimate, run_max_rows, confirm_scan_rows)
+    except (pymysql.MySQLError, ValueError, TypeError) as err:
+        # the guard never blocks a query it cannot explain
+        estimate, action = {'error': str(err)}, 'run'
+    record.update(estimate, action=action)
+
+    if action == 'confirm':
+        print(f"Warning: this query scans the whole table (about {estimate['estimated_rows']:,} rows).")
+        if input("Run it anyway? (y/n): ").strip().lower() != 'y':
+            record['action'] = action = 'skipped'
+            log_decision(record)
+            print("Query not run.")
+            return action
+    if action == 'limit':
+        query = f"{query.rstrip().rstrip(';')} LIMIT {limit}"
+        print(f"About {estimate['estimated_rows']:,} rows expected, showing the first {limit}:\n{query}\n")
+    record['executed_query'] = query
+    log_decision(record)
+
+    if action in ('stream', 'confirm'):
+        show_cached_sql_result(connection, table_name, query, keep_rows=0, timeout=timeout)  # too large to keep
+    else:
+        show_cached_sql_result(connection, table_name, query, timeout=timeout)
+    return action
+
+
+# explain, decide and run a generated query without prompting, for callers that return rows
+def guarded_rows(connection, table_name, query, max_rows, confirm=False, question=None, timeout=None):
+    """
+    non-interactive run_guarded: small results come from (and go to) the result cache, larger ones
+    stop reading after max_rows + 1 rows so the caller can tell the result was cut.
+    a 'confirm' query only runs when confirm is set, otherwise the DataFrame is None.
+    returns (action, DataFrame).
+    """
+    timeout = timeout_for('sql_question') if timeout is None else timeout
+    record = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'database': connection_database(connection),
+              'table': table_name, 'question_shape': question_shape(question) if question else None,
+              'query': query}
+    try:
+        estimate = explain_query(connection, query)
+        action = choose_action(query, estimate)
+    except (pymysql.MySQLError, ValueError, TypeError) as err:
+        estimate, action = {'error': str(err)}, 'run'
+    if action == 'confirm' and not confirm:
+        record.update(estimate, action='skipped')
+        log_decision(record)
+        return 'skipped', None
+    record.update(estimate, action=action, executed_query=query)
+    log_decision(record)
+    if action == 'run':
+        return action, cached_sql_query(connection, table_name, query, timeout=timeout)
+    return action, execute_query(connection, query, max_rows=max_rows + 1, timeout=timeout)
@@ -0,0 +1,89 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_DIR = os.path.join(REPO_ROOT, 'script')
+# entry points whose cold start is tracked, each imported as a module without running main()
+ENTRY_POINTS = ('main', 'server')
+# dependencies that must not load before the first SQL or NoSQL state
+DEFERRED_MODULES = ('pandas', 'numpy', 'pymysql', 'pymongo', 'bson', 'nltk', 'requests')
+BENCHMARK_RUNS = 5
+# budget for 'import main' in milliseconds, the menu needs only the standard library
+MAIN_BUDGET_MS = 100
+
+
+# (module, self us, cumulative us, depth) of every line of python -X importtime's report
+def parse_importtime(report):
+    modules = []
+    for line in report.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+# one cold interpreter importing the entry point, the import tree as python -X importtime reports it
+def import_profile(entry_point):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SCRIPT_DIR, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {entry_point}'],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {entry_point} failed:\n{result.stderr.strip().splitlines()[-1]}")
+    return parse_importtime(result.stderr)
+
+
+# milliseconds spent importing the entry point itself, interpreter start-up excluded
+def entry_point_ms(modules, entry_point):
+    return next(cumulative for name, _, cumulative, depth in modules if name == entry_point and depth == 0) / 1000
+
+
+# modules the entry point imports directly, slowest first. importtime lists a module after its imports
+def direct_imports(modules, entry_point):
+    end = next(i for i, (name, _, _, depth) in enumerate(modules) if name == entry_point and depth == 0)
+    start = max([i + 1 for i in range(end) if modules[i][3] == 0], default=0)
+    return sorted((m for m in modules[start:end] if m[3] == 1), key=lambda m: -m[2])
+
+
+# top-level packages of the deferred dependencies that were imported anyway
+def eager_dependencies(modules):
+    return sorted({name.split('.')[0] for name, _, _, _ in modules if name.split('.')[0] in DEFERRED_MODULES})
+
+
+# cold-start report: median import time over runs, the slowest imports and any eager dependency.
+# exits 1 when 'import main' is over budget or loads a deferred dependency, for CI
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the cold-start import time of ChatDB's entry points.")
+    parser.add_argument("entry_points", nargs='*', default=list(ENTRY_POINTS))
+    parser.add_argument("--runs", type=int, default=BENCHMARK_RUNS)
+    parser.add_argument("--budget-ms", type=float, default=MAIN_BUDGET_MS, help="budget for 'import main'")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports listed per entry point")
+    args = parser.parse_args()
+
+    failures = []
+    for entry_point in args.entry_points:
+        try:
+            profiles = [import_profile(entry_point) for _ in range(args.runs)]
+        except RuntimeError as err:
+            print(f"Error: {err}")
+            failures.append(entry_point)
+            continue
+        median_ms = statistics.median(entry_point_ms(modules, entry_point) for modules in profiles)
+        modules = profiles[-1]
+        eager = eager_dependencies(modules)
+        print(f"import {entry_point}: {median_ms:.1f} ms median of {args.runs} cold runs, {len(modules)} modules")
+        for name, _, cumulative, _ in direct_imports(modules, entry_point)[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+        if entry_point == 'main':
+            if eager:
+                print(f"    loaded at startup: {', '.join(eager)}")
+                failures.append(entry_point)
+            if median_ms > args.budget_ms:
+                print(f"    over the {args.budget_ms:.0f} ms budget")
+                failures.append(entry_point)
+
+    sys.exit(1 if failures else 0)
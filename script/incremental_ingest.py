@@ -0,0 +1,197 @@
+import json
+import os
+import time
+
+import pandas as pd
+
+from set_up_db import convert_date_columns, detect_date_formats
+from bulk_loader import bulk_load, build_insert_sql, dataframe_to_rows, report_throughput, DEFAULT_STRATEGY, DEFAULT_BATCH_SIZE
+from stream_ingest import widen_columns, DEFAULT_CHUNK_SIZE
+from type_profiler import normalize_mysql_type, profile_dataframe, type_family
+
+INCREMENTAL_MODES = ('append', 'upsert')
+# directory holding one checkpoint file per table being loaded
+CHECKPOINT_DIR = '.chatdb_checkpoints'
+
+
+# check if a table exists in the current database
+def table_exists(connection, table_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name,)
+        )
+        return cursor.fetchone() is not None
+
+
+# column types and primary key of an existing table
+def get_table_definition(connection, table_name):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COLUMN_NAME, COLUMN_TYPE, COLUMN_KEY FROM information_schema.COLUMNS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s ORDER BY ORDINAL_POSITION",
+            (table_name,)
+        )
+        rows = cursor.fetchall()
+    column_types = {name: normalize_mysql_type(column_type) for name, column_type, _ in rows}
+    primary_key = [name for name, _, key in rows if key == 'PRI']
+    return column_types, primary_key
+
+
+# pick the watermark column: the first date column, else a single integer primary key.
+# only columns of the CSV qualify, a surrogate key (row_id) is numbered by the table, not the file
+def choose_watermark_column(column_types, primary_key, csv_columns):
+    for column, column_type in column_types.items():
+        if column_type in ("DATE", "DATETIME") and column in csv_columns:
+            return column
+    if (len(primary_key) == 1 and primary_key[0] in csv_columns
+            and type_family(column_types[primary_key[0]]) == "integer"):
+        return primary_key[0]
+    return None
+
+
+# highest watermark value already loaded
+def get_watermark(connection, table_name, watermark_column):
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT MAX(`{watermark_column}`) FROM `{table_name}`")
+        return cursor.fetchone()[0]
+
+
+# rows of a converted chunk past the watermark; upsert keeps the boundary value since it is idempotent.
+# append skips the boundary value: on a DATE watermark, rows dated on the last loaded day that were not
+# loaded yet are dropped (the caller warns), upsert picks them up
+def filter_past_watermark(chunk, watermark_column, watermark, column_type, mode):
+    if watermark is None or watermark_column is None:
+        return chunk
+    values = chunk[watermark_column]
+    if column_type in ("DATE", "DATETIME"):
+        values, watermark = pd.to_datetime(values, errors='coerce'), pd.Timestamp(watermark)
+    keep = values >= watermark if mode == 'upsert' else values > watermark
+    return chunk[keep.fillna(False)]
+
+
+# checkpoint file of a table
+def checkpoint_path(table_name):
+    return os.path.join(CHECKPOINT_DIR, f"{table_name}.json")
+
+
+# a checkpoint is only valid for the same table, file and file version
+def load_checkpoint(table_name, csv_file_path, mode):
+    path = checkpoint_path(table_name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    stat = os.stat(csv_file_path)
+    if (checkpoint.get('csv') != os.path.abspath(csv_file_path) or checkpoint.get('size') != stat.st_size
+            or checkpoint.get('mtime') != stat.st_mtime or checkpoint.get('mode') != mode):
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint):
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    tmp_path = checkpoint_path(checkpoint['table']) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, default=str)
+    os.replace(tmp_path, checkpoint_path(checkpoint['table']))
+
+
+def clear_checkpoint(table_name):
+    if os.path.exists(checkpoint_path(table_name)):
+        os.remove(checkpoint_path(table_name))
+
+
+# INSERT ... ON DUPLICATE KEY UPDATE in batches, committing after each batch
+def upsert_rows(connection, table_name, dataframe, primary_key):
+    update_columns = [col for col in dataframe.columns if col not in primary_key] or list(dataframe.columns)
+    updates = ', '.join([f"`{col}` = VALUES(`{col}`)" for col in update_columns])
+    sql = f"{build_insert_sql(table_name, dataframe.columns)} ON DUPLICATE KEY UPDATE {updates}"
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, dataframe_to_rows(dataframe))
+    connection.commit()
+
+
+# append or upsert the rows of a CSV past the table's watermark, resumable from a checkpoint
+def incremental_upload_to_mysql(connection, table_name, csv_file_path, mode='append', watermark_column=None,
+                                chunk_size=DEFAULT_CHUNK_SIZE, strategy=DEFAULT_STRATEGY, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    mode: 'append' inserts rows past the watermark, 'upsert' also rewrites rows whose key already exists
+    watermark_column: column compared against MAX() in the table, detected when omitted;
+    'append' needs one (ValueError otherwise) and skips rows equal to the watermark
+    the table, its data and its indexes are kept. progress is saved after every committed batch
+    so a rerun after an interruption continues from the last batch.
+    returns the load stats, or None when the table does not exist yet.
+    """
+    if mode not in INCREMENTAL_MODES:
+        raise ValueError(f"Unknown incremental mode '{mode}', expected one of {INCREMENTAL_MODES}")
+    if not table_exists(connection, table_name):
+        return None
+
+    column_types, primary_key = get_table_definition(connection, table_name)
+    csv_columns = list(pd.read_csv(csv_file_path, nrows=0).columns)
+    if mode == 'upsert' and not primary_key:
+        raise ValueError(f"Table '{table_name}' has no primary key to upsert on")
+    if mode == 'upsert' and any(col not in csv_columns for col in primary_key):
+        # a surrogate key is never in the file, ON DUPLICATE KEY would never fire and rows would be duplicated
+        raise ValueError(f"Primary key {primary_key} of table '{table_name}' is not in the CSV, use 'append' instead")
+    if watermark_column and watermark_column not in csv_columns:
+        raise ValueError(f"Watermark column '{watermark_column}' is not a column of the CSV")
+
+    checkpoint = load_checkpoint(table_name, csv_file_path, mode)
+    if checkpoint and checkpoint['watermark_column'] not in (None, *csv_columns):
+        checkpoint = None  # saved with a watermark outside the file (surrogate key), start over
+    if checkpoint:
+        watermark_column, watermark = checkpoint['watermark_column'], checkpoint['watermark']
+        print(f"Resuming load of '{table_name}' after {checkpoint['rows_done']} rows.")
+    else:
+        watermark_column = watermark_column or choose_watermark_column(column_types, primary_key, csv_columns)
+        watermark = get_watermark(connection, table_name, watermark_column) if watermark_column else None
+        stat = os.stat(csv_file_path)
+        checkpoint = {
+            'table': table_name, 'csv': os.path.abspath(csv_file_path), 'size': stat.st_size,
+            'mtime': stat.st_mtime, 'mode': mode, 'watermark_column': watermark_column,
+            'watermark': watermark, 'rows_done': 0,
+        }
+    if watermark_column is None and mode == 'append':
+        # without a watermark every rerun would insert the whole file again
+        raise ValueError(f"No watermark column for '{table_name}': the CSV has no DATE column and no integer key, "
+                         f"pass watermark_column or use 'upsert'")
+    print(f"Watermark: {watermark_column} = {watermark}")
+    if mode == 'append' and watermark is not None and column_types.get(watermark_column) == "DATE":
+        print(f"Note: rows dated {watermark} are treated as loaded, new rows of that day are skipped "
+              f"(use 'upsert' to include them).")
+
+    started_at = time.perf_counter()
+    rows_seen = 0  # delta rows before the current chunk, used to skip rows loaded before a resume
+    total_rows = 0
+    for chunk in pd.read_csv(csv_file_path, chunksize=chunk_size):
+        unknown = [col for col in chunk.columns if col not in column_types]
+        if unknown:
+            raise ValueError(f"CSV columns {unknown} do not exist in table '{table_name}'")
+
+        date_formats = detect_date_formats(chunk, profile_dataframe(chunk))
+        date_formats = {col: fmt for col, fmt in date_formats.items() if column_types[col] == "DATE"}
+        widen_columns(connection, table_name, chunk, column_types, date_formats)
+        convert_date_columns(chunk, date_formats)
+
+        delta = filter_past_watermark(chunk, watermark_column, watermark,
+                                      column_types.get(watermark_column), mode)
+        skip = max(0, checkpoint['rows_done'] - rows_seen)
+        rows_seen += len(delta)
+        delta = delta.iloc[skip:]
+
+        for start in range(0, len(delta), batch_size):
+            batch = delta.iloc[start:start + batch_size]
+            if mode == 'upsert':
+                upsert_rows(connection, table_name, batch, primary_key)
+            else:
+                bulk_load(connection, table_name, batch, strategy=strategy, batch_size=batch_size, report=False)
+            total_rows += len(batch)
+            checkpoint['rows_done'] += len(batch)
+            save_checkpoint(checkpoint)
+
+    clear_checkpoint(table_name)
+    print(f"New watermark: {watermark_column} = "
+          f"{get_watermark(connection, table_name, watermark_column) if watermark_column else None}")
+    return report_throughput(table_name, total_rows, started_at, f"{mode}/{strategy}")
@@ -0,0 +1,124 @@
+import re
+import sys
+import time
+from functools import lru_cache
+
+# questions used by the micro-benchmark
+BENCHMARK_QUESTIONS = [
+    "find all data",
+    "find name equals Alice",
+    "find all where age > 30",
+    "find name where age >= 21",
+    "total sales by region",
+    "average price by category",
+    "count by country",
+    "group users by country",
+    "sort products by price descending",
+    "having total sales > 100 grouped by region",
+    "join orders with users on user_id as buyer",
+    "example queries with group",
+    "what is the weather like",
+]
+BENCHMARK_ROUNDS = 2000
+
+
+class IntentMatcher:
+    """
+    Intent patterns compiled once and tried in explicit priority order (first pattern first).
+
+    a single regex joining every pattern as (?=(?P<iN>...)) alternatives answers in one scan,
+    but sre then tries all alternatives at every position of the question and loses the literal
+    prefix search of each pattern ("find ", "total ", ...): the benchmark below measured it
+    5x slower than searching the precompiled patterns in turn, so that is what this does.
+    """
+
+    def __init__(self, patterns, flags=0):
+        self.patterns = [(intent, re.compile(pattern, flags)) for intent, pattern in patterns]
+
+    # (intent, params) of every matching pattern by priority, lazily
+    def matches(self, text):
+        for intent, regex in self.patterns:
+            match = regex.search(text)
+            if match:
+                yield intent, match.groupdict()
+
+    # best intent and its params, (None, {}) when nothing matches
+    def match(self, text):
+        for intent, regex in self.patterns:
+            match = regex.search(text)
+            if match:
+                return intent, match.groupdict()
+        return None, {}
+
+
+# one compiled matcher per pattern set, shared by every NLPProcessor and question
+@lru_cache(maxsize=None)
+def compile_intents(patterns, flags=0):
+    """patterns: tuple of (intent, regex) pairs in priority order"""
+    return IntentMatcher(patterns, flags)
+
+
+# questions per second of a parse function over BENCHMARK_QUESTIONS
+def questions_per_second(parse, questions=BENCHMARK_QUESTIONS, rounds=BENCHMARK_ROUNDS):
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        for question in questions:
+            parse(question)
+    return rounds * len(questions) / (time.perf_counter() - started_at)
+
+
+# micro-benchmark: the compiled matcher against the former uncompiled re.search calls and a single
+# combined lookahead alternation
+if __name__ == "__main__":
+    from nlp_processor import NLPProcessor
+    from nlp_matching import SQL_INTENT_PATTERNS
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else BENCHMARK_ROUNDS
+    nlp = NLPProcessor()
+
+    def uncompiled(patterns):
+        def parse(question):
+            for intent, pattern in patterns:
+                match = re.search(pattern, question)
+                if match:
+                    return intent, match.groupdict()
+            return None, {}
+        return parse
+
+    def combined(patterns):
+        # named groups get a per-pattern prefix, patterns reuse names such as field
+        alternatives = [f"(?=(?P<i{i}>" + re.sub(r"\(\?P<(\w+)>", f"(?P<i{i}_" + r"\1>", pattern) + "))"
+                        for i, (_, pattern) in enumerate(patterns)]
+        regex = re.compile("|".join(alternatives))
+
+        def parse(question):
+            best = None
+            for match in regex.finditer(question):
+                priority = int(match.lastgroup[1:])  # the outer iN group closes last
+                if best is None or priority < best[0]:
+                    best = (priority, match)
+            if best is None:
+                return None, {}
+            priority, match = best
+            prefix = f"i{priority}_"
+            return patterns[priority][0], {name[len(prefix):]: value for name, value in match.groupdict().items()
+                                           if name.startswith(prefix)}
+        return parse
+
+    sql_questions = [
+        "total sales by region", "average price by category", "count rows by store",
+        "where price greater than 10", "filter store equals downtown", "sort price",
+        "having total sales greater than 100 group by region", "show me everything",
+    ]
+    for label, patterns, questions in [
+        ("NoSQL intents", tuple(nlp.patterns.items()), BENCHMARK_QUESTIONS),
+        ("SQL intents", SQL_INTENT_PATTERNS, sql_questions),
+    ]:
+        matcher = compile_intents(patterns)
+        mismatches = [q for q in questions
+                      if not uncompiled(patterns)(q) == combined(patterns)(q) == matcher.match(q)]
+        rates = [questions_per_second(parse, questions, rounds)
+                 for parse in (uncompiled(patterns), combined(patterns), matcher.match)]
+        print(f"{label} ({len(patterns)} patterns): re.search on pattern strings {rates[0]:,.0f} q/s, "
+              f"one combined regex {rates[1]:,.0f} q/s, IntentMatcher {rates[2]:,.0f} q/s "
+              f"({rates[2] / rates[0]:.1f}x); mismatches: {mismatches or 'none'}")
@@ -0,0 +1,174 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from type_profiler import parse_mysql_type, BYTES_PER_CHAR, FIXED_TYPE_BYTES
+
+# above this many rows distinct counts come from HyperLogLog sketches instead of exact sorting
+EXACT_DISTINCT_LIMIT = 1000000
+# HyperLogLog precision, 2**14 registers give about 0.8% standard error
+HLL_PRECISION = 14
+# columns considered for composite keys, and the widest composite key tried
+COMPOSITE_KEY_COLUMNS = 6
+MAX_KEY_WIDTH = 3
+# name of the AUTO_INCREMENT column added when the data has no natural key
+SURROGATE_KEY_COLUMN = 'row_id'
+# widest InnoDB index key in bytes (error 1071 above it), TEXT columns cannot be keys at all (error 1170)
+MAX_KEY_BYTES = 3072
+
+# odd 64-bit multiplier used to combine column hashes
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+class HyperLogLog:
+    """Approximate distinct counter over 64-bit hashes, mergeable across chunks."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        index = (hashes >> np.uint64(64 - self.precision)).astype(np.int64)
+        rest = hashes << np.uint64(self.precision)
+        # rank = position of the first 1 bit in the remaining bits
+        bit_length = np.zeros(len(rest), dtype=np.int64)
+        nonzero = rest != 0
+        bit_length[nonzero] = np.floor(np.log2(rest[nonzero].astype(np.float64))).astype(np.int64) + 1
+        rank = np.where(nonzero, 64 - bit_length + 1, 64 - self.precision + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if raw <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)  # small range correction
+        return raw
+
+
+# one hash per row for every column, NULLs are tracked separately
+def hash_columns(dataframe):
+    hashes, has_nulls = {}, {}
+    for column in dataframe.columns:
+        series = dataframe[column]
+        hashes[column] = pd.util.hash_pandas_object(series, index=False).to_numpy()
+        has_nulls[column] = bool(series.isna().any())
+    return hashes, has_nulls
+
+
+# exact distinct count for small inputs, HyperLogLog estimate for large ones
+def count_distinct(hashes):
+    if len(hashes) <= EXACT_DISTINCT_LIMIT:
+        return len(np.unique(hashes)), False
+    sketch = HyperLogLog()
+    sketch.add(hashes)
+    return int(round(sketch.estimate())), True
+
+
+# bytes of an index entry on these columns, None when one of them is TEXT
+def key_bytes(columns, column_types):
+    total = 0
+    for column in columns:
+        name, first, _ = parse_mysql_type(column_types[column])
+        if name == "TEXT":
+            return None
+        if name == "VARCHAR":
+            total += first * BYTES_PER_CHAR
+        elif name == "DECIMAL":
+            total += (first + 1) // 2 + 1
+        else:
+            total += FIXED_TYPE_BYTES.get(name, 8)
+    return total
+
+
+# whether MySQL can declare these columns as a primary key, always True without types
+def key_fits(columns, column_types):
+    if column_types is None:
+        return True
+    size = key_bytes(columns, column_types)
+    return size is not None and size <= MAX_KEY_BYTES
+
+
+# preference between equally unique keys: id-like names, then integers, then strings
+def key_preference(dataframe, columns):
+    score = 0
+    for column in columns:
+        dtype = dataframe[column].dtype
+        if 'id' in column.lower():
+            score -= 2
+        if pd.api.types.is_integer_dtype(dtype):
+            score -= 1
+        elif pd.api.types.is_float_dtype(dtype):
+            score += 2
+    return score
+
+
+# ranked single-column and composite candidate keys
+def discover_candidate_keys(dataframe, max_width=MAX_KEY_WIDTH, column_types=None):
+    """
+    hashes every column once, then checks uniqueness on the hashes.
+    with column_types ({column: MySQL type}), keys MySQL cannot index (TEXT, over MAX_KEY_BYTES) are skipped.
+    returns (candidates, cardinalities): candidates is a list of column lists, best key first,
+    cardinalities maps each column to (distinct count, whether the count is a HyperLogLog estimate).
+    composite keys are only tried when no single column is unique.
+    """
+    total_rows = len(dataframe)
+    if total_rows == 0:
+        return [], {}
+    hashes, has_nulls = hash_columns(dataframe)
+    column_order = {column: i for i, column in enumerate(dataframe.columns)}
+
+    distinct, cardinalities = {}, {}
+    candidates = []
+    for column in dataframe.columns:
+        distinct[column], approximate = count_distinct(hashes[column])
+        cardinalities[column] = (distinct[column], approximate)
+        if not has_nulls[column] and distinct[column] >= total_rows * (0.98 if approximate else 1):
+            # an estimate may be off either way, confirm the column really is unique
+            if approximate and len(np.unique(hashes[column])) < total_rows:
+                continue
+            if key_fits([column], column_types):
+                candidates.append([column])
+
+    if not candidates:
+        # composite keys from the highest-cardinality non-null columns
+        pool = sorted(
+            [column for column in dataframe.columns if not has_nulls[column] and distinct[column] > 1],
+            key=lambda column: -distinct[column]
+        )[:COMPOSITE_KEY_COLUMNS]
+        for width in range(2, max_width + 1):
+            for columns in combinations(pool, width):
+                if np.prod([float(distinct[column]) for column in columns]) < total_rows:
+                    continue  # not enough combinations to be unique
+                if any(set(found) <= set(columns) for found in candidates):
+                    continue  # a narrower key already covers these columns
+                if not key_fits(columns, column_types):
+                    continue
+                combined = hashes[columns[0]].copy()
+                for column in columns[1:]:
+                    combined = combined * HASH_MULTIPLIER + hashes[column]
+                if len(np.unique(combined)) == total_rows:
+                    candidates.append(list(columns))
+            if candidates:
+                break
+
+    candidates.sort(key=lambda columns: (
+        len(columns),
+        key_preference(dataframe, columns),
+        min(column_order[column] for column in columns),
+    ))
+    return candidates, cardinalities
+
+
+# surrogate key column name that does not clash with the data columns
+def surrogate_key_name(columns):
+    name = SURROGATE_KEY_COLUMN
+    while name in columns:
+        name = f"_{name}"
+    return name
@@ -1,10 +1,10 @@
-import re
 import sys
-import pymysql
-import pandas as pd
-from nltk.stem import PorterStemmer
-from nltk.tokenize import word_tokenize
 from sample_queries import connect_to_mysql, execute_query
+from schema_catalog import get_catalog
+from intent_matcher import compile_intents
+from tokenizer import word_tokenize
+from column_index import column_index_for
+from query_ir import QueryIR, render_sql
 
 #stemmer = PorterStemmer()
 
@@ -13,9 +13,82 @@ def preprocess_query(nl_query):
     #stemmed_tokens = [stemmer.stem(token) for token in tokens]
     return " ".join(tokens)
 
+# SQL intents in priority order, compiled once by intent_matcher
+SQL_INTENT_PATTERNS = (
+    ('having', r"having total (?P<having_col>\w+) (?P<condition>greater|less) than (?P<value>\d+) group by (?P<group_col>\w+)"),
+    ('aggregate', r"(?P<agg_type>total|average|count) (?P<agg_col>\w+)? (?:by|group by) (?P<group_col>\w+)"),
+    ('where_numeric', r"(?:filter|where) (?P<filter_col>\w+) (?P<condition>greater|less) than (?P<value>\d+)"),
+    ('where_equals', r"(?:filter|where) (?P<filter_col>\w+) equals (?P<value>.+)"),
+    ('order_by', r"(?:sort|order by) (?P<order_col>\w+)"),
+)
+# intent params that name a column, resolved by the table's column index
+SQL_COLUMN_PARAMS = ('having_col', 'agg_col', 'group_col', 'filter_col', 'order_col')
+
+
+# HAVING
+def having_query(params, table_name, column_info):
+    having_col, group_col = params['having_col'], params['group_col']
+    operator = "gt" if params['condition'] == "greater" else "lt"
+    if having_col in column_info and group_col in column_info:
+        alias = f"total_{having_col}"
+        return QueryIR(table_name, group=group_col, aggregates=[('sum', having_col, alias)],
+                       having=[(alias, operator, int(params['value']))])
+
+
+# GROUP BY and Aggregation
+def aggregate_query(params, table_name, column_info):
+    agg_type, agg_col, group_col = params['agg_type'], params['agg_col'], params['group_col']
+    if group_col in column_info:
+        if agg_type == "total" and agg_col in column_info:
+            return QueryIR(table_name, group=group_col, aggregates=[('sum', agg_col, f"total_{agg_col}")])
+        elif agg_type == "average" and agg_col in column_info:
+            return QueryIR(table_name, group=group_col, aggregates=[('avg', agg_col, f"average_{agg_col}")])
+        elif agg_type == "count":
+            return QueryIR(table_name, group=group_col, aggregates=[('count', None, "count_rows")])
+
+
+# Numeric WHERE
+def where_numeric_query(params, table_name, column_info):
+    filter_col = params['filter_col']
+    operator = "gt" if params['condition'] == "greater" else "lt"
+    if filter_col in column_info:
+        reordered_columns = [filter_col] + [col for col in column_info if col != filter_col]
+        return QueryIR(table_name, filters=[(filter_col, operator, int(params['value']))], project=reordered_columns)
+
+
+# Categorical WHERE
+def where_equals_query(params, table_name, column_info):
+    filter_col = params['filter_col']
+    if filter_col in column_info:
+        reordered_columns = [filter_col] + [col for col in column_info if col != filter_col]
+        value = params['value'].strip("'")  # quoted again when the query is rendered
+        return QueryIR(table_name, filters=[(filter_col, 'eq', value)], project=reordered_columns)
+
+
+# ORDER BY
+def order_by_query(params, table_name, column_info):
+    order_col = params['order_col']
+    if order_col in column_info:
+        reordered_columns = [order_col] + [col for col in column_info if col != order_col]
+        return QueryIR(table_name, project=reordered_columns, sort=[(order_col, 'desc')])
+
+
+# QueryIR builder of each SQL intent, a builder returns None when the question names unknown columns
+SQL_QUERY_BUILDERS = {
+    'having': having_query,
+    'aggregate': aggregate_query,
+    'where_numeric': where_numeric_query,
+    'where_equals': where_equals_query,
+    'order_by': order_by_query,
+}
+
+
 def map_natural_language_to_query(nl_query, table_name, column_info):
     """
     Maps a natural language query to a specific SQL query pattern.
+    Intents are tried by priority, the first one whose columns exist wins.
+    Column names may be typed loosely ("unit price", "quantity", "unti_price"), the table's
+    column index resolves them and the query uses the real names.
 
     Args:
         nl_query (str)
@@ -25,74 +98,14 @@ def map_natural_language_to_query(nl_query, table_name, column_info):
     Returns:
         str: The generated SQL query.
     """
-    nl_query = preprocess_query(nl_query)
-    all_columns = list(column_info.keys())
-
-    # Patterns for HAVING -> Modified
-    if "having" in nl_query:
-        match = re.search(r"having total (\w+) (greater|less) than (\d+) group by (\w+)", nl_query)
-        if match:
-            having_col, condition, value, group_col = match.groups()
-            operator = ">" if condition == "greater" else "<"
-            if having_col in column_info and group_col in column_info:
-                return (
-                    f"SELECT {group_col}, SUM({having_col}) AS total_{having_col} "
-                    f"FROM {table_name} GROUP BY {group_col} HAVING total_{having_col} {operator} {value}"
-                )
-
-
-    # Patterns for GROUP BY and Aggregation
-    if "group by" in nl_query or  "total" in nl_query or "average" in nl_query or "count" in nl_query:
-        match = re.search(r"(total|average|count) (\w+)? (by|group by) (\w+)", nl_query)
-        if match:
-            agg_type, agg_col, _, group_col = match.groups()
-            if group_col in column_info:
-                if agg_type == "total" and agg_col in column_info:
-                    return (
-                        f"SELECT {group_col}, SUM({agg_col}) AS total_{agg_col} "
-                        f"FROM {table_name} GROUP BY {group_col}"
-                    )
-                elif agg_type == "average" and agg_col in column_info:
-                    return (
-                        f"SELECT {group_col}, AVG({agg_col}) AS average_{agg_col} "
-                        f"FROM {table_name} GROUP BY {group_col}"
-                    )
-                elif agg_type == "count":
-                    return (
-                        f"SELECT {group_col}, COUNT(*) AS count_rows "
-                        f"FROM {table_name} GROUP BY {group_col}"
-                    )
-    
-    # Patterns for WHERE (Numeric and Categorical)
-    elif "filter" in nl_query or "where" in nl_query:
-        # Numeric WHERE
-        match_numeric = re.search(r"(filter|where) (\w+) (greater|less) than (\d+)", nl_query)
-        if match_numeric:
-            _, filter_col, condition, value = match_numeric.groups()
-            operator = ">" if condition == "greater" else "<"
-            if filter_col in column_info:
-                reordered_columns = [filter_col] + [col for col in all_columns if col != filter_col]
-                return f"SELECT {', '.join(reordered_columns)} FROM {table_name} WHERE {filter_col} {operator} {value}"
-
-        # Categorical WHERE
-        match_categorical = re.search(r"(filter|where) (\w+) equals (.+)", nl_query)
-        if match_categorical:
-            _, filter_col, value = match_categorical.groups()
-            if filter_col in column_info:
-                reordered_columns = [filter_col] + [col for col in all_columns if col != filter_col]
-                value = value.strip("'")  # Ensure value is properly quoted
-                return f"SELECT {', '.join(reordered_columns)} FROM {table_name} WHERE {filter_col} = '{value}'"
-    
-    # Patterns for ORDER BY
-    elif "sort" in nl_query or "order by" in nl_query:
-        match = re.search(r"(sort|order by) (\w+)", nl_query)
-        if match:
-            _, order_col = match.groups()
-            if order_col in column_info:
-                reordered_columns = [order_col] + [col for col in all_columns if col != order_col]
-                return f"SELECT {', '.join(reordered_columns)} FROM {table_name} ORDER BY {order_col} DESC"
-    
-
+    index = column_index_for(tuple(column_info))
+    nl_query = index.join_phrases(preprocess_query(nl_query))
+    for intent, params in compile_intents(SQL_INTENT_PATTERNS).matches(nl_query):
+        params = index.resolve_params(params, SQL_COLUMN_PARAMS)
+        ir = SQL_QUERY_BUILDERS[intent](params, table_name, column_info)
+        if ir is not None:
+            # the SQL text of the IR's shape is compiled once, later questions only bind their values
+            return render_sql(ir)
     return None
 
 # Main function to handle natural language questions
@@ -106,10 +119,8 @@ def main():
 
     connection = connect_to_mysql(database)
 
-    # Get column information
-    cursor = connection.cursor()
-    cursor.execute(f"DESCRIBE {table_name}")
-    column_info = {row[0]: row[1] for row in cursor.fetchall()}
+    # Get column information from the schema catalog
+    column_info = get_catalog(connection).column_types(table_name)
 
     print("Enter your question (or type 'exit' to quit):")
     while True:
@@ -1,6 +1,5 @@
-import re
-
 import keywords as keywords_query
+from intent_matcher import compile_intents
 
 
 class NLPProcessor:
@@ -54,14 +53,12 @@ class NLPProcessor:
             "!=": "ne"
         }
         
-        for intent, pattern in self.patterns.items():
-            match = re.search(pattern, user_input)
-            if match:
-                params = match.groupdict()
-                
-                if "operator" in params:
-                    params["operator"] = operator_mapping.get(params["operator"], params["operator"])
-                
-                return {"intent": intent, "params": params}
+        # patterns are compiled once and tried in order, the first pattern in self.patterns wins
+        intent, params = compile_intents(tuple(self.patterns.items())).match(user_input)
+        if intent is not None:
+            if "operator" in params:
+                params["operator"] = operator_mapping.get(params["operator"], params["operator"])
+            
+            return {"intent": intent, "params": params}
             
         return {"intent": "unknown", "params": {}}
\ No newline at end of file
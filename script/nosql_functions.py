@@ -4,14 +4,20 @@ from datetime import datetime
 from bson import ObjectId
 import pandas as pd
 import pymongo
-import requests
 
 
 client_url = 'mongodb://localhost:27017/'
-client = pymongo.MongoClient(client_url)
+client = None  # created by get_client on first use, importing this module does not connect
 
 # helper function
+def get_client():
+    global client
+    if client is None:
+        client = pymongo.MongoClient(client_url)
+    return client
+
 def set_client(url):
+    global client_url, client
     client_url = url
     client = pymongo.MongoClient(client_url)
     return client
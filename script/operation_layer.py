@@ -1,21 +1,61 @@
+import time
+from functools import partial
+
+from pymongo.errors import PyMongoError
+
 import nosql_functions as nosql_func
 from nlp_processor import NLPProcessor
 from example_generator import ExampleGenerator
 from keywords import match_stage, group_stage, sort_stage, build_pipeline
+from concurrent_executor import run_concurrently, report_concurrency
+from query_cache import cached_translation, cached_result, mongo_scope, get_mongo_version, get_or_compute, metadata_cache
+from query_timeout import QueryCancelled, mongo_deadline, timeout_for, kill_mongo_ops
+from approx_aggregation import split_approximate, approximate_mongo, show_progressive
+from rollups import mongo_rollup_pipeline
+from column_index import column_index_for
+from value_dictionary import get_mongo_dictionary, check_mongo_value
+from query_ir import QueryIR, mongo_plan
+from utils import get_column_info_and_examples
+
+# intent params that name a field, resolved by the collection's column index
+FIELD_PARAMS = ('field', 'group', 'str_field', 'num_field', 'local_field')
 
 class OperationLayer:
     def __init__(self, collection):
         self.collection = collection
+        self.intent = None  # intent being handled, picks the query deadline
         self.nlp = NLPProcessor()
         self.example_generator = ExampleGenerator(collection.name)
     
     # helper funcitons
-    def execute_find(self, query, project={"_id":0}, limit=None):
+    # results of a query from the result cache, fetch(max_time_ms, comment) only runs when the collection
+    # version changed, with the current intent's deadline and a comment tag that Ctrl-C uses to kill it
+    def fetch_cached(self, query_text, fetch):
+        def run():
+            with mongo_deadline(self.collection, timeout_for(self.intent)) as (max_time_ms, comment):
+                return fetch(max_time_ms, comment)
+        return cached_result(query_text, mongo_scope(self.collection), get_mongo_version(self.collection), run)
+    
+    # column index of the collection's fields, the fields are re-sampled at most every METADATA_TTL seconds
+    # and the index is only rebuilt when they change
+    def column_index(self):
         try:
-            if limit is None:
-                results = list(self.collection.find(query, project))
-            else:
-                results = list(self.collection.find(query, project).limit(limit))
+            fields = get_or_compute(metadata_cache, ('fields', mongo_scope(self.collection)),
+                                    lambda: tuple(get_column_info_and_examples(self.collection)[2]))
+        except PyMongoError:
+            fields = ()
+        return column_index_for(fields)
+    
+    def execute_find(self, query, project={"_id":0}, limit=None, sort=None):
+        def find(ms, tag):
+            cursor = self.collection.find(query, project, max_time_ms=ms, comment=tag)
+            if sort:
+                cursor = cursor.sort(sort)
+            return list(cursor if limit is None else cursor.limit(limit))
+        try:
+            query_text = (f"find({query}, {project})" + (f".sort({sort})" if sort else "")
+                          + (f".limit({limit})" if limit is not None else ""))
+            results = self.fetch_cached(query_text, find)
     
             if results:
                 for result in results:
@@ -34,7 +74,8 @@ class OperationLayer:
             pipeline = build_pipeline(match=match, group=group, sort=sort, project=project)
             
         try:
-            results = list(self.collection.aggregate(pipeline))
+            results = self.fetch_cached(f"aggregate({pipeline})",
+                                        lambda ms, tag: list(self.collection.aggregate(pipeline, maxTimeMS=ms, comment=tag)))
             if results:
                 for result in results:
                     print(result)
@@ -43,52 +84,70 @@ class OperationLayer:
                 print("No results from pipeline")
         except Exception as e:
             print(f"Error executing pipeline: {e}")
-            
-    def execute_sort(self, field, order, limit=None):
+
+    # aggregate on a rollup collection, cached with the source collection's version since uploads rebuild both
+    def fetch_rollup(self, rollup, pipeline):
         try:
-            order_flag = 1 if order == "ascending" else -1
-            if limit is None:
-                results = list(self.collection.find().sort(field, order_flag))
-            else:
-                results = list(self.collection.find().sort(field, order_flag).limit(limit))
-            
+            results = self.fetch_cached(f"{rollup.name}.aggregate({pipeline})",
+                                        lambda ms, tag: list(rollup.aggregate(pipeline, maxTimeMS=ms, comment=tag)))
             if results:
                 for result in results:
                     print(result)
                     print()
             else:
-                print("No documents found.")
+                print("No results from pipeline")
         except Exception as e:
-            print(f"Error executing sort query: {e}")
-    
-    def execute_query(self, query_str):
+            print(f"Error executing pipeline: {e}")
+
+    # run a find or aggregate plan from query_ir.mongo_plan
+    def execute_plan(self, plan):
+        if plan['op'] == 'find':
+            self.execute_find(plan['filter'], plan['projection'], limit=plan['limit'], sort=plan['sort'])
+        else:
+            self.execute_aggregate(pipeline=plan['pipeline'])
+
+    def execute_query(self, query_str, max_time_ms=0, comment=None):
         if ".find(" in query_str:
             query = eval(query_str.split(".find(", 1)[1].rstrip(")"))
-            return list(self.collection.find(query).limit(3))  # limit results to 3
+            return list(self.collection.find(query, max_time_ms=max_time_ms, comment=comment).limit(3))  # limit results to 3
         elif ".aggregate(" in query_str:
             pipeline = eval(query_str.split(".aggregate(", 1)[1].rstrip(")"))
-            return list(self.collection.aggregate(pipeline))[:3]  # limit results to 3
+            return list(self.collection.aggregate(pipeline, maxTimeMS=max_time_ms, comment=comment))[:3]  # limit results to 3
         elif ".distinct(" in query_str:
             query = eval(query_str.split(".distinct(", 1)[1].rstrip(")"))
-            return list(self.collection.distinct(query))
+            return list(self.collection.distinct(query, maxTimeMS=max_time_ms, comment=comment))
         else:
             print("Unsupported query format. ")
             return []
         
-    def show_example_and_execute(self):
-        print("\n--- NoSQL Query Examples ---")
-        examples = self.example_generator.generate_collection_examples(self.collection)
+    # run example queries concurrently (the collection's MongoClient is thread-safe and pools its own sockets)
+    # and print them in their original order with per-query timing
+    def run_examples(self, examples):
+        started_at = time.perf_counter()
+        try:
+            # every example shares one comment tag, Ctrl-C kills all of them before the pool is shut down
+            with mongo_deadline(self.collection, timeout_for(self.intent)) as (max_time_ms, comment):
+                tasks = [(i, partial(self.execute_query, example["query"], max_time_ms, comment))
+                         for i, example in enumerate(examples)]
+                cancel = partial(kill_mongo_ops, self.collection.database.client, comment)
+                outcomes = {outcome['key']: outcome for outcome in run_concurrently(tasks, on_cancel=cancel)}
+        except QueryCancelled as err:
+            print(err)
+            return
         
-        for example in examples:
+        for i, example in enumerate(examples):
             description = example["description"]
             query_str = example["query"]
+            outcome = outcomes[i]
             
             print(f"{description}: ")
             print("Query: " + query_str)
             
-            results = self.execute_query(query_str)
-            if results:
-                print("Results:")
+            results = outcome['result']
+            if outcome['error'] is not None:
+                print(f"Error executing example query: {outcome['error']}")
+            elif results:
+                print(f"Results ({outcome['seconds']:.3f}s):")
                 
                 for result in results:
                     print(result)
@@ -98,6 +157,12 @@ class OperationLayer:
                 print("No results found.")
             
             print()
+        report_concurrency(list(outcomes.values()), started_at)
+        
+    def show_example_and_execute(self):
+        print("\n--- NoSQL Query Examples ---")
+        examples = self.example_generator.generate_collection_examples(self.collection)
+        self.run_examples(examples)
                 
     
     def show_examples_with_keyword_and_execute(self, keyword):
@@ -109,24 +174,7 @@ class OperationLayer:
             print(f"No examples found with the keyword '{keyword}'.")
             return
         
-        for example in filtered_examples:
-            description = example["description"]
-            query_str = example["query"]
-
-            print(f"{description}: ")
-            print("Query: " + query_str)
-
-            results = self.execute_query(query_str)
-            if results:
-                print("Results:")
-                for result in results:
-                    print(result)
-                    if ".distinct(" not in query_str:
-                        print()
-            else:
-                print("No results found.")
-                
-            print()
+        self.run_examples(filtered_examples)
 
     
     # main function
@@ -135,6 +183,7 @@ class OperationLayer:
         print(f"\n--- Collection: {self.collection.name} is selected ---")
         print("--- First 3 Documents in the Collection ---")
         self.execute_find(query={}, limit=3)  # print first 3 data of the collection
+        get_mongo_dictionary(self.collection)  # distinct values of the string fields, to check filters
         
         while True:
             print("-------------------------------------------")
@@ -147,184 +196,200 @@ class OperationLayer:
             if user_input == 'maninmenu':
                 return 'MAIN_MENU'
             
-                
-            # Parse user input
-            parsed_query = self.nlp.parse_input(user_input)
-            intent = parsed_query["intent"]
-            params = parsed_query["params"]
+            self.handle_message(user_input)
+
+    # answer one message, prints the query and its results
+    def handle_message(self, user_input, interactive=True):
+        """interactive=False (network sessions) never waits for input, approximate questions run exactly"""
+        # "approx ..." answers totals, averages and counts from a sample first
+        approximate, user_input = split_approximate(user_input)
+        approximate = approximate and interactive
+        # "unit price" -> unit_price, the index also resolves near-miss field names below
+        index = self.column_index()
+        user_input = index.join_phrases(user_input)
+            
+        # Parse user input, a repeated question reuses its cached parse
+        parsed_query = cached_translation(user_input, mongo_scope(self.collection), None,
+                                          lambda: self.nlp.parse_input(user_input), case_sensitive=True)
+        intent = parsed_query["intent"]
+        params = index.resolve_params(parsed_query["params"], FIELD_PARAMS)
+        self.intent = intent
+        
+        # Generate Examples
+        if intent == 'example_queries':
+            self.show_example_and_execute()
+        
+        elif intent == 'example_with_keyword':
+            keyword = params.get("keywords")
+            if not keyword:
+                print("No keyword provided for filtering.")
+                return
+            self.show_examples_with_keyword_and_execute(keyword)
             
-            # Generate Examples
-            if intent == 'example_queries':
-                self.show_example_and_execute()
             
-            elif intent == 'example_with_keyword':
-                keyword = params.get("keywords")
-                if not keyword:
-                    print("No keyword provided for filtering.")
-                    continue
-                self.show_examples_with_keyword_and_execute(keyword)
-                
+        # Do nlp
+        # Find
+        elif intent == 'find_all':
+            try:
+                print(f"Executing: db.{self.collection.name}.find()")
+                print("Query Results:")
+                self.execute_plan(mongo_plan(QueryIR(self.collection.name)))
+            except Exception as e:
+                print(f"Error executing find_all: {e}")
                 
-            # Do nlp
-            # Find
-            elif intent == 'find_all':
-                try:
-                    print(f"Executing: db.{self.collection.name}.find()")
-                    query = {}
-                    projection = {"_id":0}
-                    
-                    print("Query Results:")
-                    self.execute_find(query,projection)
-                except Exception as e:
-                    print(f"Error executing find_all: {e}")
-                    
-            elif intent == "find_equals":
-                try:
-                    field = params['field']
-                    value = params['value']
-                    # determine type (numeric or string)
-                    value = float(value) if value.replace('.', '', 1).isdigit() else value
-                    query = {field: value}
-                    print(f"Executing: db.{self.collection.name}.find({query})")
-                    print("Query Results:")
-                    self.execute_find(query=query)
-                except Exception as e:
-                    print(f"Error executing find_equals: {e}")
-       
-            elif intent == 'find_all_where':
-                try:
-                    field = params['field']
-                    operator = params['operator']
-                    value = params['value']
-                    value = float(value) if value.replace('.', '', 1).isdigit() else value
-                    query = {field: {f"${operator}": value}}
-                    print(f"Executing: db.{self.collection.name}.find({query})")
-                    self.execute_find(query)
-                except Exception as e:
-                    print(f"Error executing find_all_where: {e}")
-                            
-            elif intent == 'find_where':
-                try:
-                    str_field = params["str_field"]
-                    num_field = params["num_field"]
-                    operator = params["operator"]
-                    value = params["value"]
-                    # Determine type (numeric or string)
-                    value = float(value) if value.replace('.', '', 1).isdigit() else value
-                    
-                    query = {num_field: {f"${operator}": value}}
-                    projection = {str_field:1, "_id":0}
-                    
-                    print(f"Executing: db.{self.collection.name}.find({query}, {projection})")
-                    print("Query Results:")
-                    self.execute_find(query, projection)
-                except Exception as e:
-                    print(f"Error executing find: {e}")
-                    
-                    
-            elif intent == "find_column":
-                try:
-                    field = params["field"]
-                    print(f"Executing: db.{self.collection.name}.find({{{field}: 1, '_id': 0}})")
-                    results = list(self.collection.find({}, {field: 1, "_id": 0}))  # Retrieve only the specified column
-                    if results:
-                        print(f"Values for column '{field}':")
-                        for result in results:
-                            print(result)
-                    else:
-                        print(f"No values found for column '{field}'.")
+        elif intent == "find_equals":
+            try:
+                field = params['field']
+                value = params['value']
+                # determine type (numeric or string)
+                value = float(value) if value.replace('.', '', 1).isdigit() else value
+                # a string is matched to the field's stored values, one that does not exist runs nothing
+                values, missing = check_mongo_value(self.collection, field, value)
+                if missing:
+                    print(missing)
+                    return
+                condition = (field, 'eq', values[0]) if len(values) == 1 else (field, 'in', values)
+                plan = mongo_plan(QueryIR(self.collection.name, filters=[condition]))
+                print(f"Executing: db.{self.collection.name}.find({plan['filter']})")
+                print("Query Results:")
+                self.execute_plan(plan)
+            except Exception as e:
+                print(f"Error executing find_equals: {e}")
+   
+        elif intent == 'find_all_where':
+            try:
+                field = params['field']
+                operator = params['operator']
+                value = params['value']
+                value = float(value) if value.replace('.', '', 1).isdigit() else value
+                if operator in ('eq', 'ne'):
+                    values, missing = check_mongo_value(self.collection, field, value)
+                    if missing and operator == 'eq':
+                        print(missing)
+                        return
+                    if len(values) > 1:
+                        operator, value = ('in' if operator == 'eq' else 'nin'), values
+                    elif values:
+                        value = values[0]
+                plan = mongo_plan(QueryIR(self.collection.name, filters=[(field, operator, value)]))
+                print(f"Executing: db.{self.collection.name}.find({plan['filter']})")
+                self.execute_plan(plan)
+            except Exception as e:
+                print(f"Error executing find_all_where: {e}")
                         
-                except Exception as e:
-                    print(f"Error executing find_column: {e}")
-                    
-            # aggregation part
-            elif intent in ['aggregate_sum', 'aggregate_avg', 'aggregate_count']:
-                try:
-                    field = params['field'] if intent != 'aggregate_count' else None
-                    group = params['group']
-                    pipeline = [
-                        {
-                            "$group": {
-                                "_id": f"${group}",
-                                f"{'total_' + field if intent == 'aggregate_sum' else 'average_' + field if intent == 'aggregate_avg' else 'count'}":
-                                    {"$sum": f"${field}" if intent == 'aggregate_sum' else 1 if intent == 'aggregate_count' else f"${field}"}
-                            }
-                            
-                        },
-                        {
-                            "$sort": { "_id": 1}
-                        }
-                    ]
-                    print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
-                    print("Query Results:")
-                    self.execute_aggregate(pipeline=pipeline)
-                    
-                except Exception as e:
-                    print(f"Error executing aggregation ({intent}): {e}")
-            
-            # group by part
-            elif intent == 'group_by':
-                try:
-                    pipeline = [
-                        {"$group": {"_id": f"${params['group']}", "count": {"$sum": 1}}}
-                    ]
-                    
-                    print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
-                    print("Query Results:")
-                    self.execute_aggregate(pipeline=pipeline)
-                    
-                except Exception as e:
-                    print("Error executing aggregation:", e)
-                    
-            # sort part
-            elif intent == 'sort':
-                try:
-                    field = params['field']
-                    order = 1 if params['order'] == 'ascending' else -1
-                    print(f"Executing: db.{self.collection.name}.find().sort({{{field}: {order}}})")
-                    print("Query Results:")
-                    self.execute_sort(field, order)
-                                        
-                except Exception as e:
-                    print("Error executing aggregation:", e)
-                    
-                    
-            # having
-            elif intent == "having":
-                try:
-                    agg_type = 'sum' if params['aggregate_type'] == 'total' else 'avg'
-                    agg_name = params['aggregate_type'] + "_" + params["field"]
-                    pipeline = [
-                        {"$group": {"_id": f"${params['group']}", agg_name: {f"${agg_type}": f"${params['field']}"}}},
-                        {"$match": {agg_name: {f"${params['operator']}": int(params["value"])}}}
-                    ]
-                    print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
-                    print("Query Results:")
-                    self.execute_aggregate(pipeline)
-                except Exception as e:
-                    print(f"Error executing having: {e}")
+        elif intent == 'find_where':
+            try:
+                str_field = params["str_field"]
+                num_field = params["num_field"]
+                operator = params["operator"]
+                value = params["value"]
+                # Determine type (numeric or string)
+                value = float(value) if value.replace('.', '', 1).isdigit() else value
+                
+                plan = mongo_plan(QueryIR(self.collection.name, filters=[(num_field, operator, value)], project=[str_field]))
+                
+                print(f"Executing: db.{self.collection.name}.find({plan['filter']}, {plan['projection']})")
+                print("Query Results:")
+                self.execute_plan(plan)
+            except Exception as e:
+                print(f"Error executing find: {e}")
+                
+                
+        elif intent == "find_column":
+            try:
+                field = params["field"]
+                projection = mongo_plan(QueryIR(self.collection.name, project=[field]))['projection']
+                print(f"Executing: db.{self.collection.name}.find({{}}, {projection})")
+                results = self.fetch_cached(f"find({{}}, {projection})",
+                                            lambda ms, tag: list(self.collection.find({}, projection, max_time_ms=ms, comment=tag)))  # Retrieve only the specified column
+                if results:
+                    print(f"Values for column '{field}':")
+                    for result in results:
+                        print(result)
+                else:
+                    print(f"No values found for column '{field}'.")
                     
-            # join
-            elif intent == "join":
-                try:
-                    pipeline = [
-                        {
-                            "$lookup": {
-                                "from": params["to_collection"],
-                                "localField": params["local_field"],
-                                "foreignField": "_id",
-                                "as": params["as_field"]
-                            }
-                        },
-                        {
-                            "$project": {"_id": 0}
-                        }
-                    ]
-                    print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
+            except Exception as e:
+                print(f"Error executing find_column: {e}")
+                
+        # aggregation part
+        elif intent in ['aggregate_sum', 'aggregate_avg', 'aggregate_count']:
+            try:
+                field = params['field'] if intent != 'aggregate_count' else None
+                group = params['group']
+                kind = {'aggregate_sum': 'total', 'aggregate_avg': 'average', 'aggregate_count': 'count'}[intent]
+                # a rollup collection answers exactly without reading the collection
+                rollup, rollup_pipeline = mongo_rollup_pipeline(self.collection, kind, group, field)
+                if rollup is not None:
+                    print(f"Executing: db.{rollup.name}.aggregate({rollup_pipeline})")
                     print("Query Results:")
-                    self.execute_aggregate(pipeline)
-                except Exception as e:
-                    print(f"Error executing join: {e}")
-                    
-            else:
-                print("Sorry, I don't understand. Please try again.")
\ No newline at end of file
+                    self.fetch_rollup(rollup, rollup_pipeline)
+                    return
+                if approximate:
+                    print(f"Estimating {kind} {'of ' + field + ' ' if field else ''}by {group} from samples of db.{self.collection.name}")
+                    show_progressive(approximate_mongo(self.collection, kind, group, field))
+                    return
+                aggregate = {'total': ('sum', field, f"total_{field}"), 'average': ('avg', field, f"average_{field}"),
+                             'count': ('count', None, 'count')}[kind]
+                pipeline = mongo_plan(QueryIR(self.collection.name, group=group, aggregates=[aggregate],
+                                              sort=[(group, 'asc')]))['pipeline']
+                print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
+                print("Query Results:")
+                self.execute_aggregate(pipeline=pipeline)
+                
+            except Exception as e:
+                print(f"Error executing aggregation ({intent}): {e}")
+        
+        # group by part
+        elif intent == 'group_by':
+            try:
+                pipeline = mongo_plan(QueryIR(self.collection.name, group=params['group'],
+                                              aggregates=[('count', None, 'count')]))['pipeline']
+                
+                print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
+                print("Query Results:")
+                self.execute_aggregate(pipeline=pipeline)
+                
+            except Exception as e:
+                print("Error executing aggregation:", e)
+                
+        # sort part
+        elif intent == 'sort':
+            try:
+                field = params['field']
+                plan = mongo_plan(QueryIR(self.collection.name, sort=[(field, 'asc' if params['order'] == 'ascending' else 'desc')]))
+                print(f"Executing: db.{self.collection.name}.find().sort({dict(plan['sort'])})")
+                print("Query Results:")
+                self.execute_plan(plan)
+                                    
+            except Exception as e:
+                print("Error executing aggregation:", e)
+                
+                
+        # having
+        elif intent == "having":
+            try:
+                agg_type = 'sum' if params['aggregate_type'] == 'total' else 'avg'
+                agg_name = params['aggregate_type'] + "_" + params["field"]
+                pipeline = mongo_plan(QueryIR(self.collection.name, group=params['group'],
+                                              aggregates=[(agg_type, params['field'], agg_name)],
+                                              having=[(agg_name, params['operator'], int(params["value"]))]))['pipeline']
+                print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
+                print("Query Results:")
+                self.execute_aggregate(pipeline)
+            except Exception as e:
+                print(f"Error executing having: {e}")
+                
+        # join
+        elif intent == "join":
+            try:
+                pipeline = mongo_plan(QueryIR(self.collection.name, join=(params["to_collection"], params["local_field"],
+                                                                           "_id", params["as_field"])))['pipeline']
+                print(f"Executing: db.{self.collection.name}.aggregate({pipeline})")
+                print("Query Results:")
+                self.execute_aggregate(pipeline)
+            except Exception as e:
+                print(f"Error executing join: {e}")
+                
+        else:
+            print("Sorry, I don't understand. Please try again.")
\ No newline at end of file
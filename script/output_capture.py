@@ -0,0 +1,37 @@
+import io
+import sys
+import threading
+from contextlib import contextmanager
+
+
+class ThreadOutput(io.TextIOBase):
+    """
+    sys.stdout replacement that sends a worker thread's print() output to that thread's buffer,
+    so the printing query layers can answer several requests at once. other threads write through.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (buffer or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    @contextmanager
+    def capture(self):
+        self.local.buffer = io.StringIO()
+        try:
+            yield self.local.buffer
+        finally:
+            self.local.buffer = None
+
+
+# install a ThreadOutput as sys.stdout once and return it
+def install_thread_output():
+    if not isinstance(sys.stdout, ThreadOutput):
+        sys.stdout = ThreadOutput(sys.stdout)
+    return sys.stdout
@@ -0,0 +1,164 @@
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from set_up_db import (connect_mysql_with_db, preprocess_dates, convert_date_columns, create_table_from_sample,
+                       confirm_primary_key)
+from bulk_loader import bulk_load, report_throughput, DEFAULT_STRATEGY, DEFAULT_BATCH_SIZE
+from stream_ingest import DEFAULT_SAMPLE_ROWS, sample_column_types
+from type_profiler import profile_dataframe
+
+# partitions per worker, more partitions keep each worker's memory small and balance uneven rows
+PARTITIONS_PER_WORKER = 4
+PARTITION_MODES = ('bytes', 'rows')
+
+# connection owned by a worker process, opened once by init_worker and reused for every partition
+_worker_connection = None
+
+
+# process pool initializer: one MySQL connection per worker process
+def init_worker(db_name):
+    global _worker_connection
+    _worker_connection = connect_mysql_with_db(db_name)
+    if _worker_connection is None:
+        raise ConnectionError(f"Worker {os.getpid()} could not connect to MySQL database '{db_name}'")
+
+
+# split a CSV into byte ranges that start and end on line boundaries
+def split_byte_ranges(csv_file_path, partitions):
+    """
+    returns [(start, end), ...] byte offsets covering every line after the header.
+    rows must not contain quoted newlines, use partition_by='rows' for such files.
+    """
+    file_size = os.path.getsize(csv_file_path)
+    with open(csv_file_path, 'rb') as f:
+        f.readline()  # skip header
+        data_start = f.tell()
+        step = max((file_size - data_start) // partitions, 1)
+
+        boundaries = [data_start]
+        for i in range(1, partitions):
+            f.seek(max(data_start + i * step, boundaries[-1]))
+            f.readline()  # move to the start of the next full line
+            position = f.tell()
+            if position >= file_size:
+                break
+            if position > boundaries[-1]:
+                boundaries.append(position)
+        boundaries.append(file_size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+# split a CSV into row ranges, slower to plan but safe for quoted newlines
+def split_row_ranges(csv_file_path, partitions):
+    total_rows = sum(len(chunk) for chunk in pd.read_csv(csv_file_path, usecols=[0], chunksize=100000))
+    step = max(-(-total_rows // partitions), 1)
+    return [(start, min(start + step, total_rows)) for start in range(0, total_rows, step)]
+
+
+# read one partition into a DataFrame with the header columns of the file
+def read_partition(csv_file_path, partition, columns, partition_by):
+    start, end = partition
+    if partition_by == 'bytes':
+        with open(csv_file_path, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+        return pd.read_csv(io.BytesIO(data), header=None, names=columns)
+    return pd.read_csv(csv_file_path, header=0, names=columns, skiprows=range(1, start + 1), nrows=end - start)
+
+
+# worker task: parse, convert and insert one partition through the worker's own connection
+def load_partition(table_name, csv_file_path, partition, columns, date_formats, partition_by, strategy, batch_size):
+    started_at = time.perf_counter()
+    dataframe = read_partition(csv_file_path, partition, columns, partition_by)
+    convert_date_columns(dataframe, date_formats)
+    bulk_load(_worker_connection, table_name, dataframe, strategy=strategy, batch_size=batch_size, report=False)
+    return {'pid': os.getpid(), 'rows': len(dataframe), 'seconds': time.perf_counter() - started_at}
+
+
+# build secondary indexes once the data is loaded, cheaper than maintaining them row by row
+def create_secondary_indexes(connection, table_name, index_columns):
+    with connection.cursor() as cursor:
+        for column in index_columns:
+            started_at = time.perf_counter()
+            cursor.execute(f"CREATE INDEX `idx_{table_name}_{column}` ON `{table_name}` (`{column}`)")
+            print(f"Index on '{column}' built in {time.perf_counter() - started_at:.2f}s.")
+    connection.commit()
+
+
+# print rows/s per worker process
+def report_worker_stats(partition_stats):
+    workers = {}
+    for stats in partition_stats:
+        worker = workers.setdefault(stats['pid'], {'rows': 0, 'seconds': 0.0, 'partitions': 0})
+        worker['rows'] += stats['rows']
+        worker['seconds'] += stats['seconds']
+        worker['partitions'] += 1
+
+    for pid, worker in sorted(workers.items()):
+        rate = worker['rows'] / max(worker['seconds'], 1e-9)
+        print(f"Worker {pid}: {worker['partitions']} partitions, {worker['rows']} rows, "
+              f"{worker['seconds']:.2f}s ({rate:,.0f} rows/s)")
+    return workers
+
+
+# load a CSV with several worker processes, each inserting through its own connection
+def parallel_upload_to_mysql(connection, db_name, table_name, csv_file_path, workers=None, partition_by='bytes',
+                             index_columns=(), sample_rows=DEFAULT_SAMPLE_ROWS, strategy=DEFAULT_STRATEGY,
+                             batch_size=DEFAULT_BATCH_SIZE):
+    """
+    creates the table from a sample of the CSV, with headroom on the sampled types since columns
+    are not widened during a parallel load. a primary key found in the sample is added after the
+    load, or the surrogate key when some partition repeats it. splits the file into
+    byte-range or row-range partitions and loads them in a pool of `workers` processes.
+    secondary indexes on `index_columns` are built after the load.
+    """
+    if partition_by not in PARTITION_MODES:
+        raise ValueError(f"Unknown partition mode '{partition_by}', expected one of {PARTITION_MODES}")
+    workers = workers or os.cpu_count() or 1
+
+    sample = pd.read_csv(csv_file_path, nrows=sample_rows)
+    profiles = profile_dataframe(sample)
+    date_formats = preprocess_dates(sample, profiles)
+    column_types, key_columns = create_table_from_sample(connection, table_name, sample, sample_column_types(profiles))
+    if column_types is None:
+        return None
+    columns = list(sample.columns)
+    del sample
+
+    split = split_byte_ranges if partition_by == 'bytes' else split_row_ranges
+    partitions = split(csv_file_path, workers * PARTITIONS_PER_WORKER)
+    print(f"Loading {len(partitions)} {partition_by} partitions with {workers} workers...")
+
+    started_at = time.perf_counter()
+    partition_stats = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(db_name,)) as pool:
+        futures = {
+            pool.submit(load_partition, table_name, csv_file_path, partition, columns, date_formats,
+                        partition_by, strategy, batch_size): partition
+            for partition in partitions
+        }
+        for future in as_completed(futures):
+            try:
+                partition_stats.append(future.result())
+            except Exception as err:
+                # BrokenProcessPool when init_worker failed, the worker's error otherwise
+                for pending in futures:
+                    pending.cancel()
+                loaded = sum(s['rows'] for s in partition_stats)
+                raise RuntimeError(f"Parallel load of '{table_name}' failed on {partition_by} partition "
+                                   f"{futures[future]} ({type(err).__name__}: {err}), {loaded} rows were loaded "
+                                   f"before the failure, reload the table") from err
+
+    report_worker_stats(partition_stats)
+    if key_columns:
+        confirm_primary_key(connection, table_name, key_columns, columns)
+    result = report_throughput(table_name, sum(s['rows'] for s in partition_stats), started_at, f"parallel/{strategy}")
+
+    if index_columns:
+        create_secondary_indexes(connection, table_name, index_columns)
+    return result
@@ -0,0 +1,132 @@
+import hashlib
+import re
+
+from lru_cache import LRUCache
+from connection_pool import connection_database
+from schema_catalog import get_catalog
+from sample_queries import execute_query, get_table_version, show_paged_results, page_through, frame_pages, PAGE_SIZE, MAX_RESULT_ROWS
+
+# level 1: (normalized question, scope, schema fingerprint) -> generated SQL query or Mongo plan
+TRANSLATION_CACHE_SIZE = 512
+TRANSLATION_TTL = 3600  # seconds
+# level 2: (normalized query text, scope, table or collection version) -> result
+RESULT_CACHE_SIZE = 128
+RESULT_TTL = 300  # seconds, also bounds staleness after writes made outside ChatDB
+RESULT_CACHE_MAX_ROWS = 10000  # larger results are streamed but not kept
+# table and collection versions are trusted this long before being read again
+METADATA_TTL = 10  # seconds
+
+translation_cache = LRUCache(max_size=TRANSLATION_CACHE_SIZE, ttl=TRANSLATION_TTL)
+result_cache = LRUCache(max_size=RESULT_CACHE_SIZE, ttl=RESULT_TTL)
+metadata_cache = LRUCache(max_size=RESULT_CACHE_SIZE, ttl=METADATA_TTL)
+
+
+# lower case, single spaces, no trailing punctuation: "Total  Sales by Region?" == "total sales by region"
+def normalize_question(question, case_sensitive=False):
+    question = question if case_sensitive else question.lower()
+    return re.sub(r"\s+", " ", question.strip()).rstrip(" ?.!;")
+
+
+# single spaces and no trailing semicolon, literal case is kept since values are case sensitive
+def normalize_query(query):
+    return re.sub(r"\s+", " ", str(query).strip()).rstrip(" ;")
+
+
+# short stable hash of a schema, any column or type change gives a new fingerprint
+def schema_fingerprint(schema):
+    return hashlib.sha1(repr(sorted(schema.items())).encode()).hexdigest()[:16]
+
+
+# cached value, or compute() stored under key; None results are not cached
+def get_or_compute(cache, key, compute):
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        if value is not None:
+            cache.put(key, value)
+    return value
+
+
+# level 1: generated query for a question, translate() only runs on a miss
+def cached_translation(question, scope, fingerprint, translate, case_sensitive=False):
+    key = (normalize_question(question, case_sensitive), scope, fingerprint)
+    return get_or_compute(translation_cache, key, translate)
+
+
+# level 2: result of a query for a given data version, run() only runs on a miss
+def cached_result(query, scope, version, run):
+    return get_or_compute(result_cache, (normalize_query(query), scope, version), run)
+
+
+# drop cached results and versions of a table or collection after ChatDB changed it
+def invalidate_scope(scope):
+    result_cache.invalidate(lambda key: key[1] == scope)
+    metadata_cache.invalidate(lambda key: key[1] == scope)
+
+
+def cache_stats():
+    return {'translation': translation_cache.stats(), 'result': result_cache.stats()}
+
+
+# scope of a MySQL table
+def sql_scope(connection, table_name):
+    return ('mysql', connection_database(connection), table_name)
+
+
+# column name -> type of a MySQL table, from the schema catalog
+def get_sql_schema(connection, table_name):
+    return get_catalog(connection).column_types(table_name)
+
+
+# version of a MySQL table, re-read at most every METADATA_TTL seconds
+def get_sql_version(connection, table_name):
+    return get_or_compute(metadata_cache, ('version', sql_scope(connection, table_name)),
+                          lambda: get_table_version(connection, table_name) or ('missing',))
+
+
+# translate a question to SQL through the translation cache
+def translate_sql_question(connection, question, table_name, translate):
+    """translate(column_info) returns the SQL for the question or None"""
+    schema = get_sql_schema(connection, table_name)
+    return cached_translation(question, sql_scope(connection, table_name), schema_fingerprint(schema),
+                              lambda: translate(schema))
+
+
+# result of a small query on a MySQL table, e.g. a preview, through the result cache
+def cached_sql_query(connection, table_name, query, timeout=None):
+    return cached_result(query, sql_scope(connection, table_name), get_sql_version(connection, table_name),
+                         lambda: execute_query(connection, query, timeout=timeout))
+
+
+# key of a MySQL query in the result cache
+def sql_result_key(connection, table_name, query):
+    return (normalize_query(query), sql_scope(connection, table_name), get_sql_version(connection, table_name))
+
+
+# whether a MySQL query's result is in the result cache
+def is_sql_result_cached(connection, table_name, query):
+    return result_cache.get(sql_result_key(connection, table_name, query)) is not None
+
+
+# show a query's result from the result cache, or stream it and keep it when small enough
+def show_cached_sql_result(connection, table_name, query, page_size=PAGE_SIZE, max_rows=MAX_RESULT_ROWS,
+                           keep_rows=RESULT_CACHE_MAX_ROWS, timeout=None):
+    key = sql_result_key(connection, table_name, query)
+    result = result_cache.get(key)
+    if result is not None:
+        return page_through(frame_pages(result, page_size), page_size, max_rows)[0]
+    shown, result = show_paged_results(connection, query, page_size, max_rows, keep_rows=keep_rows, timeout=timeout)
+    if result is not None:
+        result_cache.put(key, result)
+    return shown
+
+
+# scope of a MongoDB collection
+def mongo_scope(collection):
+    return ('mongodb', collection.database.name, collection.name)
+
+
+# version of a MongoDB collection: its document count from collection metadata, re-read at most every METADATA_TTL seconds
+# (updates that keep the count are only picked up once RESULT_TTL expires)
+def get_mongo_version(collection):
+    return get_or_compute(metadata_cache, ('version', mongo_scope(collection)), collection.estimated_document_count)
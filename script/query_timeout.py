@@ -0,0 +1,187 @@
+import re
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+
+import pymysql
+
+from connection_pool import get_pool, connection_database
+
+# seconds a query may run when its intent has no entry in INTENT_TIMEOUTS
+DEFAULT_TIMEOUT = 30
+# per-intent deadlines in seconds, None disables the deadline
+INTENT_TIMEOUTS = {
+    # MySQL
+    'sql_question': 30,
+    'sql_example': 10,
+    'sql_preview': 5,
+    # distinct values of the low-cardinality string columns (value_dictionary), MySQL and MongoDB
+    'value_dictionary': 30,
+    # MongoDB, keyed by NLPProcessor intent
+    'example_queries': 10,
+    'example_with_keyword': 10,
+    'find_all': 30,
+    'find_equals': 15,
+    'find_all_where': 15,
+    'find_where': 15,
+    'find_column': 30,
+    'aggregate_sum': 60,
+    'aggregate_avg': 60,
+    'aggregate_count': 60,
+    'group_by': 60,
+    'sort': 60,
+    'having': 60,
+    'join': 120,
+}
+# seconds to wait for a spare connection to send KILL QUERY
+KILL_ACQUIRE_TIMEOUT = 5
+# server errors raised in the killed session
+MYSQL_INTERRUPTED_ERRORS = (1317, 3024)  # ER_QUERY_INTERRUPTED, ER_QUERY_TIMEOUT
+
+
+class QueryCancelled(Exception):
+    """The running query was cancelled with Ctrl-C, only that query is aborted."""
+
+
+def timeout_for(intent):
+    return INTENT_TIMEOUTS.get(intent, DEFAULT_TIMEOUT)
+
+
+# add a MAX_EXECUTION_TIME optimizer hint to a SELECT, the server then stops the statement itself
+def with_execution_time_hint(query, seconds):
+    if not seconds or 'MAX_EXECUTION_TIME' in query.upper():
+        return query
+    return re.sub(r"^\s*SELECT\b", f"SELECT /*+ MAX_EXECUTION_TIME({int(seconds * 1000)}) */", query,
+                  count=1, flags=re.IGNORECASE)
+
+
+# stop the statement running in another session, sent from a second pooled connection
+def kill_query(database, thread_id):
+    try:
+        with get_pool(database).connection(timeout=KILL_ACQUIRE_TIMEOUT) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute(f"KILL QUERY {int(thread_id)}")
+    except (pymysql.MySQLError, TimeoutError) as err:
+        print(f"Error: could not cancel query {thread_id}: {err}")
+
+
+# reopen a connection whose socket was left mid-read by an interrupt, keeping the same object
+def reset_connection(connection):
+    if hasattr(connection, 'reconnect'):
+        connection.reconnect()
+        return
+    try:
+        connection.close()
+    except pymysql.Error:
+        pass
+    connection.connect()
+
+
+class QueryWatchdog:
+    """KILL QUERY deadline for the blocking calls of one MySQL session, re-armed around each call."""
+
+    def __init__(self, connection, seconds):
+        self.connection = connection
+        self.seconds = seconds
+        self.database = connection_database(connection)
+        self.thread_id = connection.thread_id()
+        self.fired = False
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _fire(self):
+        with self._lock:
+            if self._timer is None:
+                return  # the call finished while the timer was starting
+            self.fired = True
+        kill_query(self.database, self.thread_id)
+
+    @contextmanager
+    def guard(self):
+        """
+        raises TimeoutError when the deadline killed the statement, and QueryCancelled on Ctrl-C
+        after killing the statement on the server; the interrupted connection is reset.
+        """
+        if self.seconds:
+            with self._lock:
+                self._timer = threading.Timer(self.seconds, self._fire)
+                self._timer.daemon = True
+                self._timer.start()
+        try:
+            yield
+        except KeyboardInterrupt:
+            kill_query(self.database, self.thread_id)
+            reset_connection(self.connection)
+            raise QueryCancelled("Query cancelled.") from None
+        except pymysql.MySQLError as err:
+            if self.fired or (err.args and err.args[0] in MYSQL_INTERRUPTED_ERRORS):
+                raise TimeoutError(f"Query stopped after its {self.seconds}s time limit.") from err
+            raise
+        finally:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+
+class RunningQueries:
+    """MySQL sessions of concurrently running tasks, so one Ctrl-C can KILL QUERY all of them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = set()
+
+    @contextmanager
+    def track(self, connection):
+        session = (connection_database(connection), connection.thread_id())
+        with self._lock:
+            self._sessions.add(session)
+        try:
+            yield connection
+        finally:
+            with self._lock:
+                self._sessions.discard(session)
+
+    def kill_all(self):
+        with self._lock:
+            sessions = list(self._sessions)
+        for database, thread_id in sessions:
+            kill_query(database, thread_id)
+
+
+# errors of both backends for code shared by the SQL and Mongo flows. PyMongoError is only included once
+# pymongo is loaded: a SQL-only session never imports it, so it cannot raise it either
+def database_errors():
+    mongo_errors = sys.modules.get('pymongo.errors')
+    return (pymysql.MySQLError,) + ((mongo_errors.PyMongoError,) if mongo_errors else ())
+
+
+# stop the operations tagged with a comment, used on Ctrl-C
+def kill_mongo_ops(client, tag):
+    from pymongo.errors import PyMongoError  # Mongo only, keeps pymongo out of the SQL flow
+    try:
+        ops = client.admin.command({'currentOp': 1, 'command.comment': tag}).get('inprog', [])
+        for op in ops:
+            client.admin.command('killOp', op=op['opid'])
+    except PyMongoError as err:
+        print(f"Error: could not cancel operation {tag}: {err}")
+
+
+@contextmanager
+def mongo_deadline(collection, seconds):
+    """
+    yields (max_time_ms, comment) to pass to find/aggregate/distinct. the server stops the
+    operation after max_time_ms (TimeoutError here); Ctrl-C kills the tagged operation with
+    killOp and raises QueryCancelled.
+    """
+    from pymongo.errors import ExecutionTimeout  # Mongo only, keeps pymongo out of the SQL flow
+    tag = f"chatdb-{uuid.uuid4().hex[:12]}"
+    max_time_ms = int(seconds * 1000) if seconds else 0  # 0 means no limit to the server
+    try:
+        yield max_time_ms, tag
+    except KeyboardInterrupt:
+        kill_mongo_ops(collection.database.client, tag)
+        raise QueryCancelled("Query cancelled.") from None
+    except ExecutionTimeout as err:
+        raise TimeoutError(f"Query stopped after its {seconds}s time limit.") from err
@@ -0,0 +1,204 @@
+import re
+
+import pymysql
+
+from schema_catalog import get_catalog, refresh_catalog
+from approx_aggregation import parse_sql_aggregate
+
+# rollup tables and collections are named <source>__by_<column>
+ROLLUP_SEPARATOR = '__by_'
+# a column with at most this many distinct values gets its own rollup
+ROLLUP_MAX_GROUPS = 100
+# documents read to find the fields of a collection
+MONGO_PROFILE_SAMPLE = 1000
+
+NUMERIC_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint', 'decimal', 'float', 'double')
+CATEGORICAL_TYPES = ('char', 'varchar', 'enum', 'tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+DATE_TYPES = ('date',)  # one bucket per day, datetimes are grouped by their exact value so they are not rolled up
+
+
+def rollup_name(source, column):
+    return f"{source}{ROLLUP_SEPARATOR}{column}"
+
+
+def is_rollup(name):
+    return ROLLUP_SEPARATOR in name
+
+
+# base type of a MySQL COLUMN_TYPE, e.g. 'decimal(10,2) unsigned' -> 'decimal'
+def base_type(column_type):
+    return re.match(r"\w+", column_type.lower()).group(0)
+
+
+# ---------- MySQL ----------
+
+# group columns (low-cardinality categorical and date columns) and measure columns (numeric) of a table
+def sql_rollup_columns(connection, table_name, catalog, max_groups=ROLLUP_MAX_GROUPS):
+    column_types = {column: base_type(col_type) for column, col_type in catalog.column_types(table_name).items()}
+    primary_key = catalog.primary_key(table_name)
+    measures = [col for col, col_type in column_types.items() if col_type in NUMERIC_TYPES and col not in primary_key]
+    dates = [col for col, col_type in column_types.items() if col_type in DATE_TYPES]
+    candidates = [col for col, col_type in column_types.items()
+                  if col_type in CATEGORICAL_TYPES and col not in primary_key]
+    if not candidates:
+        return dates, measures
+    # every candidate's distinct count in one scan
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT {', '.join(f'COUNT(DISTINCT `{col}`)' for col in candidates)} FROM `{table_name}`")
+        distinct_counts = cursor.fetchone()
+    categorical = [col for col, distinct in zip(candidates, distinct_counts) if distinct <= max_groups]
+    return categorical + dates, measures
+
+
+# SELECT that computes one rollup: row count, and the sum and non-null count of every measure per group
+def sql_rollup_query(table_name, group, measures):
+    aggregates = ["COUNT(*) AS row_count"]
+    for measure in measures:
+        aggregates += [f"SUM(`{measure}`) AS `sum_{measure}`", f"COUNT(`{measure}`) AS `count_{measure}`"]
+    return f"SELECT `{group}`, {', '.join(aggregates)} FROM `{table_name}` GROUP BY `{group}`"
+
+
+# (re)build every rollup of a table, called after each load so appended rows are counted
+def build_sql_rollups(connection, table_name, max_groups=ROLLUP_MAX_GROUPS):
+    """
+    one rollup table per low-cardinality categorical column and per date column (daily buckets),
+    holding row_count, sum_<measure> and count_<measure>, so totals, averages and counts by that
+    column merge exactly. each rollup is built under a temporary name and swapped in with one
+    RENAME TABLE, readers never see a missing or half-built rollup.
+    returns the names of the rollup tables.
+    """
+    catalog = refresh_catalog(connection)
+    if is_rollup(table_name) or not catalog.has_table(table_name):
+        return []
+    groups, measures = sql_rollup_columns(connection, table_name, catalog, max_groups)
+    built = []
+    with connection.cursor() as cursor:
+        for group in groups:
+            name = rollup_name(table_name, group)
+            cursor.execute(f"DROP TABLE IF EXISTS `{name}__new`, `{name}__old`")
+            cursor.execute(f"CREATE TABLE `{name}__new` AS {sql_rollup_query(table_name, group, measures)}")
+            if catalog.has_table(name):
+                cursor.execute(f"RENAME TABLE `{name}` TO `{name}__old`, `{name}__new` TO `{name}`")
+                cursor.execute(f"DROP TABLE `{name}__old`")
+            else:
+                cursor.execute(f"RENAME TABLE `{name}__new` TO `{name}`")
+            built.append(name)
+        # rollups of columns that no longer qualify would answer with stale data
+        for stale in catalog.table_names():
+            if stale.startswith(table_name + ROLLUP_SEPARATOR) and stale not in built:
+                cursor.execute(f"DROP TABLE IF EXISTS `{stale}`")
+    connection.commit()
+    refresh_catalog(connection)
+    if built:
+        print(f"Rollups of '{table_name}': {', '.join(built)}")
+    return built
+
+
+# same result from a rollup table, None when no rollup answers the query
+def rewrite_with_rollup(connection, table_name, query):
+    """
+    handles the generated "total X by Y", "average X by Y" and "count by Y" queries
+    (see parse_sql_aggregate). averages are sum/count of the rollup, so they are exact.
+    """
+    agg = parse_sql_aggregate(query)
+    if agg is None or agg['table'] != table_name:
+        return None
+    name = rollup_name(table_name, agg['group'])
+    rollup_columns = get_catalog(connection).columns(name)
+    group, value, alias = agg['group'], agg['value'], agg['alias']
+    if agg['kind'] == 'count' and 'row_count' in rollup_columns:
+        return f"SELECT {group}, row_count AS {alias} FROM {name}"
+    if f"sum_{value}" not in rollup_columns:
+        return None
+    if agg['kind'] == 'total':
+        return f"SELECT {group}, sum_{value} AS {alias} FROM {name}"
+    return f"SELECT {group}, sum_{value} / NULLIF(count_{value}, 0) AS {alias} FROM {name}"
+
+
+# drop a table's rollups, used when the table is recreated
+def drop_sql_rollups(connection, table_name):
+    try:
+        with connection.cursor() as cursor:
+            for name in get_catalog(connection).table_names():
+                if name.startswith(table_name + ROLLUP_SEPARATOR):
+                    cursor.execute(f"DROP TABLE IF EXISTS `{name}`")
+        connection.commit()
+    except pymysql.MySQLError as err:
+        print(f"Error dropping rollups: {err}")
+
+
+# ---------- MongoDB ----------
+
+# group fields (low-cardinality strings or dates) and measure fields (numbers) from a sample of documents
+def mongo_rollup_fields(collection, max_groups=ROLLUP_MAX_GROUPS, sample_size=MONGO_PROFILE_SAMPLE):
+    values = {}
+    for doc in collection.aggregate([{"$sample": {"size": sample_size}}]):
+        for field, value in doc.items():
+            if field != '_id':
+                values.setdefault(field, []).append(value)
+    measures, candidates = [], []
+    for field, field_values in values.items():
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in field_values):
+            measures.append(field)
+        elif all(isinstance(v, str) for v in field_values) or \
+                all(hasattr(v, 'isoformat') for v in field_values):
+            candidates.append(field)
+    groups = []
+    for field in candidates:
+        distinct = list(collection.aggregate([
+            {"$group": {"_id": f"${field}"}}, {"$limit": max_groups + 1}, {"$count": "n"}
+        ]))
+        if distinct and distinct[0]['n'] <= max_groups:
+            groups.append(field)
+    return groups, measures
+
+
+# (re)build every rollup collection of a collection, called after each upload
+def build_mongo_rollups(collection, max_groups=ROLLUP_MAX_GROUPS):
+    """
+    one rollup collection per low-cardinality field, documents are
+    {_id: group value, row_count, sum_<measure>, count_<measure>}. $out replaces the target
+    atomically, so appended documents are picked up by the rebuild.
+    returns the names of the rollup collections.
+    """
+    from pymongo.errors import PyMongoError  # Mongo only, keeps pymongo out of the SQL flow
+    if is_rollup(collection.name):
+        return []
+    try:
+        groups, measures = mongo_rollup_fields(collection, max_groups)
+        built = []
+        for group in groups:
+            name = rollup_name(collection.name, group)
+            stage = {"_id": f"${group}", "row_count": {"$sum": 1}}
+            for measure in measures:
+                stage[f"sum_{measure}"] = {"$sum": f"${measure}"}
+                stage[f"count_{measure}"] = {"$sum": {"$cond": [{"$isNumber": f"${measure}"}, 1, 0]}}
+            collection.aggregate([{"$group": stage}, {"$out": name}])
+            built.append(name)
+        for stale in collection.database.list_collection_names():
+            if stale.startswith(collection.name + ROLLUP_SEPARATOR) and stale not in built:
+                collection.database.drop_collection(stale)
+        if built:
+            print(f"Rollups of '{collection.name}': {', '.join(built)}")
+        return built
+    except PyMongoError as err:
+        print(f"Error building rollups: {err}")
+        return []
+
+
+# (rollup collection, pipeline) answering a total/average/count by group, (None, None) when there is no rollup
+def mongo_rollup_pipeline(collection, kind, group, field=None):
+    name = rollup_name(collection.name, group)
+    rollup = collection.database[name]
+    if name not in collection.database.list_collection_names():
+        return None, None
+    if kind == 'count':
+        value = "$row_count"
+    elif rollup.find_one({f"sum_{field}": {"$exists": True}}) is None:
+        return None, None
+    elif kind == 'total':
+        value = f"$sum_{field}"
+    else:
+        value = {"$cond": [{"$eq": [f"$count_{field}", 0]}, None, {"$divide": [f"$sum_{field}", f"$count_{field}"]}]}
+    alias = f"total_{field}" if kind == 'total' else f"average_{field}" if kind == 'average' else 'count'
+    return rollup, [{"$project": {"_id": 1, alias: value}}, {"$sort": {"_id": 1}}]
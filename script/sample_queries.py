@@ -1,18 +1,23 @@
 import sys
+import time
+from contextlib import nullcontext
 import pymysql
 import pandas as pd
 
-# connect to MySQL
+from connection_pool import get_pool, connection_database
+from lru_cache import LRUCache
+from schema_catalog import get_catalog
+from columnar_fetch import fetch_columnar, rows_to_frame
+from query_timeout import QueryWatchdog, QueryCancelled, RunningQueries, timeout_for, with_execution_time_hint
+from concurrent_executor import run_concurrently, report_concurrency, DEFAULT_MAX_WORKERS
+
+# connect to MySQL, the connection is borrowed from the database's shared pool and goes back on close()
 def connect_to_mysql(database):
     try:
-        connection = pymysql.connect(
-        host='localhost',
-        user='root',
-        password='Dsci-551',
-        database=database)
+        connection = get_pool(database).acquire()
         print(f"Connected to MySQL, Database Name: {database}")
         return connection
-    except pymysql.MySQLError as err:
+    except (pymysql.MySQLError, TimeoutError) as err:
         print(f"Error: {err}")
         return None
 
@@ -26,14 +31,12 @@ def get_column_info_and_examples(connection, table_name):
     examples = {}
     all_columns = []
     
+    # Get column types and keys from the schema catalog
+    for column_name, info in get_catalog(connection).columns(table_name).items():
+        column_info[column_name] = {'type': info['type'], 'key': info['key']}
+        all_columns.append(column_name)
+
     with connection.cursor() as cursor:
-        # Get column types and keys
-        cursor.execute(f"DESCRIBE {table_name}")
-        for row in cursor.fetchall():
-            column_name, column_type, key_type = row[0], row[1], row[3]
-            column_info[column_name] = {'type': column_type, 'key': key_type}
-            all_columns.append(column_name)
-        
         # Get example values
         cursor.execute(f"SELECT * FROM {table_name} LIMIT 5")
         rows = cursor.fetchall()
@@ -43,80 +46,239 @@ def get_column_info_and_examples(connection, table_name):
     
     return column_info, examples, all_columns
 
+# rows per page when streaming results, and the default hard cap on rows read (None = no cap)
+PAGE_SIZE = 20
+MAX_RESULT_ROWS = None
+
+
 # execute a query and return results
-def execute_query(connection, query, as_list=False):
+def execute_query(connection, query, as_list=False, max_rows=None, timeout=None):
     """
-    executes a query returns the result as a DF.
+    executes a query returns the result as a DF, decoded into typed columns (see columnar_fetch).
+    with max_rows, rows are streamed from the server on a separate pooled connection and reading
+    stops after max_rows; the unread rest is dropped with that connection, `connection` stays usable.
+    with timeout (seconds), a SELECT carries a MAX_EXECUTION_TIME hint and any statement is
+    killed by a watchdog at the deadline (TimeoutError); Ctrl-C raises QueryCancelled.
     """
-    with connection.cursor() as cursor:
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
+    if max_rows is not None:
+        with get_pool(connection_database(connection)).connection() as stream_connection:
+            pages = list(stream_query(stream_connection, query, page_size=max_rows, max_rows=max_rows,
+                                      timeout=timeout))
+        result = pd.concat(pages) if pages else pd.DataFrame()
+        return result.iloc[:, 0].tolist() if as_list and not result.empty else result
+    query = with_execution_time_hint(query, timeout)
+    deadline = QueryWatchdog(connection, timeout).guard() if timeout else nullcontext()
+    with deadline:
         if as_list:
-            return [row[0] for row in rows]
-        return pd.DataFrame(rows, columns=columns)
+            with connection.cursor() as cursor:
+                cursor.execute(query)
+                return [row[0] for row in cursor.fetchall()]
+        # unbuffered cursor: rows are decoded block by block into typed column buffers
+        with connection.cursor(pymysql.cursors.SSCursor) as cursor:
+            cursor.execute(query)
+            return fetch_columnar(cursor)
 
-# generate SQL examples based on query type
-def generate_sql_examples(connection, table_name):
+
+# stream a query's result as DataFrame pages from an unbuffered server-side cursor
+def stream_query(connection, query, page_size=PAGE_SIZE, max_rows=MAX_RESULT_ROWS, timeout=None):
     """
-    generates SQL query examples for all language constructs: GROUP BY, WHERE, HAVING, ORDER BY, AGGREGATION.
+    yields DataFrame pages of at most page_size rows as they arrive, the index continues
+    across pages. client memory holds one page whatever the result size.
+    rows past max_rows (or left when the caller stops iterating) are never read, the server
+    is still sending them, so the connection is discarded (pooled) or closed instead of reused.
+    timeout bounds the execution and each page read, time spent between pages is not counted.
     """
-    column_info, examples, all_columns = get_column_info_and_examples(connection, table_name)
-    queries = {'GROUP BY': [], 'WHERE': [], 'HAVING': [], 'ORDER BY': [], 'AGGREGATION': []}
+    cursor = connection.cursor(pymysql.cursors.SSCursor)
+    watchdog = QueryWatchdog(connection, timeout) if timeout else None
+    deadline = watchdog.guard if watchdog else nullcontext
+    fetched = 0
+    exhausted = False
+    try:
+        with deadline():
+            cursor.execute(query)
+        while max_rows is None or fetched < max_rows:
+            size = page_size if max_rows is None else min(page_size, max_rows - fetched)
+            with deadline():
+                rows = cursor.fetchmany(size)
+            if not rows:
+                exhausted = True
+                break
+            page = rows_to_frame(rows, cursor.description, index=range(fetched, fetched + len(rows)))
+            fetched += len(rows)
+            yield page
+    finally:
+        if exhausted:
+            cursor.close()
+        elif hasattr(connection, 'discard'):
+            connection.discard()
+        else:
+            connection.close()
 
-    # Separate columns into categorical and numeric, excluding primary and foreign keys from numeric operations
-    categorical_columns = [
-        col for col, info in column_info.items() 
-        if ("id" not in col.lower()) and ("varchar" in info['type'] or "text" in info['type'] or "enum" in info['type']) and info['key'] not in ('PRI', 'MUL')
-    ]
-    numeric_columns = [
-        col for col, info in column_info.items() 
-        if ("id" not in col.lower()) and ("int" in info['type'] or "decimal" in info['type'] or "float" in info['type']) and info['key'] not in ('PRI', 'MUL')
-    ]
-    
-    # GROUP BY queries
-    for cat_col in categorical_columns[:2]:  # Limit to 2 examples
+
+# print pages one at a time, asking before each following page
+def page_through(pages, page_size=PAGE_SIZE, max_rows=MAX_RESULT_ROWS, keep_rows=0):
+    """
+    returns (rows shown, result): result is the whole result as one DataFrame when every row
+    was shown and there are at most keep_rows of them, otherwise None.
+    """
+    shown, kept, complete = 0, [], True
+    for page in pages:
+        print(page.to_string(header=shown == 0))
+        shown += len(page)
+        kept = kept + [page] if shown <= keep_rows else None
+        if max_rows is not None and shown >= max_rows:
+            complete = False  # more rows may exist past the cap
+            break
+        if len(page) < page_size:
+            continue  # last page, let the stream finish
+        try:
+            more = input("Press Enter for more rows, or 'q' to stop: ").strip().lower()
+        except KeyboardInterrupt:
+            more = 'q'  # Ctrl-C while paging only stops this result
+        if more == 'q':
+            complete = False
+            break
+    if shown == 0:
+        print("No rows returned.")
+    elif max_rows is not None and shown >= max_rows:
+        print(f"Stopped after {max_rows} rows (row cap).")
+    if not complete or kept is None:
+        return shown, None
+    return shown, pd.concat(kept) if kept else pd.DataFrame()
+
+
+# split an in-memory DataFrame into display pages
+def frame_pages(dataframe, page_size=PAGE_SIZE):
+    for start in range(0, len(dataframe), page_size):
+        yield dataframe.iloc[start:start + page_size]
+
+
+# print a query's result page by page, the first page shows as soon as it arrives
+def show_paged_results(connection, query, page_size=PAGE_SIZE, max_rows=MAX_RESULT_ROWS, keep_rows=0, timeout=None):
+    """
+    the query runs on its own pooled connection so stopping early does not affect `connection`.
+    a timeout or Ctrl-C aborts only this query.
+    returns (rows shown, result) as page_through does.
+    """
+    try:
+        stream_connection = get_pool(connection_database(connection)).acquire()
+    except (pymysql.MySQLError, TimeoutError) as err:
+        print(f"Error: {err}")
+        return 0, None
+    pages = stream_query(stream_connection, query, page_size, max_rows, timeout)
+    try:
+        return page_through(pages, page_size, max_rows, keep_rows)
+    except (pymysql.MySQLError, TimeoutError, QueryCancelled) as err:
+        print(f"Error: {err}")
+        return 0, None
+    finally:
+        pages.close()
+        stream_connection.close()
+
+
+# example catalog cache: (database, table, construct, table version) -> examples
+EXAMPLE_CACHE_SIZE = 256
+example_cache = LRUCache(max_size=EXAMPLE_CACHE_SIZE)
+
+
+# table version signal: last update time and row count from information_schema
+def get_table_version(connection, table_name):
+    with connection.cursor() as cursor:
+        try:
+            # MySQL 8 caches table statistics for a day unless the expiry is 0
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except pymysql.MySQLError:
+            pass  # MySQL 5.7 has no statistics cache
+        cursor.execute(
+            "SELECT UPDATE_TIME, TABLE_ROWS, CREATE_TIME FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+            (table_name,)
+        )
+        return cursor.fetchone()
+
+
+# columns split into categorical and numeric, plus example values, computed once per table version
+def get_example_context(connection, table_name, version):
+    key = (connection_database(connection), table_name, 'CONTEXT', version)
+    context = example_cache.get(key)
+    if context is None:
+        column_info, examples, all_columns = get_column_info_and_examples(connection, table_name)
+        # Separate columns into categorical and numeric, excluding primary and foreign keys from numeric operations
+        categorical_columns = [
+            col for col, info in column_info.items() 
+            if ("id" not in col.lower()) and ("varchar" in info['type'] or "text" in info['type'] or "enum" in info['type']) and info['key'] not in ('PRI', 'MUL')
+        ]
+        numeric_columns = [
+            col for col, info in column_info.items() 
+            if ("id" not in col.lower()) and ("int" in info['type'] or "decimal" in info['type'] or "float" in info['type']) and info['key'] not in ('PRI', 'MUL')
+        ]
+        context = {'table_name': table_name, 'examples': examples, 'all_columns': all_columns,
+                   'categorical_columns': categorical_columns, 'numeric_columns': numeric_columns}
+        example_cache.put(key, context)
+    return context
+
+
+# GROUP BY queries
+def group_by_examples(ctx):
+    table_name, queries = ctx['table_name'], []
+    for cat_col in ctx['categorical_columns'][:2]:  # Limit to 2 examples
         description = f"Group {table_name} by {cat_col}"
         query = f"SELECT {cat_col}, COUNT(*) AS count FROM {table_name} GROUP BY {cat_col}"
-        queries['GROUP BY'].append((description, query, execute_query(connection, query)))
-    
-    # WHERE queries
+        queries.append((description, query))
+    return queries
+
+
+# WHERE queries
+def where_examples(ctx):
+    table_name, examples, all_columns, queries = ctx['table_name'], ctx['examples'], ctx['all_columns'], []
     # Numeric WHERE
-    for num_col in numeric_columns[:1]:  # Limit to 1 example
+    for num_col in ctx['numeric_columns'][:1]:  # Limit to 1 example
         valid_value = max(examples[num_col]) if examples[num_col] else 100
         reordered_columns = [num_col] + [col for col in all_columns if col != num_col]
         description = f"Filter {table_name} where {num_col} is greater than {valid_value}"
         query = f"SELECT {', '.join(reordered_columns)} FROM {table_name} WHERE {num_col} > {valid_value}"
-        queries['WHERE'].append((description, query, execute_query(connection, query)))
+        queries.append((description, query))
     
     # Categorical WHERE
-    for cat_col in categorical_columns[:1]:  # Limit to 1 example
+    for cat_col in ctx['categorical_columns'][:1]:  # Limit to 1 example
         valid_value = examples[cat_col][0] if examples[cat_col] else 'example_value'
         reordered_columns = [cat_col] + [col for col in all_columns if col != cat_col]
         description = f"Filter {table_name} where {cat_col} equals '{valid_value}'"
         query = f"SELECT {', '.join(reordered_columns)} FROM {table_name} WHERE {cat_col} = '{valid_value}'"
-        queries['WHERE'].append((description, query, execute_query(connection, query)))
-    
-    # HAVING queries
-    for cat_col in categorical_columns[:1]:  # Limit to 1 example
-        for num_col in numeric_columns[:1]:  # Limit to 1 example
+        queries.append((description, query))
+    return queries
+
+
+# HAVING queries
+def having_examples(ctx):
+    table_name, examples, queries = ctx['table_name'], ctx['examples'], []
+    for cat_col in ctx['categorical_columns'][:1]:  # Limit to 1 example
+        for num_col in ctx['numeric_columns'][:1]:  # Limit to 1 example
             group_value = sum(examples[num_col]) // 2 if examples[num_col] else 100
             description = f"Filter groups of {cat_col} where total {num_col} exceeds {group_value}"
             query = (
                 f"SELECT {cat_col}, SUM({num_col}) AS total_{num_col} "
                 f"FROM {table_name} GROUP BY {cat_col} HAVING total_{num_col} > {group_value}"
             )
-            queries['HAVING'].append((description, query, execute_query(connection, query)))
-    
-    # ORDER BY queries
-    for num_col in numeric_columns[:2]:  # Limit to 2 examples
+            queries.append((description, query))
+    return queries
+
+
+# ORDER BY queries
+def order_by_examples(ctx):
+    table_name, all_columns, queries = ctx['table_name'], ctx['all_columns'], []
+    for num_col in ctx['numeric_columns'][:2]:  # Limit to 2 examples
         description = f"Sort {table_name} by {num_col} in descending order"
         reordered_columns = [num_col] + [col for col in all_columns if col != num_col]
         query = f"SELECT {', '.join(reordered_columns)} FROM {table_name} ORDER BY {num_col} DESC LIMIT 10"
-        queries['ORDER BY'].append((description, query, execute_query(connection, query)))
-    
-    # AGGREGATION queries
-    for cat_col in categorical_columns[:1]:  # Limit to 1 grouping column
+        queries.append((description, query))
+    return queries
+
+
+# AGGREGATION queries
+def aggregation_examples(ctx):
+    table_name, numeric_columns, queries = ctx['table_name'], ctx['numeric_columns'], []
+    for cat_col in ctx['categorical_columns'][:1]:  # Limit to 1 grouping column
         # SUM
         description = f"Total {numeric_columns[0]} by {cat_col}" if numeric_columns else "Total by group"
         query = (
@@ -124,7 +286,7 @@ def generate_sql_examples(connection, table_name):
             f"FROM {table_name} GROUP BY {cat_col}"
         ) if numeric_columns else ""
         if query:
-            queries['AGGREGATION'].append((description, query, execute_query(connection, query)))
+            queries.append((description, query))
         
         # AVG
         description = f"Average {numeric_columns[0]} by {cat_col}" if numeric_columns else "Average by group"
@@ -133,13 +295,79 @@ def generate_sql_examples(connection, table_name):
             f"FROM {table_name} GROUP BY {cat_col}"
         ) if numeric_columns else ""
         if query:
-            queries['AGGREGATION'].append((description, query, execute_query(connection, query)))
+            queries.append((description, query))
         
         # COUNT
         description = f"Count rows by {cat_col}"
         query = f"SELECT {cat_col}, COUNT(*) AS count_rows FROM {table_name} GROUP BY {cat_col}"
-        queries['AGGREGATION'].append((description, query, execute_query(connection, query)))
-    
+        queries.append((description, query))
+    return queries
+
+
+# example builder for each language construct, a builder returns (description, query) pairs
+EXAMPLE_BUILDERS = {
+    'GROUP BY': group_by_examples,
+    'WHERE': where_examples,
+    'HAVING': having_examples,
+    'ORDER BY': order_by_examples,
+    'AGGREGATION': aggregation_examples,
+}
+
+
+# run one example query on a connection borrowed from the database's pool
+def pooled_query_task(database, query, running=None):
+    def task():
+        with get_pool(database).connection() as connection:
+            with running.track(connection) if running is not None else nullcontext():
+                return execute_query(connection, query, timeout=timeout_for('sql_example'))
+    return task
+
+
+# generate SQL examples based on query type
+def generate_sql_examples(connection, table_name, query_types=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    generates SQL query examples for the requested language constructs (default: all of
+    GROUP BY, WHERE, HAVING, ORDER BY, AGGREGATION). only the requested constructs are run,
+    results are cached per table and reused until the table's version changes.
+    queries that are not cached run concurrently, each on its own pooled connection.
+    """
+    query_types = list(EXAMPLE_BUILDERS) if query_types is None else query_types
+    version = get_table_version(connection, table_name)
+    database = connection_database(connection)
+    queries = {}
+    planned = {}
+    for query_type in query_types:
+        examples = example_cache.get((database, table_name, query_type, version))
+        if examples is None:
+            ctx = get_example_context(connection, table_name, version)
+            planned[query_type] = EXAMPLE_BUILDERS[query_type](ctx)
+        queries[query_type] = examples
+
+    # aggregates a rollup table answers read the rollup, the example still shows the query on the table
+    from rollups import rewrite_with_rollup
+    running = RunningQueries()
+    tasks = [
+        ((query_type, i), pooled_query_task(database, rewrite_with_rollup(connection, table_name, query) or query,
+                                            running))
+        for query_type, plan in planned.items() for i, (_, query) in enumerate(plan)
+    ]
+    started_at = time.perf_counter()
+    # Ctrl-C kills every running example on the server before the pool is shut down
+    outcomes = list(run_concurrently(tasks, max_workers, on_cancel=running.kill_all))
+    report_concurrency(outcomes, started_at)
+
+    results = {outcome['key']: outcome for outcome in outcomes}
+    for query_type, plan in planned.items():
+        examples, failed = [], False
+        for i, (description, query) in enumerate(plan):
+            outcome = results[(query_type, i)]
+            if outcome['error'] is not None:
+                print(f"Error: {outcome['error']}")
+                failed = True
+            examples.append((description, query, outcome['result']))
+        if not failed:  # failed queries are retried on the next request
+            example_cache.put((database, table_name, query_type, version), examples)
+        queries[query_type] = examples
     return queries
 
 # main function to handle user requests with sys.argv
@@ -154,14 +382,15 @@ def main():
     query_type = sys.argv[3]
 
     connection = connect_to_mysql(database)
-    queries = generate_sql_examples(connection, table_name)
 
     if query_type.upper() == "ALL":
+        queries = generate_sql_examples(connection, table_name)
         for query_type, examples in queries.items():
             print(f"{query_type} Queries:")
             for desc, query, result in examples:
                 print(f"{desc}\nQuery:\n{query}\nResult:\n{result}\n")
-    elif query_type in queries:
+    elif query_type in EXAMPLE_BUILDERS:
+        queries = generate_sql_examples(connection, table_name, [query_type])
         print(f"{query_type} Queries:")
         for desc, query, result in queries[query_type]:
             print(f"{desc}\nQuery:\n{query}\nResult:\n{result}\n")
@@ -0,0 +1,98 @@
+import threading
+
+import pandas as pd
+
+from connection_pool import connection_database
+
+# DESCRIBE output columns, in DESCRIBE's order
+DESCRIBE_COLUMNS = ['Field', 'Type', 'Null', 'Key', 'Default', 'Extra']
+
+
+class SchemaCatalog:
+    """Columns, keys and indexes of every table in one database, read from information_schema in two queries."""
+
+    def __init__(self, database):
+        self.database = database
+        self.tables = {}  # table -> {column: {'type', 'null', 'key', 'default', 'extra'}} in column order
+        self.indexes = {}  # table -> {index name: {'columns': [...], 'unique': bool}}
+
+    def load(self, connection):
+        tables, indexes = {}, {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY, COLUMN_DEFAULT, EXTRA "
+                "FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, ORDINAL_POSITION",
+                (self.database,)
+            )
+            for table, column, column_type, nullable, key, default, extra in cursor.fetchall():
+                tables.setdefault(table, {})[column] = {
+                    'type': column_type, 'null': nullable, 'key': key, 'default': default, 'extra': extra
+                }
+            cursor.execute(
+                "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME, NON_UNIQUE FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = %s ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX",
+                (self.database,)
+            )
+            for table, index, column, non_unique in cursor.fetchall():
+                entry = indexes.setdefault(table, {}).setdefault(index, {'columns': [], 'unique': not non_unique})
+                entry['columns'].append(column)
+        self.tables, self.indexes = tables, indexes
+        return self
+
+    def table_names(self):
+        return sorted(self.tables)
+
+    def has_table(self, table_name):
+        return table_name in self.tables
+
+    def columns(self, table_name):
+        return self.tables.get(table_name, {})
+
+    # column name -> type, as DESCRIBE's first two columns
+    def column_types(self, table_name):
+        return {column: info['type'] for column, info in self.columns(table_name).items()}
+
+    def primary_key(self, table_name):
+        return self.indexes.get(table_name, {}).get('PRIMARY', {}).get('columns', [])
+
+    def table_indexes(self, table_name):
+        return self.indexes.get(table_name, {})
+
+    # same rows as DESCRIBE <table>
+    def describe(self, table_name):
+        rows = [
+            [column, info['type'], info['null'], info['key'], info['default'], info['extra']]
+            for column, info in self.columns(table_name).items()
+        ]
+        return pd.DataFrame(rows, columns=DESCRIBE_COLUMNS)
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+# catalog of the connection's database, loaded on first use and kept until invalidated
+def get_catalog(connection):
+    database = connection_database(connection)
+    with _catalogs_lock:
+        catalog = _catalogs.get(database)
+    if catalog is None:
+        catalog = SchemaCatalog(database).load(connection)
+        with _catalogs_lock:
+            _catalogs[database] = catalog
+    return catalog
+
+
+# drop a database's catalog (or all of them) so the next lookup reloads it, called after DDL
+def invalidate_catalog(database=None):
+    with _catalogs_lock:
+        if database is None:
+            _catalogs.clear()
+        else:
+            _catalogs.pop(database, None)
+
+
+# reload a database's catalog now
+def refresh_catalog(connection):
+    invalidate_catalog(connection_database(connection))
+    return get_catalog(connection)
@@ -1,19 +1,26 @@
+import os
+import argparse
 import pymysql
 import pandas as pd
 from datetime import datetime
 import sys
 
-# connect to MySQL without specifying a database
+from connection_pool import get_pool, connection_database
+from key_discovery import discover_candidate_keys, surrogate_key_name
+from type_profiler import DATETIME_FORMATS, profile_column, profile_dataframe, fit_row_width
+from bulk_loader import bulk_load, LOAD_STRATEGIES, DEFAULT_STRATEGY, DEFAULT_BATCH_SIZE
+from query_cache import invalidate_scope, sql_scope
+from schema_catalog import invalidate_catalog
+from rollups import build_sql_rollups
+
+# connect to MySQL without specifying a database, the connection is borrowed from the shared pool
+# and goes back to it on close()
 def connect_mysql_no_db():
     try:
-        connection = pymysql.connect(
-            host='localhost', 
-            user='root',  # MySQL username
-            password='Dsci-551'  # MySQL password
-        )
+        connection = get_pool(None).acquire()
         print("Connected to MySQL (no specific database selected)")
         return connection
-    except pymysql.MySQLError as err:
+    except (pymysql.MySQLError, TimeoutError) as err:
         print(f"Error: {err}")
         return None
 
@@ -38,31 +45,19 @@ def create_database(connection, db_name):
     except pymysql.MySQLError as err:
         print(f"Error creating database: {err}")
 
-# function to connect to a specific database in MySQL
+# function to connect to a specific database in MySQL, borrowed from the database's pool
 def connect_mysql_with_db(db_name):
     try:
-        connection = pymysql.connect(
-            host='localhost', 
-            user='root',  # MySQL username
-            password='Dsci-551',  # MySQL password
-            database=db_name  # Now connect to the specific database
-        )
+        connection = get_pool(db_name).acquire()
         print(f"Connected to MySQL database: {db_name}")
         return connection
-    except pymysql.MySQLError as err:
+    except (pymysql.MySQLError, TimeoutError) as err:
         print(f"Error: {err}")
         return None
 
 # function to detect date, time, or datetime using the datetime module
 def detect_datetime_format(value):
-    formats = [
-        ("%Y-%m-%d", "DATE"),  # Date format
-        ("%H:%M:%S", "TIME"),  # Time format
-        ("%Y-%m-%d %H:%M:%S", "DATETIME"),  # Datetime format
-        ("%m/%d/%Y", "DATE")  # Alternate date format (MM/DD/YYYY)
-    ]
-    
-    for fmt, dtype in formats:
+    for fmt, dtype in DATETIME_FORMATS:
         try:
             datetime.strptime(value, fmt)
             return dtype, fmt  # Return the detected format along with the data type
@@ -70,53 +65,55 @@ def detect_datetime_format(value):
             continue
     return None, None  # Return None if the format does not match any datetime pattern
 
+# function to find the date columns and their source format (e.g. MM/DD/YYYY) from the column profiles
+def detect_date_formats(dataframe, profiles=None):
+    profiles = profiles or profile_dataframe(dataframe)
+    return {
+        column: profile['datetime_format']
+        for column, profile in profiles.items()
+        if profile['mysql_type'] == "DATE"
+    }
+
+# function to convert date columns to the SQL date format YYYY-MM-DD
+def convert_date_columns(dataframe, date_formats):
+    for column, detected_format in date_formats.items():
+        dataframe[column] = pd.to_datetime(dataframe[column], format=detected_format, errors='coerce').dt.strftime('%Y-%m-%d')
+
 # function to preprocess and format date columns before upload data to MySQL
-def preprocess_dates(dataframe):
-    for column in dataframe.columns:
-        # try detect if the column is a date
-        sample_value = dataframe[column].dropna().iloc[0] if not dataframe[column].dropna().empty else None
-        if sample_value:
-            dtype, detected_format = detect_datetime_format(str(sample_value))
-            if dtype == "DATE" and detected_format:
-                # convert the column to the SQL date format YYYY-MM-DD
-                dataframe[column] = pd.to_datetime(dataframe[column], format=detected_format, errors='coerce').dt.strftime('%Y-%m-%d')
-
-# function to map pandas data types to MySQL data types using datetime module
+def preprocess_dates(dataframe, profiles=None):
+    date_formats = detect_date_formats(dataframe, profiles)
+    convert_date_columns(dataframe, date_formats)
+    return date_formats
+
+# function to map pandas data types to the tightest MySQL data types by profiling the whole column
 def map_pandas_dtype_to_mysql(column, dataframe):
-    sample_value = dataframe[column].dropna().iloc[0] if not dataframe[column].dropna().empty else None
-
-    if sample_value:
-        # try detect datetime format using the datetime module
-        detected_type, _ = detect_datetime_format(str(sample_value))
-        if detected_type:
-            return detected_type
-
-    # default MySQL types if not date/time related
-    dtype = dataframe[column].dtype
-    if pd.api.types.is_integer_dtype(dtype):
-        return "INT"
-    elif pd.api.types.is_float_dtype(dtype):
-        return "DECIMAL(10, 2)"
-    else:
-        return "VARCHAR(255)"
+    return profile_column(dataframe[column])['mysql_type']
+
+# {column: MySQL type} chosen by the profiler
+def column_types_from_profiles(profiles):
+    return {column: profile['mysql_type'] for column, profile in profiles.items()}
 
 # primary key detection using Uniqueness, Non-nullability, and Cardinality
-def detect_primary_key(dataframe):
-    total_rows = len(dataframe)
-    
-    for column in dataframe.columns:
-        unique_values = dataframe[column].nunique()  # Number of unique values
-        non_null_count = dataframe[column].notnull().sum()  # Non-null count
-        cardinality = unique_values / total_rows  # Cardinality ratio
+# returns the columns of the best single or composite key, None if the data has no natural key
+# column_types: {column: MySQL type}, keys too wide for a MySQL index are skipped when given
+def detect_primary_key(dataframe, column_types=None):
+    candidates, cardinalities = discover_candidate_keys(dataframe, column_types=column_types)
 
-        # check if the column is a good fit for primary key
-        if dataframe[column].is_unique and non_null_count == total_rows and cardinality > 0.9:
-            print(f"Column '{column}' detected as the primary key (Unique, Non-null, High Cardinality).")
-            return column
+    if candidates:
+        ranked = ", ".join(["(" + ", ".join(columns) + ")" for columns in candidates[:3]])
+        print(f"Candidate keys: {ranked}")
+        print(f"Column(s) {candidates[0]} detected as the primary key (Unique, Non-null, High Cardinality).")
+        return candidates[0]
 
+    if any(approximate for _, approximate in cardinalities.values()):
+        print("Distinct counts estimated with HyperLogLog sketches.")
     print("No suitable primary key detected based on uniqueness, non-nullability, and cardinality.")
     return None  # if there is no suitable column is found
 
+# MySQL errors of ADD PRIMARY KEY on columns that cannot be the key: duplicate entry, NULL in a key
+# column, key longer than 3072 bytes, TEXT column in the key (a column widened during the load)
+KEY_VIOLATION_ERRORS = (1062, 1138, 1071, 1170)
+
 # drop the table if it already exists
 def drop_existing_table(connection, table_name):
     try:
@@ -126,29 +123,46 @@ def drop_existing_table(connection, table_name):
     except pymysql.MySQLError as err:
         print(f"Error dropping table: {err}")
 
-# create a table based on CSV column types
-def create_table_from_csv(connection, table_name, dataframe):
+# create a table based on CSV column types, returns {column: MySQL type} of the created table
+# column_types: precomputed {column: MySQL type}, profiled from the DataFrame when omitted
+# primary_key_columns: key to declare, detected from the DataFrame when None, [] creates the table without one
+def create_table_from_csv(connection, table_name, dataframe, column_types=None, primary_key_columns=None):
     cursor = connection.cursor()
 
     # drop the table if it already exists
     drop_existing_table(connection, table_name)
     
-    # find the primary key column by checking uniqueness, non-nullability, and cardinality
-    primary_key_column = detect_primary_key(dataframe)
-    if not primary_key_column:
-        print("Error: No suitable primary key column found.")
-        return
-    
+    if column_types is None:
+        column_types = column_types_from_profiles(profile_dataframe(dataframe))
+
+    # find the primary key column(s) by checking uniqueness, non-nullability, and cardinality
+    if primary_key_columns is None:
+        primary_key_columns = detect_primary_key(dataframe, column_types)
+
     # create column definitions based on CSV data types
     columns = []
+    if primary_key_columns is None:
+        # no natural key: add a surrogate AUTO_INCREMENT key, the loaders leave it out of their column list
+        primary_key_columns = [surrogate_key_name(list(dataframe.columns))]
+        columns.append(f"`{primary_key_columns[0]}` BIGINT AUTO_INCREMENT")
+        print(f"Adding surrogate key column '{primary_key_columns[0]}'.")
+
+    # wide VARCHAR columns move to TEXT when the row would pass MySQL's 65535-byte limit
+    fitted = fit_row_width(column_types, keep=primary_key_columns or ())
     for column_name in dataframe.columns:
-        col_type = map_pandas_dtype_to_mysql(column_name, dataframe)
+        if fitted[column_name] != column_types[column_name]:
+            print(f"Column '{column_name}' stored as TEXT instead of {column_types[column_name]} to fit the row size limit.")
+    column_types = fitted
+    for column_name in dataframe.columns:
+        col_type = column_types[column_name]
         
-        # detected unique column as the primary key
-        if column_name == primary_key_column:
-            columns.append(f"`{column_name}` {col_type} PRIMARY KEY")
+        # key columns are NOT NULL, the PRIMARY KEY constraint lists them (one or several)
+        if column_name in primary_key_columns:
+            columns.append(f"`{column_name}` {col_type} NOT NULL")
         else:
             columns.append(f"`{column_name}` {col_type}")
+    if primary_key_columns:
+        columns.append("PRIMARY KEY (" + ", ".join([f"`{col}`" for col in primary_key_columns]) + ")")
     
     # query for CREATE TABLE
     create_table_query = f"""
@@ -158,48 +172,152 @@ def create_table_from_csv(connection, table_name, dataframe):
     """
     cursor.execute(create_table_query)
     connection.commit()
-    print(f"Table '{table_name}' created with columns based on CSV structure, using '{primary_key_column}' as the primary key.")
+    if primary_key_columns:
+        print(f"Table '{table_name}' created with columns based on CSV structure, using {primary_key_columns} as the primary key.")
+    else:
+        print(f"Table '{table_name}' created with columns based on CSV structure, without a primary key.")
+    return column_types
+
+# create a table from the first rows of a CSV, returns ({column: MySQL type}, key columns to confirm)
+# a key found in the sample may not hold on the rest of the file, so the table is created without it
+# and confirm_primary_key adds it once every row is loaded
+def create_table_from_sample(connection, table_name, sample, column_types):
+    key_columns = detect_primary_key(sample, column_types)
+    if key_columns is None:
+        # no natural key even in the sample: the surrogate key is safe from the start
+        return create_table_from_csv(connection, table_name, sample, column_types), None
+    print(f"Key {key_columns} holds on the first {len(sample)} rows, it is checked against every row after the load.")
+    return create_table_from_csv(connection, table_name, sample, column_types, primary_key_columns=[]), key_columns
+
+# add the key found in a sample to a table loaded without one, or a surrogate key when the full data
+# repeats it or has NULLs in it
+def confirm_primary_key(connection, table_name, key_columns, columns):
+    key_list = ", ".join([f"`{col}`" for col in key_columns])
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(f"ALTER TABLE `{table_name}` ADD PRIMARY KEY ({key_list})")
+            print(f"Primary key {key_columns} confirmed on every row of '{table_name}'.")
+            return key_columns
+        except pymysql.MySQLError as err:
+            if not err.args or err.args[0] not in KEY_VIOLATION_ERRORS:
+                raise
+            print(f"{key_columns} is not a key of the whole file ({err}).")
+        surrogate = surrogate_key_name(list(columns))
+        cursor.execute(f"ALTER TABLE `{table_name}` ADD COLUMN `{surrogate}` BIGINT AUTO_INCREMENT PRIMARY KEY FIRST")
+        print(f"Adding surrogate key column '{surrogate}'.")
+        return [surrogate]
+
+# upload modes: 'full' reads the whole CSV at once, 'stream' reads it in chunks, 'auto' picks by file size,
+# 'parallel' loads partitions of the file in a process pool,
+# 'append'/'upsert' keep the existing table and only send rows past its watermark
+UPLOAD_MODES = ('auto', 'full', 'stream', 'parallel', 'append', 'upsert')
+STREAM_THRESHOLD_BYTES = 100 * 1024 * 1024
 
 # upload dataset to MySQL based on CSV columns and table columns
-def upload_dataset_to_mysql(connection, table_name, csv_file_path):
+def upload_dataset_to_mysql(connection, table_name, csv_file_path, strategy=DEFAULT_STRATEGY, batch_size=DEFAULT_BATCH_SIZE,
+                            mode='auto', chunk_size=None, workers=None, index_columns=(), watermark_column=None):
+    """
+    strategy: 'executemany' (batched multi-row INSERTs) or 'load_data' (LOAD DATA LOCAL INFILE)
+    batch_size: rows sent and committed per batch
+    mode: one of UPLOAD_MODES, 'auto' streams files larger than STREAM_THRESHOLD_BYTES
+    chunk_size: rows held in memory per chunk in 'stream' mode
+    workers: worker processes in 'parallel' mode (default: CPU count)
+    index_columns: columns to index after a 'parallel' load
+    watermark_column: column compared with MAX() of the table in 'append'/'upsert' mode
+    the table's rollups (see rollups.py) are rebuilt after every successful load.
+    """
+    loaded = False
     try:
+        if mode not in UPLOAD_MODES:
+            raise ValueError(f"Unknown upload mode '{mode}', expected one of {UPLOAD_MODES}")
+        if mode == 'auto':
+            mode = 'stream' if os.path.getsize(csv_file_path) > STREAM_THRESHOLD_BYTES else 'full'
+
+        if mode in ('append', 'upsert'):
+            from incremental_ingest import incremental_upload_to_mysql
+            from stream_ingest import DEFAULT_CHUNK_SIZE
+            result = incremental_upload_to_mysql(connection, table_name, csv_file_path, mode=mode,
+                                                 watermark_column=watermark_column,
+                                                 chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+                                                 strategy=strategy, batch_size=batch_size)
+            if result is not None:
+                print(f"Dataset {mode}ed to '{table_name}' based on matching CSV columns.")
+                loaded = True
+                return
+            # first load of this table, create it from the whole file
+            print(f"Table '{table_name}' does not exist yet, creating it.")
+            mode = 'stream' if os.path.getsize(csv_file_path) > STREAM_THRESHOLD_BYTES else 'full'
+
+        if mode == 'stream':
+            from stream_ingest import stream_upload_to_mysql, DEFAULT_CHUNK_SIZE
+            stream_upload_to_mysql(connection, table_name, csv_file_path, chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+                                   strategy=strategy, batch_size=batch_size)
+            print(f"Dataset streamed to '{table_name}' based on matching CSV columns.")
+            loaded = True
+            return
+
+        if mode == 'parallel':
+            from parallel_ingest import parallel_upload_to_mysql
+            db_name = connection_database(connection)
+            parallel_upload_to_mysql(connection, db_name, table_name, csv_file_path, workers=workers,
+                                     index_columns=index_columns, strategy=strategy, batch_size=batch_size)
+            print(f"Dataset loaded in parallel to '{table_name}' based on matching CSV columns.")
+            loaded = True
+            return
 
         dataset = pd.read_csv(csv_file_path)
 
+        # profile every column once, the profiles drive both date conversion and column types
+        profiles = profile_dataframe(dataset)
+
         # date columns to correct the format
-        preprocess_dates(dataset)
+        preprocess_dates(dataset, profiles)
         
         # create the table based on the CSV structure
-        create_table_from_csv(connection, table_name, dataset)
+        create_table_from_csv(connection, table_name, dataset, column_types_from_profiles(profiles))
         
-        # insert data from CSV into the table
-        cursor = connection.cursor()
-        for _, row in dataset.iterrows():
-            placeholders = ', '.join(['%s'] * len(row))
-            columns = ', '.join([f"`{col}`" for col in row.index])
-            sql = f"INSERT INTO `{table_name}` ({columns}) VALUES ({placeholders})"
-            cursor.execute(sql, tuple(row))
-        connection.commit()
+        # insert data from CSV into the table in batches
+        bulk_load(connection, table_name, dataset, strategy=strategy, batch_size=batch_size)
         print(f"Dataset uploaded to '{table_name}' based on matching CSV columns.")
+        loaded = True
     
     except FileNotFoundError as fnf_error:
         print(f"Error: {fnf_error}")
-    except pymysql.MySQLError as err:
+    except ValueError as err:
+        print(f"Error: {err}")
+    except (pymysql.MySQLError, RuntimeError) as err:
         print(f"Error during data upload: {err}")
+    finally:
+        if loaded:
+            # precomputed totals, averages and counts of the new data
+            try:
+                build_sql_rollups(connection, table_name)
+            except pymysql.MySQLError as err:
+                print(f"Error building rollups: {err}")
+        # cached schema, questions and results on this table are out of date once it changed
+        invalidate_catalog(connection_database(connection))
+        invalidate_scope(sql_scope(connection, table_name))
 
 # main execution
 if __name__ == "__main__":
 
-    if len(sys.argv) == 4:
-        # If parameters are passed: User upload their own dataset
-        DB_NAME = sys.argv[1]
-        TABLE_NAME = sys.argv[2]
-        CSV_PATH = sys.argv[3]
-        print(f"User upload mode: Database: {DB_NAME}, Table: {TABLE_NAME}, CSV: {CSV_PATH}")
-    else:
-        DB_NAME = 'coffee_shop'
-        TABLE_NAME = 'coffee_sales'
-        CSV_PATH = 'coffee_shop_sales.csv'
+    parser = argparse.ArgumentParser(description="Create a MySQL table from a CSV file and upload its rows.")
+    parser.add_argument("database", nargs="?", default='coffee_shop')
+    parser.add_argument("table", nargs="?", default='coffee_sales')
+    parser.add_argument("csv", nargs="?", default='coffee_shop_sales.csv')
+    parser.add_argument("--strategy", choices=LOAD_STRATEGIES, default=DEFAULT_STRATEGY)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--mode", choices=UPLOAD_MODES, default='auto')
+    parser.add_argument("--chunk-size", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--index", action="append", default=[], help="column to index after a parallel load")
+    parser.add_argument("--watermark", default=None, help="watermark column for append/upsert")
+    args = parser.parse_args()
+
+    DB_NAME = args.database
+    TABLE_NAME = args.table
+    CSV_PATH = args.csv
+    print(f"Upload mode: Database: {DB_NAME}, Table: {TABLE_NAME}, CSV: {CSV_PATH}, Strategy: {args.strategy}, Mode: {args.mode}")
 
     # connect to MySQL first without selecting a database
     mysql_conn = connect_mysql_no_db()
@@ -224,7 +342,12 @@ if __name__ == "__main__":
             coffee_shop_csv_file_path = CSV_PATH
             
             # create the table and upload the dataset
-            upload_dataset_to_mysql(mysql_conn_with_db, coffee_shop_table_name, coffee_shop_csv_file_path)
+            upload_dataset_to_mysql(mysql_conn_with_db, coffee_shop_table_name, coffee_shop_csv_file_path,
+                                    strategy=args.strategy, batch_size=args.batch_size,
+                                    mode=args.mode, chunk_size=args.chunk_size,
+                                    workers=args.workers, index_columns=args.index,
+                                    watermark_column=args.watermark)
 
-            # close the connection
+            # return the connections to the pool
             mysql_conn_with_db.close()
+        mysql_conn.close()
@@ -0,0 +1,72 @@
+import time
+
+import pandas as pd
+
+from set_up_db import preprocess_dates, convert_date_columns, create_table_from_sample, confirm_primary_key
+from type_profiler import profile_column, profile_dataframe, widen_mysql_type, with_headroom, row_bytes, MAX_ROW_BYTES
+from bulk_loader import bulk_load, report_throughput, DEFAULT_STRATEGY, DEFAULT_BATCH_SIZE
+
+# rows used to infer the schema before streaming
+DEFAULT_SAMPLE_ROWS = 10000
+# rows held in memory at once while streaming
+DEFAULT_CHUNK_SIZE = 50000
+
+
+# column types for a table created from a sample, with headroom for the rows not seen yet
+def sample_column_types(profiles):
+    return {column: with_headroom(profile['mysql_type']) for column, profile in profiles.items()}
+
+
+# MySQL type needed by one column of a raw chunk
+def chunk_column_type(chunk, column):
+    return profile_column(chunk[column])['mysql_type']
+
+
+# ALTER columns whose values in this chunk no longer fit the current table type
+def widen_columns(connection, table_name, chunk, column_types, date_formats):
+    with connection.cursor() as cursor:
+        for column in chunk.columns:
+            current = column_types[column]
+            widened = widen_mysql_type(current, chunk_column_type(chunk, column))
+            if widened != current:
+                widened = with_headroom(widened)
+                if row_bytes(dict(column_types, **{column: widened})) > MAX_ROW_BYTES:
+                    widened = "TEXT"  # the wider VARCHAR would not fit MySQL's row size limit
+                cursor.execute(f"ALTER TABLE `{table_name}` MODIFY COLUMN `{column}` {widened}")
+                print(f"Column '{column}' widened from {current} to {widened}.")
+                column_types[column] = widened
+                # the column no longer holds only dates, keep the raw values from now on
+                date_formats.pop(column, None)
+
+
+# stream a CSV into MySQL chunk by chunk so memory does not grow with the file size
+def stream_upload_to_mysql(connection, table_name, csv_file_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                           sample_rows=DEFAULT_SAMPLE_ROWS, strategy=DEFAULT_STRATEGY, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    infers the schema from the first `sample_rows` rows, then reads, converts and inserts
+    `chunk_size` rows at a time. columns are widened with ALTER TABLE when a chunk holds
+    values the inferred type cannot store (e.g. decimals in an INT column). a primary key found
+    in the sample is only added once every row is loaded, the surrogate key replaces it when a
+    later row repeats it.
+    """
+    sample = pd.read_csv(csv_file_path, nrows=sample_rows)
+    profiles = profile_dataframe(sample)
+    date_formats = preprocess_dates(sample, profiles)
+    column_types, key_columns = create_table_from_sample(connection, table_name, sample, sample_column_types(profiles))
+    if column_types is None:
+        return None
+    del sample
+
+    started_at = time.perf_counter()
+    total_rows = 0
+    for chunk in pd.read_csv(csv_file_path, chunksize=chunk_size):
+        widen_columns(connection, table_name, chunk, column_types, date_formats)
+        convert_date_columns(chunk, date_formats)
+        total_rows += bulk_load(connection, table_name, chunk, strategy=strategy,
+                                batch_size=batch_size, report=False)['rows']
+        print(f"{total_rows} rows streamed into '{table_name}'...")
+
+    if key_columns:
+        confirm_primary_key(connection, table_name, key_columns, column_types)
+    return report_throughput(table_name, total_rows, started_at, f"stream/{strategy}")
+
@@ -0,0 +1,146 @@
+import re
+import sys
+import time
+
+# questions whose plain NLTK tokens the tokenizer must reproduce, on top of any file given to the benchmark
+PARITY_QUESTIONS = [
+    "total sales by region",
+    "average price by category",
+    "count rows by store",
+    "where price greater than 10",
+    "filter store equals downtown",
+    "filter store equals Downtown LA.",
+    "where city equals new york, ny",
+    "sort price",
+    "order by unit_price",
+    "having total sales greater than 100 group by region",
+    "What's the total revenue by month?",
+    "show me everything!",
+    "where name equals O'Brien",
+    "where name equals \"Alice Smith\"",
+    "filter category equals 'toys'",
+    "where price greater than 3.50",
+    "where amount greater than 1,000",
+    "total sales (usd) by region",
+    "count orders by customer_id...",
+    "where email equals jane@example.com",
+    "where discount equals 15%",
+    "where code equals #A-12",
+    "sort price -- highest first",
+    "where time equals 10:30",
+    "I can't find sales; show total sales by store",
+    "don't sort, just count by state",
+    "where price < 20 and qty > 3",
+    "gonna need the average rating by product",
+    "items we cannot ship by warehouse",
+    "where tag equals [new]",
+    "filter status equals {open}",
+    "price*qty by store",
+    "the customers' total spend by tier",
+    "where note equals “fragile”",
+]
+BENCHMARK_ROUNDS = 2000
+
+# text with nothing but word characters and whitespace skips the punctuation rules
+PLAIN_TEXT = re.compile(r"[\w\s]*")
+
+# the NLTKWordTokenizer rules word_tokenize applies to a sentence, in the same order, with rules that
+# only pad a character class with spaces merged into one pattern
+STARTING_QUOTES = [
+    (re.compile(r"([«“‘„]|[`]+)"), r" \1 "),
+    (re.compile(r"^\""), r"``"),
+    (re.compile(r"(``)"), r" \1 "),
+    (re.compile(r"([ \(\[{<])(\"|\'{2})"), r"\1 `` "),
+    (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r"\1 "),
+]
+FINAL_PERIOD = re.compile(r"([^\.])(\.)([\]\)}>\"\'»”’ ]*)\s*$")
+PUNCTUATION = [
+    (FINAL_PERIOD, r"\1 \2 \3 "),
+    (re.compile(r"([:,])([^\d])"), r" \1 \2"),
+    (re.compile(r"([:,])$"), r" \1 "),
+    (re.compile(r"\.{2,}|[;@#$%&]|[\u2012-\u2015]|[?!]"), r" \g<0> "),
+    (re.compile(r"([^\.])(\.)([\]\)}>\"\']*)\s*$"), r"\1 \2\3 "),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r"[*\]\[\(\)\{\}\<\>]|--"), r" \g<0> "),
+]
+ENDING_QUOTES = [
+    (re.compile(r"([»”’])"), r" \1 "),
+    (re.compile(r"''|\""), " '' "),
+    (re.compile(r"\s+"), " "),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r"\1 \2 "),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r"\1 \2 "),
+]
+# cannot -> can not, gonna -> gon na ..., then 'tis -> 't is, each pass padding both parts with spaces
+CONTRACTIONS = [
+    re.compile(r"(?i)\b(?:(can)(not)\b|(d)('ye)\b|(gim)(me)\b|(gon)(na)\b|(got)(ta)\b|(lem)(me)\b"
+               r"|(more)('n)\b|(wan)(na)(?=\s))"),
+    re.compile(r"(?i) ('t)(is|was)\b"),
+]
+
+
+# " prefix suffix " of a contraction match
+def split_contraction(match):
+    return " " + " ".join(part for part in match.groups() if part) + " "
+
+
+# contractions split into their parts
+def split_contractions(text):
+    for regex in CONTRACTIONS:
+        text = regex.sub(split_contraction, text)
+    return text
+
+
+def word_tokenize(text):
+    """
+    tokens of one sentence as NLTK's word_tokenize splits them, without loading NLTK or its punkt model.
+    text is not split into sentences first: a period ending a word inside the text stays attached
+    to it, like word_tokenize(text, preserve_line=True)
+    """
+    if PLAIN_TEXT.fullmatch(text):
+        return split_contractions(" " + text + " ").split()
+    for rules in (STARTING_QUOTES, PUNCTUATION):
+        for regex, substitution in rules:
+            text = regex.sub(substitution, text)
+    text = " " + text + " "
+    for regex, substitution in ENDING_QUOTES:
+        text = regex.sub(substitution, text)
+    return split_contractions(text).split()
+
+
+# parity and throughput against NLTK, which is only needed here: python tokenizer.py [questions file]
+if __name__ == "__main__":
+    try:
+        import nltk
+    except ImportError:
+        print("NLTK is not installed, nothing to compare against.")
+        sys.exit(1)
+
+    questions = list(PARITY_QUESTIONS)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1]) as f:
+            questions += [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    questions += [question.lower() for question in questions]  # preprocess_query tokenizes lowercased text
+
+    try:
+        nltk.word_tokenize("punkt check.")
+        reference, label = nltk.word_tokenize, "word_tokenize"
+    except LookupError:
+        # without the punkt model only the per-sentence tokenizer can run
+        reference, label = (lambda text: nltk.word_tokenize(text, preserve_line=True),
+                            "word_tokenize(preserve_line=True), punkt is not installed")
+
+    mismatches = [(question, reference(question), word_tokenize(question)) for question in questions
+                  if reference(question) != word_tokenize(question)]
+    for question, expected, tokens in mismatches:
+        print(f"mismatch: {question!r}\n    nltk: {expected}\n    ours: {tokens}")
+
+    rates = []
+    for tokenize in (reference, word_tokenize):
+        started_at = time.perf_counter()
+        for _ in range(BENCHMARK_ROUNDS):
+            for question in questions:
+                tokenize(question)
+        rates.append(BENCHMARK_ROUNDS * len(questions) / (time.perf_counter() - started_at))
+    print(f"{len(questions)} questions against {label}: {len(mismatches)} mismatches; "
+          f"NLTK {rates[0]:,.0f} q/s, tokenizer {rates[1]:,.0f} q/s ({rates[1] / rates[0]:.1f}x)")
+    sys.exit(1 if mismatches else 0)
@@ -0,0 +1,275 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# signed MySQL integer types from narrowest to widest
+INTEGER_TYPES = [
+    ("TINYINT", -2 ** 7, 2 ** 7 - 1),
+    ("SMALLINT", -2 ** 15, 2 ** 15 - 1),
+    ("MEDIUMINT", -2 ** 23, 2 ** 23 - 1),
+    ("INT", -2 ** 31, 2 ** 31 - 1),
+    ("BIGINT", -2 ** 63, 2 ** 63 - 1),
+]
+INTEGER_NAMES = [name for name, _, _ in INTEGER_TYPES]
+
+# datetime formats tried on string columns, with the MySQL type they map to
+DATETIME_FORMATS = [
+    ("%Y-%m-%d", "DATE"),  # Date format
+    ("%H:%M:%S", "TIME"),  # Time format
+    ("%Y-%m-%d %H:%M:%S", "DATETIME"),  # Datetime format
+    ("%m/%d/%Y", "DATE"),  # Alternate date format (MM/DD/YYYY)
+]
+
+# share of non-null values that must parse for a column to become DATE/TIME/DATETIME
+DATETIME_MIN_SUCCESS = 1.0
+# values checked before a format is tried on the full column
+DATETIME_PROBE_SIZE = 100
+# decimals kept exactly, floats with more decimals become DOUBLE
+MAX_DECIMAL_SCALE = 6
+MAX_DECIMAL_PRECISION = 65
+# longer strings become TEXT
+MAX_VARCHAR_LENGTH = 16383
+# bytes of one row MySQL allows for all columns together (TEXT counts as 12), utf8mb4 is 4 bytes per char
+MAX_ROW_BYTES = 65535
+BYTES_PER_CHAR = 4
+# storage bytes of the fixed-width types
+FIXED_TYPE_BYTES = {"BOOLEAN": 1, "TINYINT": 1, "SMALLINT": 2, "MEDIUMINT": 3, "INT": 4, "BIGINT": 8,
+                    "DOUBLE": 8, "FLOAT": 4, "DATE": 3, "TIME": 3, "DATETIME": 5, "TEXT": 12}
+# type used for columns with no values to profile
+DEFAULT_TYPE = "VARCHAR(255)"
+
+# widening order of the type families, anything that mixes families ends as VARCHAR/TEXT
+FAMILY_RANK = {"integer": 0, "decimal": 1, "double": 2, "varchar": 3, "text": 4}
+TEMPORAL_TYPES = ("DATE", "TIME", "DATETIME")
+
+TYPE_PATTERN = re.compile(r"(\w+)(?:\((\d+)(?:,\s*(\d+))?\))?")
+
+
+# smallest integer type holding [min_value, max_value], DOUBLE past the 65 digits of DECIMAL(65, 0)
+def integer_type(min_value, max_value):
+    for name, low, high in INTEGER_TYPES:
+        if low <= min_value and max_value <= high:
+            return name
+    if max(abs(min_value), abs(max_value)) >= 10 ** MAX_DECIMAL_PRECISION:
+        return "DOUBLE"
+    return "DECIMAL(65, 0)"
+
+
+# fewest decimals that represent every value exactly, None if more than MAX_DECIMAL_SCALE are needed
+def decimal_scale(values):
+    for scale in range(MAX_DECIMAL_SCALE + 1):
+        scaled = values * 10 ** scale
+        if np.all(np.abs(scaled - np.round(scaled)) <= 1e-9 * np.maximum(np.abs(scaled), 1)):
+            return scale
+    return None
+
+
+# first datetime format every non-null string parses with
+def detect_column_datetime(strings):
+    probe = strings.iloc[:DATETIME_PROBE_SIZE]
+    for fmt, mysql_type in DATETIME_FORMATS:
+        # cheap check on the first values before parsing the whole column
+        if pd.to_datetime(probe, format=fmt, errors='coerce').isna().any():
+            continue
+        success_rate = pd.to_datetime(strings, format=fmt, errors='coerce').notna().mean()
+        if success_rate >= DATETIME_MIN_SUCCESS:
+            return mysql_type, fmt, success_rate
+    return None, None, 0.0
+
+
+# one pass over a column: null count, min/max, string length, integer width, datetime parse rate
+def profile_column(series):
+    """
+    returns a dict describing the column and the tightest MySQL type for it ('mysql_type').
+    """
+    values = series.dropna()
+    profile = {
+        'count': len(series),
+        'null_count': len(series) - len(values),
+        'min': None,
+        'max': None,
+        'max_length': None,
+        'datetime_format': None,
+        'datetime_success_rate': 0.0,
+        'mysql_type': DEFAULT_TYPE,
+    }
+    if values.empty:
+        return profile
+
+    if pd.api.types.is_bool_dtype(values.dtype):
+        profile['mysql_type'] = "BOOLEAN"
+
+    elif pd.api.types.is_numeric_dtype(values.dtype):
+        numbers = values.to_numpy(dtype=np.float64)
+        profile['min'], profile['max'] = values.min(), values.max()
+        if pd.api.types.is_integer_dtype(values.dtype):
+            profile['mysql_type'] = integer_type(profile['min'], profile['max'])
+        elif not np.isfinite(numbers).all():
+            # inf / -inf have no digits to size a DECIMAL or integer type with
+            profile['mysql_type'] = "DOUBLE"
+        else:
+            scale = decimal_scale(numbers)
+            integer_digits = len(str(int(np.abs(numbers).max())))
+            if scale == 0 and integer_type(profile['min'], profile['max']) in INTEGER_NAMES:
+                # whole numbers read as float because of missing values
+                profile['mysql_type'] = integer_type(profile['min'], profile['max'])
+            elif scale == 0:
+                # whole floats past BIGINT (1e20, 1e300) are approximate, DECIMAL would only fake exactness
+                profile['mysql_type'] = "DOUBLE"
+            elif scale is None or integer_digits + scale > MAX_DECIMAL_PRECISION:
+                profile['mysql_type'] = "DOUBLE"
+            else:
+                profile['mysql_type'] = f"DECIMAL({integer_digits + scale}, {scale})"
+
+    else:
+        strings = values.astype(str)
+        profile['max_length'] = int(strings.str.len().max())
+        mysql_type, fmt, success_rate = detect_column_datetime(strings)
+        profile['datetime_success_rate'] = success_rate
+        if mysql_type:
+            profile['mysql_type'] = mysql_type
+            profile['datetime_format'] = fmt
+        elif profile['max_length'] > MAX_VARCHAR_LENGTH:
+            profile['mysql_type'] = "TEXT"
+        else:
+            profile['mysql_type'] = f"VARCHAR({max(profile['max_length'], 1)})"
+
+    return profile
+
+
+# profile every column of a DataFrame
+def profile_dataframe(dataframe):
+    return {column: profile_column(dataframe[column]) for column in dataframe.columns}
+
+
+# split a MySQL type into (name, first argument, second argument)
+def parse_mysql_type(mysql_type):
+    name, first, second = TYPE_PATTERN.match(mysql_type).groups()
+    return name.upper(), int(first) if first else None, int(second) if second else None
+
+
+# render a type the way the profiler writes it, e.g. 'decimal(4,2)' -> 'DECIMAL(4, 2)'
+def normalize_mysql_type(mysql_type):
+    name, first, second = parse_mysql_type(mysql_type)
+    if name in INTEGER_NAMES and first != 1:
+        return name  # display width is not part of the type
+    if second is not None:
+        return f"{name}({first}, {second})"
+    return f"{name}({first})" if first is not None else name
+
+
+# family used to order types when widening
+def type_family(mysql_type):
+    name, _, _ = parse_mysql_type(mysql_type)
+    if name in INTEGER_NAMES or name == "BOOLEAN":
+        return "integer"
+    if name == "DECIMAL":
+        return "decimal"
+    if name in ("DOUBLE", "FLOAT"):
+        return "double"
+    if name == "TEXT":
+        return "text"
+    if name in TEMPORAL_TYPES:
+        return "temporal"
+    return "varchar"
+
+
+# digits left of the decimal point a numeric type can hold
+def integer_digits(mysql_type):
+    name, precision, scale = parse_mysql_type(mysql_type)
+    if name == "DECIMAL":
+        return precision - scale
+    if name in INTEGER_NAMES:
+        return len(str(INTEGER_TYPES[INTEGER_NAMES.index(name)][2]))
+    return 1  # BOOLEAN
+
+
+# longest text a value of this type is written as, used when a column falls back to VARCHAR
+def text_length(mysql_type):
+    name, first, _ = parse_mysql_type(mysql_type)
+    if name == "VARCHAR":
+        return first
+    if name in TEMPORAL_TYPES:
+        return {"DATE": 10, "TIME": 8, "DATETIME": 19}[name]
+    if name in ("DOUBLE", "FLOAT"):
+        return 24
+    # sign, digits and decimal point
+    return integer_digits(mysql_type) + (parse_mysql_type(mysql_type)[2] or 0) + 2
+
+
+# smallest type able to hold values of both `current` and `incoming`
+def widen_mysql_type(current, incoming):
+    if current == incoming:
+        return current
+    current_family, incoming_family = type_family(current), type_family(incoming)
+
+    if current_family == "temporal" or incoming_family == "temporal":
+        if {current, incoming} == {"DATE", "DATETIME"}:
+            return "DATETIME"
+        # dates mixed with anything else are kept as text
+        current_family = "varchar" if current_family == "temporal" else current_family
+        incoming_family = "varchar" if incoming_family == "temporal" else incoming_family
+        current_family = incoming_family = max(current_family, incoming_family, key=FAMILY_RANK.get)
+
+    family = max(current_family, incoming_family, key=FAMILY_RANK.get)
+    if family == "integer":
+        return max(parse_mysql_type(current)[0], parse_mysql_type(incoming)[0],
+                   key=lambda name: INTEGER_NAMES.index(name) if name in INTEGER_NAMES else -1)
+    if family == "decimal":
+        # room for the integer digits of both types and the larger scale
+        scale = max(parse_mysql_type(current)[2] or 0, parse_mysql_type(incoming)[2] or 0)
+        digits = max(integer_digits(current), integer_digits(incoming))
+        return f"DECIMAL({digits + scale}, {scale})" if digits + scale <= MAX_DECIMAL_PRECISION else "DOUBLE"
+    if family == "double":
+        return "DOUBLE"
+    if family == "text":
+        return "TEXT"
+    length = max(text_length(current), text_length(incoming))
+    return f"VARCHAR({length})" if length <= MAX_VARCHAR_LENGTH else "TEXT"
+
+
+# looser type for a schema inferred from a sample, so later rows rarely need a wider column
+def with_headroom(mysql_type):
+    name, first, second = parse_mysql_type(mysql_type)
+    family = type_family(mysql_type)
+    if family == "integer" and name != "BOOLEAN":
+        return widen_mysql_type(mysql_type, "INT")
+    if family == "decimal":
+        digits = min(first - second + 2, MAX_DECIMAL_PRECISION - second)
+        return f"DECIMAL({digits + second}, {second})"
+    if name == "VARCHAR":
+        length = 32
+        while length < first * 2:
+            length *= 2
+        return f"VARCHAR({min(length, MAX_VARCHAR_LENGTH)})" if first <= MAX_VARCHAR_LENGTH else "TEXT"
+    return mysql_type
+
+
+# bytes a column of this type takes toward MySQL's row size limit
+def column_bytes(mysql_type):
+    name, first, second = parse_mysql_type(mysql_type)
+    if name == "VARCHAR":
+        return first * BYTES_PER_CHAR + (1 if first * BYTES_PER_CHAR <= 255 else 2)
+    if name == "DECIMAL":
+        return (first + 1) // 2 + 1
+    return FIXED_TYPE_BYTES.get(name, 12)
+
+
+# bytes of a whole row, NULL flags included
+def row_bytes(column_types):
+    return sum(column_bytes(column_type) for column_type in column_types.values()) + (len(column_types) + 7) // 8
+
+
+# column types whose row fits MAX_ROW_BYTES (error 1118 otherwise): the widest VARCHAR columns become
+# TEXT, stored off the row, until it fits. columns in `keep` (the primary key) are never changed
+def fit_row_width(column_types, keep=()):
+    column_types = dict(column_types)
+    while row_bytes(column_types) > MAX_ROW_BYTES:
+        varchars = [column for column, column_type in column_types.items()
+                    if parse_mysql_type(column_type)[0] == "VARCHAR" and column not in keep]
+        if not varchars:
+            break
+        widest = max(varchars, key=lambda column: column_bytes(column_types[column]))
+        column_types[widest] = "TEXT"
+    return column_types
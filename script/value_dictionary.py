@@ -0,0 +1,215 @@
+import re
+
+import pymysql
+
+from lru_cache import LRUCache
+from schema_catalog import get_catalog
+from sample_queries import execute_query
+from query_cache import sql_scope, mongo_scope, get_sql_version, get_mongo_version
+from query_timeout import QueryCancelled, mongo_deadline, timeout_for
+from rollups import base_type, rollup_name, is_rollup
+from column_index import trigrams
+from query_ir import sql_literal
+
+# a string column with more distinct values than this is not kept, filters on it go to the database
+VALUE_DICTIONARY_MAX_VALUES = 100
+STRING_TYPES = ('char', 'varchar', 'enum', 'set')
+# smallest trigram similarity (Dice) for a misspelled value
+VALUE_MATCH_THRESHOLD = 0.5
+# values listed when a filter value does not exist
+SUGGESTED_VALUES = 5
+# one dictionary per table or collection version
+DICTIONARY_CACHE_SIZE = 32
+
+dictionary_cache = LRUCache(max_size=DICTIONARY_CACHE_SIZE)
+
+# the categorical WHERE of nlp_matching: ... WHERE col = 'value'
+SQL_EQUALS_FILTER = re.compile(r"^(?P<head>SELECT .+ WHERE (?P<column>\w+) = )'(?P<value>.*)'$", re.S)
+
+
+class ValueDictionary:
+    """Distinct values and their row counts of the low-cardinality string columns of one table or collection."""
+
+    def __init__(self, counts):
+        self.counts = counts  # column -> {value: rows}
+        self.by_lower = {column: {} for column in counts}  # column -> {lower-cased value: [values]}
+        self.grams = {column: {} for column in counts}  # column -> {value: trigrams}
+        for column, values in counts.items():
+            for value in values:
+                self.by_lower[column].setdefault(value.lower(), []).append(value)
+                self.grams[column][value] = trigrams(value.lower())
+
+    def has_column(self, column):
+        return column in self.counts
+
+    # (values the user meant, how they matched) for a value typed against a column
+    def lookup(self, column, value):
+        """
+        how is 'exact', 'case' (every value equal ignoring case), 'fuzzy' (the one closest value by
+        character trigrams) or 'missing'. columns not in the dictionary return ([value], None),
+        only the database can answer for them
+        """
+        if column not in self.counts:
+            return [value], None
+        if value in self.counts[column]:
+            return [value], 'exact'
+        same_case = self.by_lower[column].get(value.lower())
+        if same_case:
+            return same_case, 'case'
+        scores = self.similar(column, value)
+        if scores and scores[0][0] >= VALUE_MATCH_THRESHOLD and (len(scores) == 1 or scores[1][0] < scores[0][0]):
+            return [scores[0][1]], 'fuzzy'
+        return [], 'missing'
+
+    # (similarity, value) of a column's values, closest first
+    def similar(self, column, value):
+        grams = trigrams(value.lower())
+        return sorted(((2 * len(grams & value_grams) / (len(grams) + len(value_grams)), known)
+                       for known, value_grams in self.grams[column].items()), reverse=True)
+
+    # "'x' is not a value of col. Closest values (rows): a (12), b (3)"
+    def missing_message(self, column, value):
+        closest = [known for _, known in self.similar(column, value)[:SUGGESTED_VALUES]]
+        listed = ", ".join(f"{known} ({self.counts[column][known]})" for known in closest)
+        return f"No matching rows: '{value}' is not a value of {column}. Closest values (rows): {listed}"
+
+
+# ---------- MySQL ----------
+
+# one round trip: a UNION ALL of one GROUP BY per string column, so the table is scanned once per column
+# that has no rollup table to read instead. each branch is cut at max_values + 1 rows so a high-cardinality
+# column is recognised and dropped
+def build_sql_dictionary(connection, table_name, max_values=VALUE_DICTIONARY_MAX_VALUES):
+    catalog = get_catalog(connection)
+    columns = [column for column, column_type in catalog.column_types(table_name).items()
+               if base_type(column_type) in STRING_TYPES and column not in catalog.primary_key(table_name)]
+    if not columns:
+        return ValueDictionary({})
+    branches = []
+    for i, column in enumerate(columns):
+        rollup = rollup_name(table_name, column)
+        if catalog.has_table(rollup):
+            source = f"SELECT {i} AS c, `{column}` AS v, row_count AS n FROM `{rollup}`"
+        else:
+            source = f"SELECT {i} AS c, `{column}` AS v, COUNT(*) AS n FROM `{table_name}` GROUP BY `{column}`"
+        branches.append(f"({source} LIMIT {max_values + 2})")  # + 1 for NULL
+    result = execute_query(connection, " UNION ALL ".join(branches), timeout=timeout_for('value_dictionary'))
+    counts = {}
+    for i, value, rows in result.itertuples(index=False, name=None):
+        if value is not None and value == value:  # NULL and NaN are not values a filter can name
+            counts.setdefault(columns[int(i)], {})[str(value)] = int(rows)
+    return ValueDictionary({column: values for column, values in counts.items() if len(values) <= max_values})
+
+
+# dictionary of a table, built once per table version (appends and uploads give a new version)
+def get_sql_dictionary(connection, table_name):
+    if is_rollup(table_name):
+        return ValueDictionary({})
+    key = (sql_scope(connection, table_name), get_sql_version(connection, table_name))
+    dictionary = dictionary_cache.get(key)
+    if dictionary is None:
+        try:
+            dictionary = build_sql_dictionary(connection, table_name)
+        except (pymysql.MySQLError, TimeoutError, QueryCancelled) as err:
+            print(f"Error building the value dictionary: {err}")
+            return ValueDictionary({})
+        dictionary_cache.put(key, dictionary)
+    return dictionary
+
+
+# a generated "WHERE col = 'value'" query with its value resolved to a real one
+def check_sql_filter(connection, table_name, query):
+    """
+    returns (query, message): the query with the value as stored (case or spelling corrected, a
+    note is printed), or (None, message) when the column has no such value and nothing has to run
+    """
+    match = SQL_EQUALS_FILTER.match(query or '')
+    if match is None:
+        return query, None
+    column, value = match.group('column'), match.group('value').replace("''", "'").replace("\\\\", "\\")
+    dictionary = get_sql_dictionary(connection, table_name)
+    values, how = dictionary.lookup(column, value)
+    if how == 'missing':
+        return None, dictionary.missing_message(column, value)
+    if how in ('case', 'fuzzy') and len(values) == 1:
+        print(f"'{value}' matched the {column} value '{values[0]}'.")
+        return match.group('head') + sql_literal(values[0]), None
+    return query, None
+
+
+# ---------- MongoDB ----------
+
+# MongoDB error of an accumulator the server does not know ($firstN before 5.2)
+UNKNOWN_GROUP_OPERATOR = 15952
+
+# (field, value) pairs with their counts, for every top-level string field
+FIELD_VALUE_STAGES = [
+    {"$project": {"pairs": {"$objectToArray": "$$ROOT"}}},
+    {"$unwind": "$pairs"},
+    {"$match": {"pairs.v": {"$type": "string"}}},
+    {"$group": {"_id": {"field": "$pairs.k", "value": "$pairs.v"}, "n": {"$sum": 1}}},
+]
+
+
+# one $group pass over the collection: every top-level string field's distinct values and counts,
+# fields with more than max_values values come back empty
+def build_mongo_dictionary(collection, max_values=VALUE_DICTIONARY_MAX_VALUES):
+    """
+    each field's value list is capped at max_values + 1 inside the $group, so a high-cardinality
+    field (ids, free text) never builds a document near the 16 MB limit. servers older than 5.2
+    have no $firstN: the fields are counted first and values are only grouped for the small ones.
+    """
+    from pymongo.errors import OperationFailure  # Mongo only, keeps pymongo out of the SQL flow
+    with mongo_deadline(collection, timeout_for('value_dictionary')) as (max_time_ms, comment):
+        try:
+            pipeline = FIELD_VALUE_STAGES + [
+                {"$group": {"_id": "$_id.field", "distinct": {"$sum": 1},
+                            "values": {"$firstN": {"n": max_values + 1, "input": {"v": "$_id.value", "n": "$n"}}}}},
+            ]
+            fields = list(collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=max_time_ms, comment=comment))
+        except OperationFailure as err:
+            if err.code != UNKNOWN_GROUP_OPERATOR:
+                raise
+            counts = FIELD_VALUE_STAGES + [{"$group": {"_id": "$_id.field", "distinct": {"$sum": 1}}}]
+            small = [field['_id'] for field in collection.aggregate(counts, allowDiskUse=True, maxTimeMS=max_time_ms,
+                                                                    comment=comment)
+                     if field['distinct'] <= max_values]
+            pipeline = FIELD_VALUE_STAGES[:3] + [{"$match": {"pairs.k": {"$in": small}}}] + FIELD_VALUE_STAGES[3:] + [
+                {"$group": {"_id": "$_id.field", "distinct": {"$sum": 1},
+                            "values": {"$push": {"v": "$_id.value", "n": "$n"}}}},
+            ]
+            fields = list(collection.aggregate(pipeline, allowDiskUse=True, maxTimeMS=max_time_ms, comment=comment))
+    fields = [field for field in fields if field['distinct'] <= max_values]
+    return ValueDictionary({field['_id']: {item['v']: item['n'] for item in field['values']}
+                            for field in fields if field['values'] and field['_id'] != '_id'})
+
+
+# dictionary of a collection, built once per collection version
+def get_mongo_dictionary(collection):
+    from pymongo.errors import PyMongoError  # Mongo only, keeps pymongo out of the SQL flow
+    if is_rollup(collection.name):
+        return ValueDictionary({})
+    try:
+        key = (mongo_scope(collection), get_mongo_version(collection))
+        dictionary = dictionary_cache.get(key)
+        if dictionary is None:
+            dictionary = build_mongo_dictionary(collection)
+            dictionary_cache.put(key, dictionary)
+        return dictionary
+    except (PyMongoError, TimeoutError, QueryCancelled) as err:
+        print(f"Error building the value dictionary: {err}")
+        return ValueDictionary({})
+
+
+# values a Mongo filter on field should use, ([], message) when the field has no such value
+def check_mongo_value(collection, field, value):
+    if not isinstance(value, str):
+        return [value], None
+    dictionary = get_mongo_dictionary(collection)
+    values, how = dictionary.lookup(field, value)
+    if how == 'missing':
+        return [], dictionary.missing_message(field, value)
+    if how in ('case', 'fuzzy'):
+        print(f"'{value}' matched the {field} value{'s' if len(values) > 1 else ''} "
+              + ", ".join(f"'{known}'" for known in values) + ".")
+    return values, None
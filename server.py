@@ -0,0 +1,410 @@
+import argparse
+import asyncio
+import json
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import pymysql
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# Sql
+from connection_pool import get_pool, close_all_pools, POOL_MAX_SIZE
+from sample_queries import execute_query, generate_sql_examples, EXAMPLE_BUILDERS
+from nlp_matching import map_natural_language_to_query
+from query_cache import translate_sql_question
+from cost_guard import guarded_rows
+from query_timeout import QueryCancelled
+from schema_catalog import get_catalog
+from rollups import is_rollup, rewrite_with_rollup
+from value_dictionary import get_sql_dictionary, get_mongo_dictionary, check_sql_filter
+from output_capture import install_thread_output
+
+# NoSql
+from operation_layer import OperationLayer
+
+# local only by default: the service runs queries for anyone who can reach it, there is no authentication
+HOST = '127.0.0.1'
+PORT = 8551
+MONGO_URL = 'mongodb://localhost:27017/'
+# SQL examples of one request run one after another on one extra pooled connection
+SERVICE_EXAMPLE_WORKERS = 1
+# pooled connections one request holds at most: its own plus one for an example query or a capped
+# result stream (see execute_query)
+CONNECTIONS_PER_REQUEST = 1 + SERVICE_EXAMPLE_WORKERS
+# threads running blocking database work, sized so every busy thread gets its connections from the pool
+SERVICE_WORKERS = max(1, POOL_MAX_SIZE // CONNECTIONS_PER_REQUEST)
+# sessions untouched for this many seconds are dropped, checked every EVICT_INTERVAL seconds
+SESSION_IDLE_SECONDS = 900
+EVICT_INTERVAL = 60
+# rows returned by one answer, the rest of a large result is never read
+SERVICE_MAX_ROWS = 1000
+MAX_BODY_BYTES = 1024 * 1024
+HTTP_STATUS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error', 504: 'Gateway Timeout'}
+
+
+class ServiceError(Exception):
+    """Error answered to the client with an HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    """What one client selected, the connections themselves are borrowed per request."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.kind = None  # 'sql' or 'nosql'
+        self.database = None
+        self.table = None  # table or collection
+        self.operation_layer = None  # NoSQL question handler of the selected collection
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()  # one request of a session runs at a time
+
+    def state(self):
+        return {'session': self.id, 'type': self.kind, 'database': self.database, 'table': self.table}
+
+
+class SessionStore:
+    """In-memory sessions with idle eviction."""
+
+    def __init__(self, idle_seconds=SESSION_IDLE_SECONDS):
+        self.idle_seconds = idle_seconds
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def create(self):
+        session = Session()
+        with self.lock:
+            self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+        if session is None:
+            raise ServiceError(404, f"Unknown or expired session '{session_id}'")
+        session.last_used = time.monotonic()
+        return session
+
+    def close(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    # drop sessions idle for longer than idle_seconds, returns how many were dropped
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self.lock:
+            expired = [session_id for session_id, session in self.sessions.items() if session.last_used < cutoff]
+            for session_id in expired:
+                del self.sessions[session_id]
+        return len(expired)
+
+    def __len__(self):
+        return len(self.sessions)
+
+
+class ChatDBService:
+    """The SQL and NoSQL flows of main.py as calls on a session, run on worker threads."""
+
+    def __init__(self, mongo_url=MONGO_URL, idle_seconds=SESSION_IDLE_SECONDS):
+        self.sessions = SessionStore(idle_seconds)
+        self.mongo = MongoClient(mongo_url, connect=False)  # thread-safe, pools its own sockets
+        self.output = install_thread_output()  # print() of the query layers goes to the request being answered
+
+    def require(self, session, kind=None, table=True):
+        if session.kind is None or (kind and session.kind != kind):
+            raise ServiceError(409, "Choose a database first")
+        if table and session.table is None:
+            raise ServiceError(409, "Choose a table or collection first")
+
+    # choose database
+    def select_database(self, session, kind, name):
+        if kind == 'sql':
+            with get_pool(None).connection() as connection:
+                databases = execute_query(connection, "SHOW DATABASES", as_list=True)
+        elif kind == 'nosql':
+            databases = self.mongo.list_database_names()
+        else:
+            raise ServiceError(400, "type must be 'sql' or 'nosql'")
+        if name not in databases:
+            raise ServiceError(404, f"Unknown database '{name}'")
+        session.kind, session.database, session.table, session.operation_layer = kind, name, None, None
+        return session.state()
+
+    def list_tables(self, session):
+        self.require(session, table=False)
+        if session.kind == 'sql':
+            with get_pool(session.database).connection() as connection:
+                names = get_catalog(connection).table_names()
+        else:
+            names = self.mongo[session.database].list_collection_names()
+        return {'tables': [name for name in names if not is_rollup(name)]}
+
+    # choose table or collection, answers with its columns or first documents
+    def select_table(self, session, name):
+        self.require(session, table=False)
+        if name not in self.list_tables(session)['tables']:
+            raise ServiceError(404, f"Unknown table '{name}'")
+        session.table = name
+        if session.kind == 'sql':
+            with get_pool(session.database).connection() as connection:
+                columns = get_catalog(connection).describe(name)
+                get_sql_dictionary(connection, name)
+            return dict(session.state(), columns=frame_records(columns))
+        session.operation_layer = OperationLayer(self.mongo[session.database][name])
+        with self.output.capture() as output:
+            session.operation_layer.execute_find(query={}, limit=3)
+            get_mongo_dictionary(session.operation_layer.collection)
+        return dict(session.state(), output=output.getvalue())
+
+    # ask question
+    def ask(self, session, question, confirm=False):
+        self.require(session)
+        if session.kind == 'nosql':
+            with self.output.capture() as output:
+                session.operation_layer.handle_message(question, interactive=False)
+            return {'question': question, 'output': output.getvalue()}
+
+        table_name = session.table
+        with get_pool(session.database).connection() as connection:
+            query = translate_sql_question(
+                connection, question, table_name,
+                lambda column_info: map_natural_language_to_query(question.lower(), table_name, column_info)
+            )
+            if not query:
+                raise ServiceError(400, "Sorry, I couldn't understand your question.")
+            answer = {'question': question, 'query': query}
+            with self.output.capture() as output:
+                query, missing = check_sql_filter(connection, table_name, query)
+            if output.getvalue():
+                answer['note'] = output.getvalue().strip()
+            if missing:
+                return dict(answer, action='no_such_value', message=missing, truncated=False, rows=[])
+            answer['query'] = query
+            rollup_query = rewrite_with_rollup(connection, table_name, query)
+            if rollup_query:
+                answer['rollup_query'] = query = rollup_query
+            action, result = guarded_rows(connection, table_name, query, SERVICE_MAX_ROWS, confirm, question)
+        if result is None:
+            raise ServiceError(409, "This query scans the whole table, ask again with \"confirm\": true")
+        answer.update(action=action, truncated=len(result) > SERVICE_MAX_ROWS,
+                      rows=frame_records(result.head(SERVICE_MAX_ROWS)))
+        return answer
+
+    # get examples, query_type is a SQL construct (see EXAMPLE_BUILDERS) or a NoSQL keyword
+    def examples(self, session, query_type=None):
+        self.require(session)
+        if session.kind == 'nosql':
+            layer = session.operation_layer
+            layer.intent = 'example_with_keyword' if query_type else 'example_queries'
+            with self.output.capture() as output:
+                if query_type:
+                    layer.show_examples_with_keyword_and_execute(query_type)
+                else:
+                    layer.show_example_and_execute()
+            return {'output': output.getvalue()}
+
+        query_types = [query_type.upper()] if query_type else None
+        if query_types and query_types[0] not in EXAMPLE_BUILDERS:
+            raise ServiceError(400, f"type must be one of {list(EXAMPLE_BUILDERS)}")
+        with get_pool(session.database).connection() as connection, self.output.capture():
+            queries = generate_sql_examples(connection, session.table, query_types,
+                                            max_workers=SERVICE_EXAMPLE_WORKERS)
+        return {'examples': {
+            construct: [{'description': description, 'query': query,
+                         'rows': frame_records(result) if result is not None else None}
+                        for description, query, result in examples]
+            for construct, examples in queries.items()
+        }}
+
+    # run a call on a session under its lock, mapping database errors to HTTP statuses
+    def call(self, session, method, *args):
+        with session.lock:
+            try:
+                return method(session, *args)
+            except TimeoutError as err:
+                raise ServiceError(504, str(err))
+            except QueryCancelled as err:
+                raise ServiceError(409, str(err))
+            except (pymysql.MySQLError, PyMongoError) as err:
+                raise ServiceError(500, f"Error: {err}")
+            finally:
+                session.last_used = time.monotonic()
+
+
+# JSON-safe rows of a DataFrame (numpy scalars, decimals and dates included)
+def frame_records(df):
+    return json.loads(df.to_json(orient='records', date_format='iso', default_handler=str))
+
+
+# route table: (method, path pattern, handler name)
+ROUTES = [
+    ('GET', r"/health", 'health'),
+    ('POST', r"/sessions", 'create_session'),
+    ('GET', r"/sessions/(?P<session_id>\w+)", 'get_session'),
+    ('DELETE', r"/sessions/(?P<session_id>\w+)", 'close_session'),
+    ('POST', r"/sessions/(?P<session_id>\w+)/database", 'select_database'),
+    ('GET', r"/sessions/(?P<session_id>\w+)/tables", 'list_tables'),
+    ('POST', r"/sessions/(?P<session_id>\w+)/table", 'select_table'),
+    ('POST', r"/sessions/(?P<session_id>\w+)/ask", 'ask'),
+    ('GET', r"/sessions/(?P<session_id>\w+)/examples", 'examples'),
+]
+
+
+class ChatDBServer:
+    """Minimal asyncio HTTP/1.1 JSON server, blocking database calls go to a thread pool."""
+
+    def __init__(self, service, workers=SERVICE_WORKERS):
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chatdb')
+        self.routes = [(method, re.compile(pattern + "$"), name) for method, pattern, name in ROUTES]
+
+    async def run_blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    # handlers: (path params, query params, JSON body) -> (status, payload)
+    async def health(self, params, query, body):
+        return 200, {'status': 'ok', 'sessions': len(self.service.sessions)}
+
+    async def create_session(self, params, query, body):
+        return 201, self.service.sessions.create().state()
+
+    async def get_session(self, params, query, body):
+        return 200, self.service.sessions.get(params['session_id']).state()
+
+    async def close_session(self, params, query, body):
+        if not self.service.sessions.close(params['session_id']):
+            raise ServiceError(404, f"Unknown or expired session '{params['session_id']}'")
+        return 200, {'closed': params['session_id']}
+
+    async def session_call(self, params, method, *args):
+        session = self.service.sessions.get(params['session_id'])
+        return 200, await self.run_blocking(self.service.call, session, method, *args)
+
+    async def select_database(self, params, query, body):
+        return await self.session_call(params, self.service.select_database,
+                                       required(body, 'type'), required(body, 'name'))
+
+    async def list_tables(self, params, query, body):
+        return await self.session_call(params, self.service.list_tables)
+
+    async def select_table(self, params, query, body):
+        return await self.session_call(params, self.service.select_table, required(body, 'name'))
+
+    async def ask(self, params, query, body):
+        return await self.session_call(params, self.service.ask, required(body, 'question'),
+                                       bool(body.get('confirm', False)))
+
+    async def examples(self, params, query, body):
+        return await self.session_call(params, self.service.examples, query.get('type', [None])[0])
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        path_matched = False
+        for route_method, pattern, name in self.routes:
+            match = pattern.match(url.path.rstrip('/') or '/')
+            if match:
+                path_matched = True
+                if route_method == method:
+                    return await getattr(self, name)(match.groupdict(), parse_qs(url.query), body)
+        if path_matched:
+            raise ServiceError(405, f"{method} is not allowed on {url.path}")
+        raise ServiceError(404, f"No route for {url.path}")
+
+    # one client connection, requests are answered in order while the client keeps it alive
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode('latin-1').strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                try:
+                    if length > MAX_BODY_BYTES:
+                        raise ServiceError(413, "Request body too large")
+                    raw = await reader.readexactly(length) if length else b''
+                    body = json.loads(raw) if raw else {}
+                    if not isinstance(body, dict):
+                        raise ServiceError(400, "Request body must be a JSON object")
+                    status, payload = await self.dispatch(method, target, body)
+                except ServiceError as err:
+                    status, payload = err.status, {'error': str(err)}
+                except json.JSONDecodeError as err:
+                    status, payload = 400, {'error': f"Invalid JSON: {err}"}
+                except Exception as err:
+                    status, payload = 500, {'error': f"Error: {err}"}
+                send_json(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive or status == 413:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # malformed request or client gone
+        finally:
+            writer.close()
+
+    async def evict_sessions(self):
+        while True:
+            await asyncio.sleep(EVICT_INTERVAL)
+            evicted = self.service.sessions.evict_idle()
+            if evicted:
+                print(f"Evicted {evicted} idle session(s), {len(self.service.sessions)} open.")
+
+    async def serve(self, host=HOST, port=PORT):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        evictor = asyncio.create_task(self.evict_sessions())
+        print(f"ChatDB service listening on http://{host}:{port} ({self.executor._max_workers} workers)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            close_all_pools()
+
+
+def required(body, field):
+    if not body.get(field):
+        raise ServiceError(400, f"Missing '{field}'")
+    return body[field]
+
+
+def send_json(writer, status, payload, keep_alive):
+    data = json.dumps(payload, default=str).encode()
+    writer.write(
+        f"HTTP/1.1 {status} {HTTP_STATUS.get(status, '')}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve ChatDB's SQL and NoSQL flows to many users over HTTP.")
+    parser.add_argument("--host", default=HOST, help="address to bind, 0.0.0.0 exposes unauthenticated queries to the network")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--idle", type=int, default=SESSION_IDLE_SECONDS, help="seconds before an idle session is dropped")
+    parser.add_argument("--mongo-url", default=MONGO_URL)
+    args = parser.parse_args()
+
+    service = ChatDBService(args.mongo_url, args.idle)
+    try:
+        asyncio.run(ChatDBServer(service, args.workers).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("ChatDB service stopped.")